@@ -9,19 +9,26 @@ load_dotenv()
 
 # Import MongoDB connection
 from mongo_helper import client as mongo_client
+from services.tag_index import tag_index
+from services.event_log import settled_head
+from services.model_updater import model_updater, index_tail
 
 # Import routes
 from routes.auth_routes import auth_routes
 from routes.profile_routes import profile_routes
 from routes.post_routes import post_routes
+from middleware.metrics import register_metrics
 
 # Initialize Flask
 app = Flask(__name__)
 
 # Middleware
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Next-After', 'Server-Timing'])  # Continuation tokens and stage timings
 app.json.sort_keys = False  # Preserve JSON response order
 
+# Request metrics and the Prometheus /metrics endpoint
+register_metrics(app)
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
@@ -39,6 +46,20 @@ except Exception as e:
     })
     print('Please check your connection string and credentials')
 
+# Build the in-memory tag index used for recommendation candidates, then
+# follow the event log from just before the build for other processes' writes
+try:
+    tail_position = settled_head()
+    indexed_posts = tag_index.build()
+    print(f'Tag index built for {indexed_posts} posts')
+    index_tail.start(tail_position)
+except Exception as e:
+    print(f'Tag index build error: {e}')
+
+# Fold likes, views and post changes into the derived recommender state
+# (only the process holding the checkpoint lease does the work)
+model_updater.start()
+
 # routes
 app.register_blueprint(auth_routes, url_prefix='/api/auth')
 app.register_blueprint(profile_routes, url_prefix='/api/profiles')
@@ -0,0 +1,140 @@
+"""
+Recall/latency benchmark for the LSH post index against exact search.
+
+Builds a synthetic catalog from the sample tag vocabulary (with optional
+extra synthetic tags and Zipf-distributed tag popularity), embeds random
+users the same way the recommender does, and reports recall@k and query
+latency for a range of probe settings. Runs entirely in-process.
+
+Usage:
+    python -m benchmarks.ann_recall --posts 1000000 --k 100 --probes 0 2 4 8
+    python -m benchmarks.ann_recall --json ann.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from sample_data import SKILLS, FEED_PREFERENCES, POST_TAGS
+from services.tags import normalize_tag, normalize_tags
+from services.term_affinity import TermAffinityTable
+from services.ann_index import LSHIndex, post_vector, user_vector, DEFAULT_TABLES, DEFAULT_BITS, DEFAULT_PROBES
+
+
+def synthetic_vocabulary(extra_tags):
+    """Sample post tags plus `extra_tags` synthetic long-tail tags"""
+    return normalize_tags(POST_TAGS) + [f"topic{i}" for i in range(extra_tags)]
+
+
+def synthetic_posts(rng, vocabulary, count, zipf):
+    """Posts with 2-5 tags drawn with Zipf-distributed popularity"""
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1) ** zipf
+    weights /= weights.sum()
+    for _ in range(count):
+        size = rng.integers(2, 6)
+        yield [vocabulary[i] for i in rng.choice(len(vocabulary), size=size, replace=False, p=weights)]
+
+
+def synthetic_users(rng, vocabulary, count):
+    """User query vectors built from random skills, preferences and likes"""
+    table = TermAffinityTable()
+    table.rebuild(vocabulary)
+    vocabulary_set = set(vocabulary)
+
+    def matched(terms):
+        tags = set()
+        for term in terms:
+            tags |= {table.term(i) for i in table.matching_ids(term)}
+        return tags & vocabulary_set
+
+    for _ in range(count):
+        skills = [normalize_tag(s) for s in rng.choice(SKILLS, size=rng.integers(1, 5), replace=False)]
+        prefs = [normalize_tag(p) for p in rng.choice(FEED_PREFERENCES, size=rng.integers(1, 5), replace=False)]
+        liked = {tag: int(rng.integers(1, 4)) for tag in rng.choice(vocabulary, size=rng.integers(0, 6))}
+        yield user_vector(matched(skills), matched(prefs), liked)
+
+
+def run(posts, queries, k, probes, tables, bits, extra_tags, zipf, seed):
+    rng = np.random.default_rng(seed)
+    vocabulary = synthetic_vocabulary(extra_tags)
+
+    index = LSHIndex(n_tables=tables, n_bits=bits, seed=seed)
+    started = time.perf_counter()
+    index.build((i, post_vector(tags)) for i, tags in enumerate(synthetic_posts(rng, vocabulary, posts, zipf)))
+    build_seconds = time.perf_counter() - started
+
+    users = list(synthetic_users(rng, vocabulary, queries))
+
+    exact = []
+    started = time.perf_counter()
+    for vector in users:
+        exact.append(index.exact_query(vector, k))
+    exact_ms = (time.perf_counter() - started) * 1000 / len(users)
+
+    results = []
+    for n_probes in probes:
+        recalls = []
+        started = time.perf_counter()
+        approximate = [index.query(vector, k, n_probes=n_probes) for vector in users]
+        ann_ms = (time.perf_counter() - started) * 1000 / len(users)
+
+        for truth, found in zip(exact, approximate):
+            if not truth:
+                continue
+            # Ties at the k-th similarity make several exact answers equally valid
+            threshold = truth[-1][1] - 1e-6
+            hits = sum(1 for _, similarity in found if similarity >= threshold)
+            recalls.append(min(hits, len(truth)) / len(truth))
+
+        results.append({
+            "probes": n_probes,
+            "recallAtK": float(np.mean(recalls)) if recalls else 0.0,
+            "annQueryMs": ann_ms,
+            "exactQueryMs": exact_ms,
+            "speedup": exact_ms / ann_ms if ann_ms else None
+        })
+
+    return {
+        "posts": posts,
+        "queries": queries,
+        "k": k,
+        "tables": tables,
+        "bits": bits,
+        "vocabulary": len(vocabulary),
+        "buildSeconds": build_seconds,
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LSH post index recall@k benchmark")
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=100)
+    parser.add_argument('--probes', type=int, nargs='+', default=sorted({0, 1, DEFAULT_PROBES, 2 * DEFAULT_PROBES}))
+    parser.add_argument('--tables', type=int, default=DEFAULT_TABLES)
+    parser.add_argument('--bits', type=int, default=DEFAULT_BITS)
+    parser.add_argument('--extra-tags', type=int, default=500, help="synthetic long-tail tags added to the vocabulary")
+    parser.add_argument('--zipf', type=float, default=1.1, help="tag popularity exponent")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.posts, args.queries, args.k, args.probes, args.tables, args.bits,
+                 args.extra_tags, args.zipf, args.seed)
+
+    print(f"{report['posts']} posts, vocabulary {report['vocabulary']}, "
+          f"{report['tables']} tables x {report['bits']} bits, built in {report['buildSeconds']:.2f}s")
+    for result in report['results']:
+        print(f"probes={result['probes']}: recall@{args.k}={result['recallAtK']:.3f} "
+              f"ann={result['annQueryMs']:.2f}ms exact={result['exactQueryMs']:.2f}ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Concurrency stress check for the like/unlike write path.
+
+Many threads like and unlike a handful of posts at random, with several
+threads acting as the same user at once so duplicate likes and racing
+unlikes are common. Afterwards every post's `likes` counter must equal its
+number of like interactions and never be negative; any mismatch is printed
+and the script exits with status 1.
+
+tests/test_like_contention.py runs the same check on every test run against
+mongomock; this script repeats it at higher contention against a real
+(scratch) MongoDB server, whose unique interactions index and
+find_one_and_update are what production relies on.
+
+Usage:
+    python -m benchmarks.like_contention --mongo-uri mongodb://localhost:27017
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from bson import ObjectId
+from flask import Flask
+
+
+def _worker(app, like_post, unlike_post, user_ids, post_ids, operations, seed, statuses):
+    rng = random.Random(seed)
+    with app.app_context():
+        for _ in range(operations):
+            user = {"id": str(rng.choice(user_ids))}
+            post_id = str(rng.choice(post_ids))
+            if rng.random() < 0.5:
+                result = like_post(post_id, user)
+            else:
+                result = unlike_post(post_id, user)
+            status = result[1] if isinstance(result, tuple) else 200
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="like/unlike counter consistency under contention")
+    parser.add_argument('--mongo-uri', required=True, help="scratch MongoDB server")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--operations', type=int, default=500, help="like/unlike calls per thread")
+    parser.add_argument('--users', type=int, default=8, help="few users so threads collide on the same likes")
+    parser.add_argument('--posts', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # The store has to be in place before the controllers import mongo_helper
+    from benchmarks.recommender import _mongo_helper
+    helper = _mongo_helper(args.mongo_uri)
+    sys.modules['mongo_helper'] = helper
+    from controllers.post_controller import like_post, unlike_post
+
+    for name, collection in vars(helper).items():
+        if name.endswith('_collection'):
+            collection.delete_many({})
+
+    user_ids = [ObjectId() for _ in range(args.users)]
+    post_ids = [ObjectId() for _ in range(args.posts)]
+    helper.users_collection.insert_many([{"_id": uid, "email": f"contention{i}@example.com"} for i, uid in enumerate(user_ids)])
+    helper.user_profiles_collection.insert_many([{"user": uid, "name": f"Contention user {i}"} for i, uid in enumerate(user_ids)])
+    helper.posts_collection.insert_many([{
+        "_id": post_id,
+        "user": user_ids[0],
+        "title": f"Contention post {i}",
+        "description": "",
+        "tags": ["python"],
+        "normalizedTags": ["python"],
+        "likes": 0,
+        "views": 0
+    } for i, post_id in enumerate(post_ids)])
+
+    app = Flask(__name__)
+    statuses = [{} for _ in range(args.threads)]
+    threads = [
+        threading.Thread(target=_worker, args=(
+            app, like_post, unlike_post, user_ids, post_ids, args.operations, args.seed + i, statuses[i]
+        ))
+        for i in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    totals = {}
+    for thread_statuses in statuses:
+        for status, count in thread_statuses.items():
+            totals[status] = totals.get(status, 0) + count
+    calls = sum(totals.values())
+    print(f"{calls} calls in {elapsed:.2f}s ({calls / elapsed:.0f}/s), statuses {dict(sorted(totals.items()))}")
+
+    mismatches = 0
+    for post in helper.posts_collection.find({"_id": {"$in": post_ids}}, {"likes": 1}):
+        liked = helper.interactions_collection.count_documents({"post": post['_id'], "interactionType": "like"})
+        if post['likes'] != liked or post['likes'] < 0:
+            mismatches += 1
+            print(f"Post {post['_id']}: likes={post['likes']} but {liked} like interactions")
+
+    helper.client.drop_database(helper.db.name)
+    if totals.get(500):
+        print("Server errors during the run")
+        sys.exit(1)
+    if mismatches:
+        sys.exit(1)
+    print("All like counters match their interactions")
+
+
+if __name__ == "__main__":
+    main()
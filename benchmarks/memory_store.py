@@ -0,0 +1,206 @@
+"""
+Minimal in-process stand-in for the pymongo collections used by the benchmarks.
+
+Supports only what the recommender's read path needs: insert_many, find and
+find_one with equality, `$in` and `$ne` conditions, inclusion projections,
+sort on a single field, and hash indexes on equality fields. Anything else
+raises NotImplementedError so a benchmark never silently measures the wrong
+query. Codec options are accepted and ignored (documents stay dicts), and
+server time limits are ignored. mongomock is not used because its `$in` matching is quadratic, which
+makes catalogs beyond a few thousand posts unusable.
+"""
+
+import types
+
+import bson
+from bson import ObjectId
+
+
+class ReplyBytes:
+    """BSON size of the documents returned by reads, counted while enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self.total = 0
+
+    def add(self, documents):
+        if self.enabled:
+            self.total += sum(len(bson.encode(document)) for document in documents)
+
+
+class MemoryCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    def sort(self, key, direction=1):
+        self._documents.sort(key=lambda doc: doc.get(key), reverse=direction == -1)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self._documents)
+
+
+class MemoryCollection:
+    def __init__(self, name, reply_bytes=None):
+        self.name = name
+        self.reply_bytes = reply_bytes or ReplyBytes()
+        self._documents = {}          # _id -> document
+        self._indexes = {'_id': None}  # field -> {value: set of _ids} (None: primary key)
+
+    def create_index(self, keys, **kwargs):
+        field = keys[0][0] if isinstance(keys, list) else keys
+        if field not in self._indexes:
+            index = {}
+            for doc_id, document in self._documents.items():
+                self._index_value(index, document.get(field), doc_id)
+            self._indexes[field] = index
+        return f"{field}_1"
+
+    @staticmethod
+    def _index_value(index, value, doc_id):
+        for key in (value if isinstance(value, list) else [value]):
+            index.setdefault(key, set()).add(doc_id)
+
+    def insert_many(self, documents, ordered=True):
+        inserted = []
+        for document in documents:
+            document.setdefault('_id', ObjectId())
+            self._documents[document['_id']] = document
+            for field, index in self._indexes.items():
+                if index is not None:
+                    self._index_value(index, document.get(field), document['_id'])
+            inserted.append(document['_id'])
+        return types.SimpleNamespace(inserted_ids=inserted)
+
+    def insert_one(self, document):
+        return types.SimpleNamespace(inserted_id=self.insert_many([document]).inserted_ids[0])
+
+    def delete_many(self, query):
+        if query:
+            raise NotImplementedError("Filtered deletes")
+        count = len(self._documents)
+        self._documents.clear()
+        for index in self._indexes.values():
+            if index is not None:
+                index.clear()
+        return types.SimpleNamespace(deleted_count=count)
+
+    def _candidate_ids(self, query):
+        """Narrow the scan with the most selective indexed equality or $in condition"""
+        best = None
+        for field, condition in query.items():
+            if field not in self._indexes:
+                continue
+            if isinstance(condition, dict):
+                if set(condition) != {'$in'}:
+                    continue
+                values = condition['$in']
+            else:
+                values = [condition]
+
+            if field == '_id':
+                ids = {value for value in values if value in self._documents}
+            else:
+                ids = set()
+                for value in values:
+                    ids |= self._indexes[field].get(value, set())
+            if best is None or len(ids) < len(best):
+                best = ids
+        return self._documents.keys() if best is None else best
+
+    @staticmethod
+    def _matches(document, query):
+        for field, condition in query.items():
+            if '.' in field:
+                raise NotImplementedError(f"Dotted filter {field}")
+            value = document.get(field)
+            values = value if isinstance(value, list) else [value]
+            if isinstance(condition, dict):
+                for operator, operand in condition.items():
+                    if operator == '$in':
+                        if not any(v in operand for v in values):
+                            return False
+                    elif operator == '$ne':
+                        if operand in values:
+                            return False
+                    else:
+                        raise NotImplementedError(f"Operator {operator}")
+            elif condition not in values:
+                return False
+        return True
+
+    @staticmethod
+    def _project(document, projection):
+        if not projection:
+            return dict(document)
+        fields = {field.split('.')[0] for field, include in projection.items() if include and field != '_id'}
+        if not fields:
+            raise NotImplementedError("Exclusion projections")
+        projected = {field: document[field] for field in fields if field in document}
+        if projection.get('_id', 1):
+            projected['_id'] = document['_id']
+        return projected
+
+    @staticmethod
+    def _compile(query):
+        """Turn every $in list into a set once per query"""
+        return {
+            field: {op: set(operand) if op == '$in' else operand for op, operand in condition.items()}
+            if isinstance(condition, dict) else condition
+            for field, condition in (query or {}).items()
+        }
+
+    def with_options(self, codec_options=None, **kwargs):
+        return self
+
+    def _select(self, query, projection):
+        query = self._compile(query)
+        return [
+            self._project(self._documents[doc_id], projection)
+            for doc_id in self._candidate_ids(query)
+            if self._matches(self._documents[doc_id], query)
+        ]
+
+    def find(self, query=None, projection=None, max_time_ms=None):
+        documents = self._select(query, projection)
+        self.reply_bytes.add(documents)
+        return MemoryCursor(documents)
+
+    def find_one(self, query=None, projection=None, max_time_ms=None):
+        documents = self._select(query, projection)[:1]
+        self.reply_bytes.add(documents)
+        return documents[0] if documents else None
+
+    def count_documents(self, query):
+        return len(self._select(query, None))
+
+
+def memory_mongo_helper():
+    """Module with the same collection names as mongo_helper, backed by memory"""
+    helper = types.ModuleType('mongo_helper')
+    helper.reply_bytes = ReplyBytes()
+    for attribute, name in (
+        ('users_collection', 'users'),
+        ('posts_collection', 'posts'),
+        ('interactions_collection', 'interactions'),
+        ('user_profiles_collection', 'profiles'),
+        ('neighbors_collection', 'user_neighbors'),
+        ('recommendations_collection', 'recommendations'),
+        ('feed_snapshots_collection', 'feed_snapshots'),
+        ('trending_collection', 'trending'),
+        ('interaction_events_collection', 'interaction_events'),
+        ('event_checkpoints_collection', 'event_checkpoints')
+    ):
+        setattr(helper, attribute, MemoryCollection(name, helper.reply_bytes))
+
+    # The same lookups mongo_helper indexes
+    helper.posts_collection.create_index([("user", 1)])
+    helper.interactions_collection.create_index([("user", 1)])
+    helper.interactions_collection.create_index([("post", 1)])
+    helper.user_profiles_collection.create_index([("user", 1)])
+    helper.neighbors_collection.create_index([("user", 1)])
+    helper.recommendations_collection.create_index([("user", 1)])
+    return helper
@@ -0,0 +1,320 @@
+"""
+Latency/throughput benchmark for get_recommended_posts on synthetic catalogs.
+
+For each catalog size, generates posts tagged from the sample POST_TAGS
+vocabulary with Zipf-distributed tag popularity, profiles with skills and
+preferences from SKILLS and FEED_PREFERENCES, and views/likes whose target
+posts and per-user activity are both Zipf-distributed. Derived profile
+fields (liked-tag histogram, seen filter) are written the way the API
+maintains them. Each sampled user is then scored cold with
+compute_recommended_posts, bypassing the recommendation cache and
+materialized feeds.
+
+Reports p50/p95/p99 latency, recommendations per second, peak Python memory
+and BSON bytes read from the database per request, and per-stage timings for
+every size. By default everything
+runs against the in-process store in benchmarks/memory_store.py; pass
+--mongo-uri to run against a real (scratch) MongoDB database instead.
+Neighbor lists are not built, so the neighbor stage only costs its lookup.
+
+Usage:
+    python -m benchmarks.recommender --sizes 1000 10000 100000
+    python -m benchmarks.recommender --sizes 1000000 --users 2000 --json bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from bson import ObjectId
+
+from sample_data import SKILLS, FEED_PREFERENCES, POST_TAGS
+
+INSERT_BATCH_SIZE = 10000
+
+
+def _zipf_weights(count, exponent):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _pick(rng, vocabulary, weights, low, high):
+    size = min(int(rng.integers(low, high + 1)), len(vocabulary))
+    return [vocabulary[i] for i in rng.choice(len(vocabulary), size=size, replace=False, p=weights)]
+
+
+def _insert(collection, documents):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def generate(helper, posts, users, views_per_user, zipf, extra_tags, seed):
+    """
+    Fill the store with a synthetic catalog
+
+    Returns:
+        Tuple of (user ObjectIds, number of interactions)
+    """
+    from services.tags import normalize_tags
+    from services.tag_affinity import AFFINITY_FIELD, affinity_histogram
+    from services.seen_filter import seen_filter_fields
+
+    rng = np.random.default_rng(seed)
+    tag_vocabulary = POST_TAGS + [f"topic-{i}" for i in range(extra_tags)]
+    tag_weights = _zipf_weights(len(tag_vocabulary), zipf)
+    skill_weights = _zipf_weights(len(SKILLS), zipf)
+    preference_weights = _zipf_weights(len(FEED_PREFERENCES), zipf)
+
+    user_ids = [ObjectId() for _ in range(users)]
+    _insert(helper.users_collection, ({"_id": uid, "email": f"bench{i}@example.com"} for i, uid in enumerate(user_ids)))
+
+    # Post tags, each post written by a random user
+    post_ids = [ObjectId() for _ in range(posts)]
+    post_tag_lists = [_pick(rng, tag_vocabulary, tag_weights, 1, 5) for _ in range(posts)]
+    authors = rng.integers(0, users, size=posts)
+
+    # Zipf-distributed post popularity and user activity
+    post_weights = _zipf_weights(posts, zipf)[rng.permutation(posts)]
+    activity = np.minimum(rng.zipf(2.0, size=users), 50) * views_per_user
+
+    profiles = []
+    interactions = []
+    views = np.zeros(posts, dtype=np.int64)
+    likes = np.zeros(posts, dtype=np.int64)
+    for i, uid in enumerate(user_ids):
+        viewed = np.unique(rng.choice(posts, size=min(int(activity[i]), posts), p=post_weights))
+        liked = viewed[rng.random(len(viewed)) < 0.25]
+        interactions += [{"user": uid, "post": post_ids[p], "interactionType": "view"} for p in viewed]
+        interactions += [{"user": uid, "post": post_ids[p], "interactionType": "like"} for p in liked]
+        views[viewed] += 1
+        likes[liked] += 1
+
+        skills = _pick(rng, SKILLS, skill_weights, 0, 4)
+        preferences = _pick(rng, FEED_PREFERENCES, preference_weights, 0, 4)
+        profiles.append({
+            "user": uid,
+            "name": f"Benchmark user {i}",
+            "skills": skills,
+            "feedPreferences": preferences,
+            "normalizedSkills": normalize_tags(skills),
+            "normalizedFeedPreferences": normalize_tags(preferences),
+            AFFINITY_FIELD: affinity_histogram(normalize_tags(post_tag_lists[p]) for p in liked),
+            **seen_filter_fields(post_ids[p] for p in viewed)
+        })
+
+    _insert(helper.posts_collection, ({
+        "_id": post_id,
+        "user": user_ids[authors[i]],
+        "title": f"Benchmark post {i}",
+        "description": "",
+        "tags": post_tag_lists[i],
+        "normalizedTags": normalize_tags(post_tag_lists[i]),
+        "likes": int(likes[i]),
+        "views": int(views[i])
+    } for i, post_id in enumerate(post_ids)))
+    _insert(helper.interactions_collection, interactions)
+    _insert(helper.user_profiles_collection, profiles)
+    return user_ids, len(interactions)
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+
+def run_size(helper, posts, args):
+    """Generate one catalog and measure it"""
+    from services.tag_index import tag_index
+    from services.timing import pipeline_timings
+    from post_recommendation_system import compute_recommended_posts
+
+    for name, collection in vars(helper).items():
+        if name.endswith('_collection'):
+            collection.delete_many({})
+
+    started = time.perf_counter()
+    user_ids, interaction_count = generate(
+        helper, posts, args.users, args.views_per_user, args.zipf, args.extra_tags, args.seed
+    )
+    seed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tag_index.build()
+    index_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(args.seed + 1)
+    sample = [user_ids[i] for i in rng.choice(len(user_ids), size=min(args.queries, len(user_ids)), replace=False)]
+
+    # Warm up imports and lazily built structures
+    for uid in sample[:args.warmup]:
+        compute_recommended_posts(uid, args.limit)
+    pipeline_timings.reset()
+
+    latencies = []
+    started = time.perf_counter()
+    for uid in sample:
+        request_started = time.perf_counter()
+        compute_recommended_posts(uid, args.limit)
+        latencies.append((time.perf_counter() - request_started) * 1000)
+    total_seconds = time.perf_counter() - started
+    stages = {
+        name: {"p50Ms": timings["durationMs"]["p50"], "p99Ms": timings["durationMs"]["p99"],
+               "meanMs": timings["durationMs"]["sum"] / max(timings["durationMs"]["count"], 1)}
+        for name, timings in pipeline_timings.snapshot().items()
+    }
+
+    # Separate pass for memory and bytes read: tracemalloc and BSON-encoding
+    # every reply would distort the latencies above
+    tracemalloc.start()
+    peak_bytes = 0
+    helper.reply_bytes.total = 0
+    helper.reply_bytes.enabled = True
+    for uid in sample[:args.memory_queries]:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        compute_recommended_posts(uid, args.limit)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1] - baseline)
+    helper.reply_bytes.enabled = False
+    tracemalloc.stop()
+    memory_queries = min(args.memory_queries, len(sample))
+
+    return {
+        "posts": posts,
+        "users": args.users,
+        "interactions": interaction_count,
+        "seedSeconds": seed_seconds,
+        "indexBuildSeconds": index_seconds,
+        "queries": len(sample),
+        "p50Ms": _percentile(latencies, 50),
+        "p95Ms": _percentile(latencies, 95),
+        "p99Ms": _percentile(latencies, 99),
+        "meanMs": float(np.mean(latencies)) if latencies else 0.0,
+        "recommendationsPerSecond": len(sample) / total_seconds if total_seconds else None,
+        "peakRequestMemoryBytes": peak_bytes,
+        "readBytesPerRequest": helper.reply_bytes.total / memory_queries if memory_queries else 0,
+        "maxRssBytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "stages": stages
+    }
+
+
+def _mongo_helper(uri):
+    """mongo_helper-shaped module over a scratch database on a real server"""
+    import types
+    import bson
+    from pymongo import MongoClient, ASCENDING, monitoring
+
+    class ReplyBytes(monitoring.CommandListener):
+        """BSON size of find/getMore replies, counted while enabled"""
+
+        def __init__(self):
+            self.enabled = False
+            self.total = 0
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            if self.enabled and event.command_name in ('find', 'getMore'):
+                self.total += len(bson.encode(event.reply))
+
+        def failed(self, event):
+            pass
+
+    reply_bytes = ReplyBytes()
+    db = MongoClient(uri, event_listeners=[reply_bytes])['postrecds_benchmark']
+    helper = types.ModuleType('mongo_helper')
+    helper.reply_bytes = reply_bytes
+    helper.client = db.client
+    helper.db = db
+    helper.users_collection = db.users
+    helper.posts_collection = db.posts
+    helper.interactions_collection = db.interactions
+    helper.user_profiles_collection = db.profiles
+    helper.neighbors_collection = db.user_neighbors
+    helper.recommendations_collection = db.recommendations
+    helper.feed_snapshots_collection = db.feed_snapshots
+    helper.trending_collection = db.trending
+    helper.interaction_events_collection = db.interaction_events
+    helper.event_checkpoints_collection = db.event_checkpoints
+    helper.interactions_collection.create_index(
+        [("user", ASCENDING), ("post", ASCENDING), ("interactionType", ASCENDING)], unique=True
+    )
+    helper.user_profiles_collection.create_index([("user", ASCENDING)])
+    helper.posts_collection.create_index([("user", ASCENDING)])
+    helper.neighbors_collection.create_index([("user", ASCENDING)])
+    helper.recommendations_collection.create_index([("user", ASCENDING)])
+    return helper
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="get_recommended_posts latency benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="catalog sizes in posts")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--views-per-user', type=int, default=10, help="views of a user with minimal activity")
+    parser.add_argument('--queries', type=int, default=200, help="users scored per size")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--memory-queries', type=int, default=20, help="users scored under tracemalloc")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--zipf', type=float, default=1.1, help="popularity exponent for tags and posts")
+    parser.add_argument('--extra-tags', type=int, default=0, help="synthetic long-tail tags added to POST_TAGS")
+    parser.add_argument('--ann', action='store_true', help="retrieve candidates with the LSH index")
+    parser.add_argument('--mongo-uri', help="run against this MongoDB server instead of the in-process store")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    # The store has to be in place before any recommender module imports mongo_helper
+    if args.ann:
+        os.environ['RECOMMENDER_ANN'] = '1'
+    if args.mongo_uri:
+        helper = _mongo_helper(args.mongo_uri)
+    else:
+        from benchmarks.memory_store import memory_mongo_helper
+        helper = memory_mongo_helper()
+    sys.modules['mongo_helper'] = helper
+
+    results = []
+    for posts in args.sizes:
+        result = run_size(helper, posts, args)
+        results.append(result)
+        print(f"{posts} posts: p50={result['p50Ms']:.2f}ms p95={result['p95Ms']:.2f}ms "
+              f"p99={result['p99Ms']:.2f}ms {result['recommendationsPerSecond']:.1f} recs/s "
+              f"peak={result['peakRequestMemoryBytes'] / 1e6:.1f}MB "
+              f"read={result['readBytesPerRequest'] / 1e3:.1f}KB/req (seeded in {result['seedSeconds']:.1f}s)")
+
+    if args.mongo_uri:
+        helper.client.drop_database(helper.db.name)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "store": "mongodb" if args.mongo_uri else "memory",
+                "ann": args.ann,
+                "seed": args.seed,
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,28 @@
+from datetime import datetime, timezone
 from flask import jsonify
 from bson import ObjectId
-from mongo_helper import posts_collection, interactions_collection, users_collection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from mongo_helper import posts_collection, interactions_collection
 from post_recommendation_system import get_recommended_posts
+from services.tag_index import tag_index
+from services.recommendation_cache import recommendation_cache
+from services.event_log import append_event, LIKE, UNLIKE, POST_CREATED, POST_UPDATED, POST_DELETED
+from services.view_buffer import view_buffer
+from services.user_hydration import attach_users
+from services.pagination import parse_page_args, keyset_filter, page_response, ndjson_response
+from services.timing import SERVER_TIMING_ENABLED, pipeline_timings, stage, start_trace, end_trace
+from services.feed_snapshot import (
+    FEED_SNAPSHOT_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor, create_snapshot, read_page
+)
+from services.tags import normalize_tag, normalize_tags, post_tags
+
+# Posts written before views moved to the interactions collection may still
+# carry an unbounded viewedBy array until the strip_viewed_by migration runs
+POST_PROJECTION = {"viewedBy": 0}
+
+# What like/unlike need back from the post: the new count and the tags
+LIKE_PROJECTION = {"likes": 1, "tags": 1, "normalizedTags": 1}
 
 def create_post(data, current_user):
     """Create a new post"""
@@ -21,15 +42,22 @@ def create_post(data, current_user):
             "title": title,
             "description": description,
             "tags": tags or [],
+            # Normalized once here so reads never have to
+            "normalizedTags": normalize_tags(tags),
             "likes": 0,
-            "views": 0,
-            "viewedBy": []
+            "views": 0
         }
         
         result = posts_collection.insert_one(new_post)
         
+        # Make the post available to candidate generation, here and (through
+        # the event log) in every other process
+        tag_index.add_post(result.inserted_id, new_post['normalizedTags'])
+        recommendation_cache.invalidate_all()
+        append_event(POST_CREATED, post=result.inserted_id, tags=new_post['normalizedTags'])
+        
         # Get created post
-        post = posts_collection.find_one({"_id": result.inserted_id})
+        post = posts_collection.find_one({"_id": result.inserted_id}, POST_PROJECTION)
         post['_id'] = str(post['_id'])
         post['user'] = str(post['user'])
         
@@ -54,42 +82,82 @@ def serialize_document(doc):
     return doc
 
 
-def get_all_posts(current_user):
+def get_all_posts(current_user, cursor=None, limit=None):
+    """
+    Get one page of the recommended feed
+    
+    The first request (no cursor) snapshots the user's ranked list; the
+    X-Next-Cursor response header carries the token for the next page and is
+    omitted on the last one.
+    """
+    trace, trace_token = start_trace()
     try:
-        # 1. Get recommended post IDs for the current user
-        from post_recommendation_system import get_recommended_posts
-        recommended_post_ids = get_recommended_posts(current_user['id'], limit=10)
-        
-        # 2. Only get the recommended posts instead of all posts
-        post_id_objects = [ObjectId(pid) for pid in recommended_post_ids]
-        recommended_posts = []
+        user_id = current_user['id']
         
-        if post_id_objects:
-            # Only fetch the recommended posts from the database
-            recommended_posts = list(posts_collection.find({"_id": {"$in": post_id_objects}}))
+        # Validate page size
+        try:
+            limit = int(limit) if limit is not None else 10
+        except ValueError:
+            return jsonify({"message": "Invalid limit"}), 400
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return jsonify({"message": f"Limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+        
+        # 1. Start a new snapshot of the ranked list, or resume one from the cursor
+        if cursor:
+            try:
+                version, offset = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({"message": "Invalid cursor"}), 400
+        else:
+            from post_recommendation_system import get_recommended_posts
+            ranked_post_ids = get_recommended_posts(user_id, limit=FEED_SNAPSHOT_SIZE)
+            with stage('snapshot_write') as record:
+                version = create_snapshot(user_id, ranked_post_ids)
+                record.items = len(ranked_post_ids)
+            offset = 0
+        
+        with stage('snapshot_read') as record:
+            page = read_page(user_id, version, offset, limit)
+            record.items = len(page[0]) if page is not None else 0
+        if page is None:
+            return jsonify({"message": "Cursor expired, reload the feed"}), 410
+        recommended_post_ids, snapshot_size = page
+        
+        # 2. Only get the posts on this page
+        with stage('hydration') as record:
+            post_id_objects = [ObjectId(pid) for pid in recommended_post_ids]
+            recommended_posts = []
             
-            # Process these posts
-            for post in recommended_posts:
-                post['_id'] = str(post['_id'])
-                post['user'] = str(post['user'])
+            if post_id_objects:
+                # Only fetch the recommended posts from the database
+                recommended_posts = list(posts_collection.find({"_id": {"$in": post_id_objects}}, POST_PROJECTION))
                 
-                # Add position in recommendations as score (higher is better)
-                post_id_str = str(post['_id'])
-                position = recommended_post_ids.index(post_id_str)
-                post['recommendation_score'] = len(recommended_post_ids) - position
-                post['is_recommended'] = True
-                
-                # Convert viewedBy ObjectIds to strings
-                if 'viewedBy' in post and post['viewedBy']:
-                    post['viewedBy'] = [str(uid) for uid in post['viewedBy']]
-        
-        # 3. Sort by recommendation score
-        recommended_posts.sort(key=lambda x: x['recommendation_score'], reverse=True)
-        
-        return jsonify(recommended_posts)
+                # Process these posts
+                for post in recommended_posts:
+                    post['_id'] = str(post['_id'])
+                    post['user'] = str(post['user'])
+                    
+                    # Add position in the whole ranked list as score (higher is better)
+                    position = offset + recommended_post_ids.index(post['_id'])
+                    post['recommendation_score'] = snapshot_size - position
+                    post['is_recommended'] = True
+            
+            # 3. Sort by recommendation score
+            recommended_posts.sort(key=lambda x: x['recommendation_score'], reverse=True)
+            record.items = len(recommended_posts)
+        
+        response = jsonify(recommended_posts)
+        next_offset = offset + len(recommended_post_ids)
+        if next_offset < snapshot_size:
+            response.headers['X-Next-Cursor'] = encode_cursor(version, next_offset)
+        if SERVER_TIMING_ENABLED:
+            response.headers['Server-Timing'] = trace.server_timing()
+        return response
     except Exception as error:
         print(f'Get posts error: {error}')
         return jsonify({"message": "Server error"}), 500
+    finally:
+        end_trace(trace_token)
 
 # def get_all_posts(current_user):
 #     try:
@@ -160,14 +228,12 @@ def get_all_posts(current_user):
 def get_posts_by_tag(tag, current_user):
     """Get posts by tag"""
     try:
-        posts = list(posts_collection.find({"tags": tag}).sort("createdAt", -1))
+        posts = list(posts_collection.find({"normalizedTags": normalize_tag(tag)}, POST_PROJECTION).sort("createdAt", -1))
         
-        # Populate user data
+        # Populate user data with one lookup for all authors
+        attach_users(posts)
         for post in posts:
             post['_id'] = str(post['_id'])
-            user_id = post['user']
-            user = users_collection.find_one({"_id": user_id}, {"email": 1})
-            post['user'] = {"_id": str(user_id), "email": user['email']}
         
         return jsonify(posts)
         
@@ -213,22 +279,16 @@ def get_post_by_id(post_id, current_user):
         except:
             return jsonify({"message": "Invalid post ID"}), 400
         
-        post = posts_collection.find_one({"_id": post_object_id})
+        post = posts_collection.find_one({"_id": post_object_id}, POST_PROJECTION)
         
         if not post:
             return jsonify({"message": "Post not found"}), 404
         
         # Populate user data
-        user_id = post['user']
-        user = users_collection.find_one({"_id": user_id}, {"email": 1})
+        attach_users([post])
         
         # Convert ObjectId to string
         post['_id'] = str(post['_id'])
-        post['user'] = {"_id": str(user_id), "email": user['email']}
-        
-        # Handle nested ObjectId values if any
-        if 'viewedBy' in post and post['viewedBy']:
-            post['viewedBy'] = [str(uid) for uid in post['viewedBy']]
         
         return jsonify(post)
         
@@ -238,18 +298,38 @@ def get_post_by_id(post_id, current_user):
 
 
 
-def get_user_posts(current_user):
-    """Get posts by current user"""
+def _format_user_posts(posts):
+    # Convert ObjectIds to strings
+    for post in posts:
+        post['_id'] = str(post['_id'])
+        post['user'] = str(post['user'])
+    return posts
+
+def get_user_posts(current_user, after=None, limit=None, stream=False):
+    """
+    Get a page of the current user's posts, newest first, or stream them as NDJSON
+    
+    See services/pagination.py for the ?after=, ?limit= and ?stream= arguments.
+    """
     try:
         user_id = current_user['id']
-        posts = list(posts_collection.find({"user": ObjectId(user_id)}).sort("createdAt", -1))
         
-        # Convert ObjectIds to strings
-        for post in posts:
-            post['_id'] = str(post['_id'])
-            post['user'] = str(post['user'])
+        # Validate paging arguments
+        try:
+            after, limit = parse_page_args(after, limit, stream)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
         
-        return jsonify(posts)
+        # Newest first by _id, which follows creation time, so pages are
+        # ranges of the (user, _id) index
+        query = keyset_filter({"user": ObjectId(user_id)}, after, descending=True)
+        cursor = posts_collection.find(query, POST_PROJECTION).sort("_id", -1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        
+        if stream:
+            return ndjson_response(cursor, _format_user_posts, 'Get user posts')
+        return page_response(list(cursor), limit, _format_user_posts)
         
     except Exception as error:
         print(f'Get user posts error: {error}')
@@ -270,7 +350,7 @@ def update_post(post_id, data, current_user):
             return jsonify({"message": "Invalid post ID"}), 400
         
         # Find post
-        post = posts_collection.find_one({"_id": post_object_id})
+        post = posts_collection.find_one({"_id": post_object_id}, POST_PROJECTION)
         
         # Check if post exists
         if not post:
@@ -288,6 +368,7 @@ def update_post(post_id, data, current_user):
             update_data['description'] = description
         if tags:
             update_data['tags'] = tags
+            update_data['normalizedTags'] = normalize_tags(tags)
         
         # Save changes
         posts_collection.update_one(
@@ -295,8 +376,15 @@ def update_post(post_id, data, current_user):
             {"$set": update_data}
         )
         
+        # Re-index the post if its tags changed; the model updater moves its
+        # likers' histograms over to the new tags
+        if 'tags' in update_data:
+            tag_index.update_post(post_object_id, update_data['normalizedTags'])
+            append_event(POST_UPDATED, post=post_object_id, oldTags=post_tags(post), tags=update_data['normalizedTags'])
+        recommendation_cache.invalidate_all()
+        
         # Get updated post
-        updated_post = posts_collection.find_one({"_id": post_object_id})
+        updated_post = posts_collection.find_one({"_id": post_object_id}, POST_PROJECTION)
         updated_post['_id'] = str(updated_post['_id'])
         updated_post['user'] = str(updated_post['user'])
         
@@ -318,7 +406,7 @@ def delete_post(post_id, current_user):
             return jsonify({"message": "Invalid post ID"}), 400
         
         # Find post
-        post = posts_collection.find_one({"_id": post_object_id})
+        post = posts_collection.find_one({"_id": post_object_id}, POST_PROJECTION)
         
         # Check if post exists
         if not post:
@@ -330,9 +418,12 @@ def delete_post(post_id, current_user):
         
         # Delete post
         posts_collection.delete_one({"_id": post_object_id})
+        tag_index.remove_post(post_object_id)
+        recommendation_cache.invalidate_all()
         
-        # Delete all interactions for this post
-        interactions_collection.delete_many({"post": post_object_id})
+        # The model updater removes the post's tags from its likers'
+        # histograms, then deletes all interactions for this post
+        append_event(POST_DELETED, post=post_object_id, tags=post_tags(post))
         
         return jsonify({"message": "Post deleted successfully"})
         
@@ -351,42 +442,42 @@ def like_post(post_id, current_user):
         except:
             return jsonify({"message": "Invalid post ID"}), 400
         
-        # Find post
-        post = posts_collection.find_one({"_id": post_object_id})
-        
-        # Check if post exists
-        if not post:
-            return jsonify({"message": "Post not found"}), 404
-        
-        # Check if already liked
-        existing_like = interactions_collection.find_one({
-            "user": ObjectId(user_id),
-            "post": post_object_id,
-            "interactionType": "like"
-        })
-        
-        if existing_like:
-            return jsonify({"message": "Post already liked"}), 400
-        
-        # Create interaction record
-        new_interaction = {
+        like = {
             "user": ObjectId(user_id),
             "post": post_object_id,
             "interactionType": "like"
         }
         
-        interactions_collection.insert_one(new_interaction)
-        
-        # Update like count
-        posts_collection.update_one(
+        # Count the like before recording it, so every like interaction an
+        # unlike can delete has already been counted and `likes` never drops
+        # below the number of likes (or below 0). The increment also tells
+        # whether the post exists.
+        post = posts_collection.find_one_and_update(
             {"_id": post_object_id},
-            {"$inc": {"likes": 1}}
+            {"$inc": {"likes": 1}},
+            projection=LIKE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        # Get updated likes count
-        updated_post = posts_collection.find_one({"_id": post_object_id})
+        if not post:
+            return jsonify({"message": "Post not found"}), 404
+        
+        # Create interaction record; the unique (user, post, interactionType)
+        # index rejects a second like, even from a concurrent request. A like
+        # that is not recorded takes its increment back.
+        try:
+            interactions_collection.insert_one(dict(like, createdAt=datetime.now(timezone.utc)))
+        except DuplicateKeyError:
+            posts_collection.update_one({"_id": post_object_id}, {"$inc": {"likes": -1}})
+            return jsonify({"message": "Post already liked"}), 400
+        except Exception:
+            posts_collection.update_one({"_id": post_object_id}, {"$inc": {"likes": -1}})
+            raise
         
-        return jsonify({"likes": updated_post.get("likes", 0)})
+        # The model updater folds the event, then drops the user's cached feeds
+        append_event(LIKE, user_id, post_object_id, tags=post_tags(post))
+        
+        return jsonify({"likes": post.get("likes", 0)})
         
     except Exception as error:
         print(f'Like post error: {error}')
@@ -403,40 +494,35 @@ def unlike_post(post_id, current_user):
         except:
             return jsonify({"message": "Invalid post ID"}), 400
         
-        # Find post
-        post = posts_collection.find_one({"_id": post_object_id})
-        
-        # Check if post exists
-        if not post:
-            return jsonify({"message": "Post not found"}), 404
-        
-        # Check if liked
-        existing_like = interactions_collection.find_one({
+        # Remove interaction record; only the request that deletes it goes on
+        # to decrement, so concurrent unlikes cannot both count
+        result = interactions_collection.delete_one({
             "user": ObjectId(user_id),
             "post": post_object_id,
             "interactionType": "like"
         })
         
-        if not existing_like:
+        if not result.deleted_count:
+            if not posts_collection.find_one({"_id": post_object_id}, {"_id": 1}):
+                return jsonify({"message": "Post not found"}), 404
             return jsonify({"message": "Post not liked yet"}), 400
         
-        # Remove interaction record
-        interactions_collection.delete_one({
-            "user": ObjectId(user_id),
-            "post": post_object_id,
-            "interactionType": "like"
-        })
-        
-        # Update like count (ensure it doesn't go below 0)
-        current_likes = post.get("likes", 0)
-        new_likes = max(0, current_likes - 1)
-        
-        posts_collection.update_one(
+        # Update like count. The like being removed was counted before it was
+        # recorded, so this cannot take the count below 0
+        post = posts_collection.find_one_and_update(
             {"_id": post_object_id},
-            {"$set": {"likes": new_likes}}
+            {"$inc": {"likes": -1}},
+            projection=LIKE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return jsonify({"likes": new_likes})
+        if not post:
+            return jsonify({"message": "Post not found"}), 404
+        
+        # The model updater folds the event, then drops the user's cached feeds
+        append_event(UNLIKE, user_id, post_object_id, tags=post_tags(post))
+        
+        return jsonify({"likes": post.get("likes", 0)})
         
     except Exception as error:
         print(f'Unlike post error: {error}')
@@ -454,54 +540,51 @@ def view_post(post_id, current_user):
             return jsonify({"message": "Invalid post ID"}), 400
         
         # Find post
-        post = posts_collection.find_one({"_id": post_object_id})
+        post = posts_collection.find_one({"_id": post_object_id}, POST_PROJECTION)
         
         # Check if post exists
         if not post:
             return jsonify({"message": "Post not found"}), 404
         
-        # Check if already viewed
-        viewed_by = post.get("viewedBy", [])
-        already_viewed = False
-        
-        for viewer_id in viewed_by:
-            if str(viewer_id) == user_id:
-                already_viewed = True
-                break
-        
-        if not already_viewed:
-            # Create interaction record
-            new_interaction = {
-                "user": ObjectId(user_id),
-                "post": post_object_id,
-                "interactionType": "view"
-            }
-            
-            interactions_collection.insert_one(new_interaction)
-            
-            # Update view count and viewedBy array
-            posts_collection.update_one(
-                {"_id": post_object_id},
-                {
-                    "$inc": {"views": 1},
-                    "$push": {"viewedBy": ObjectId(user_id)}
-                }
-            )
-        
-        # Get full post data
-        updated_post = posts_collection.find_one({"_id": post_object_id})
-        user_obj = users_collection.find_one({"_id": updated_post["user"]}, {"email": 1})
-        
-        # Format response
-        updated_post["_id"] = str(updated_post["_id"])
-        updated_post["user"] = {"_id": str(updated_post["user"]), "email": user_obj["email"]}
-        
-        # Convert viewedBy array of ObjectIds to strings
-        if "viewedBy" in updated_post:
-            updated_post["viewedBy"] = [str(viewer_id) for viewer_id in updated_post["viewedBy"]]
+        # Queue the view; the buffer writes it with the next batch and the
+        # unique (user, post, interactionType) index drops repeat views then
+        view_buffer.record(ObjectId(user_id), post_object_id)
         
-        return jsonify(updated_post)
+        # Format response (the view count catches up after the next flush)
+        attach_users([post])
+        post["_id"] = str(post["_id"])
+        
+        return jsonify(post)
         
     except Exception as error:
         print(f'View post error: {error}')
-        return jsonify({"message": "Server error"}), 500
\ No newline at end of file
+        return jsonify({"message": "Server error"}), 500
+
+def get_post_viewers(post_id, current_user):
+    """Get the ids of the users who viewed a post"""
+    try:
+        # Validate post ID
+        try:
+            post_object_id = ObjectId(post_id)
+        except:
+            return jsonify({"message": "Invalid post ID"}), 400
+        
+        if not posts_collection.find_one({"_id": post_object_id}, {"_id": 1}):
+            return jsonify({"message": "Post not found"}), 404
+        
+        viewers = interactions_collection.find(
+            {"post": post_object_id, "interactionType": "view"}, {"user": 1, "_id": 0}
+        )
+        return jsonify([str(viewer['user']) for viewer in viewers])
+        
+    except Exception as error:
+        print(f'Get post viewers error: {error}')
+        return jsonify({"message": "Server error"}), 500
+
+def get_recommendation_timings():
+    """Get per-stage latency and item-count histograms of the recommender"""
+    return jsonify(pipeline_timings.snapshot())
+
+def get_recommendation_cache_stats():
+    """Get recommendation cache counters"""
+    return jsonify(recommendation_cache.stats())
\ No newline at end of file
@@ -1,7 +1,27 @@
 from flask import jsonify
 from bson import ObjectId
 from pymongo.errors import DuplicateKeyError
-from mongo_helper import user_profiles_collection, users_collection
+from mongo_helper import user_profiles_collection
+from services.recommendation_cache import recommendation_cache
+from services.materialized_feed import discard_feed
+from services.tag_affinity import AFFINITY_FIELD, AFFINITY_EVENT_FIELD, compute_affinity_fields
+from services.neighbor_graph import STALE_FIELD, stale_marker
+from services.seen_filter import SEEN_FIELD, SEEN_SLICE_FIELD, compute_seen_filter
+from services.tags import normalize_tags
+from services.event_log import append_event, PROFILE_CHANGED
+from services.user_hydration import attach_users
+from services.pagination import parse_page_args, keyset_filter, page_response, ndjson_response
+
+# Internal recommender fields are not part of the profile API
+PROFILE_PROJECTION = {
+    AFFINITY_FIELD: 0,
+    AFFINITY_EVENT_FIELD: 0,
+    STALE_FIELD: 0,
+    SEEN_FIELD: 0,
+    SEEN_SLICE_FIELD: 0,
+    "normalizedSkills": 0,
+    "normalizedFeedPreferences": 0
+}
 
 def create_profile(data, current_user):
     """Create user profile - only if one doesn't exist"""
@@ -14,7 +34,7 @@ def create_profile(data, current_user):
         user_id = current_user['id']
         
         # First, explicitly check if profile already exists
-        existing_profile = user_profiles_collection.find_one({"user": ObjectId(user_id)})
+        existing_profile = user_profiles_collection.find_one({"user": ObjectId(user_id)}, PROFILE_PROJECTION)
         
         if existing_profile:
             existing_profile['_id'] = str(existing_profile['_id'])
@@ -35,13 +55,25 @@ def create_profile(data, current_user):
             "age": age,
             "feedPreferences": feed_preferences or [],
             "skills": skills or [],
-            "occupation": occupation
+            "occupation": occupation,
+            # Normalized once here so the recommender never has to
+            "normalizedFeedPreferences": normalize_tags(feed_preferences),
+            "normalizedSkills": normalize_tags(skills),
+            # Seed the liked-tag histogram from likes made before the profile existed
+            **compute_affinity_fields(ObjectId(user_id)),
+            # Likewise for posts viewed before the profile existed
+            **compute_seen_filter(ObjectId(user_id)),
+            # Picked up by the next neighbor graph refresh
+            STALE_FIELD: stale_marker()
         }
         
         result = user_profiles_collection.insert_one(new_profile)
+        recommendation_cache.invalidate(user_id)
+        discard_feed(user_id)
+        append_event(PROFILE_CHANGED, user_id)
         
         # Get created profile
-        saved_profile = user_profiles_collection.find_one({"_id": result.inserted_id})
+        saved_profile = user_profiles_collection.find_one({"_id": result.inserted_id}, PROFILE_PROJECTION)
         saved_profile['_id'] = str(saved_profile['_id'])
         saved_profile['user'] = str(saved_profile['user'])
         
@@ -62,7 +94,7 @@ def update_profile(data, current_user):
         user_id = current_user['id']
         
         # Find the profile first to verify it exists
-        existing_profile = user_profiles_collection.find_one({"user": ObjectId(user_id)})
+        existing_profile = user_profiles_collection.find_one({"user": ObjectId(user_id)}, PROFILE_PROJECTION)
         
         if not existing_profile:
             return jsonify({"message": "Profile not found. Create a profile first."}), 404
@@ -75,14 +107,25 @@ def update_profile(data, current_user):
             if key in valid_fields:
                 update_data[key] = updates[key]
         
+        # Keep the normalized copies in sync and flag the neighbor graph
+        if 'skills' in update_data:
+            update_data['normalizedSkills'] = normalize_tags(update_data['skills'])
+        if 'feedPreferences' in update_data:
+            update_data['normalizedFeedPreferences'] = normalize_tags(update_data['feedPreferences'])
+        if 'skills' in update_data or 'feedPreferences' in update_data:
+            update_data[STALE_FIELD] = stale_marker()
+        
         if update_data:
             user_profiles_collection.update_one(
                 {"user": ObjectId(user_id)},
                 {"$set": update_data}
             )
+            recommendation_cache.invalidate(user_id)
+            discard_feed(user_id)
+            append_event(PROFILE_CHANGED, user_id)
         
         # Get updated profile
-        updated_profile = user_profiles_collection.find_one({"user": ObjectId(user_id)})
+        updated_profile = user_profiles_collection.find_one({"user": ObjectId(user_id)}, PROFILE_PROJECTION)
         updated_profile['_id'] = str(updated_profile['_id'])
         updated_profile['user'] = str(updated_profile['user'])
         
@@ -96,17 +139,16 @@ def get_current_profile(current_user):
     """Get current user profile"""
     try:
         user_id = current_user['id']
-        profile = user_profiles_collection.find_one({"user": ObjectId(user_id)})
+        profile = user_profiles_collection.find_one({"user": ObjectId(user_id)}, PROFILE_PROJECTION)
         
         if not profile:
             return jsonify({"message": "Profile not found"}), 404
         
         # Get user details
-        user = users_collection.find_one({"_id": ObjectId(user_id)}, {"email": 1})
+        attach_users([profile])
         
         # Format response
         profile['_id'] = str(profile['_id'])
-        profile['user'] = {"_id": str(profile['user']), "email": user.get('email')}
         
         return jsonify(profile)
         
@@ -114,24 +156,33 @@ def get_current_profile(current_user):
         print(f'Get profile error: {error}')
         return jsonify({"message": "Server error"}), 500
 
-def get_all_profiles():
-    """Get all profiles"""
+def _format_profiles(profiles):
+    # Get user details with one lookup for all profiles
+    attach_users(profiles)
+    for profile in profiles:
+        profile['_id'] = str(profile['_id'])
+    return profiles
+
+def get_all_profiles(after=None, limit=None, stream=False):
+    """
+    Get a page of profiles in _id order, or stream them as NDJSON
+    
+    See services/pagination.py for the ?after=, ?limit= and ?stream= arguments.
+    """
     try:
-        profiles_cursor = user_profiles_collection.find()
-        profiles = []
-        
-        for profile in profiles_cursor:
-            # Get user details
-            user_id = profile['user']
-            user = users_collection.find_one({"_id": user_id}, {"email": 1})
-            
-            # Format response
-            profile['_id'] = str(profile['_id'])
-            profile['user'] = {"_id": str(user_id), "email": user.get('email')}
-            
-            profiles.append(profile)
-        
-        return jsonify(profiles)
+        # Validate paging arguments
+        try:
+            after, limit = parse_page_args(after, limit, stream)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        
+        cursor = user_profiles_collection.find(keyset_filter({}, after), PROFILE_PROJECTION).sort("_id", 1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        
+        if stream:
+            return ndjson_response(cursor, _format_profiles, 'Get all profiles')
+        return page_response(list(cursor), limit, _format_profiles)
         
     except Exception as error:
         print(f'Get all profiles error: {error}')
@@ -146,6 +197,10 @@ def delete_profile(current_user):
         if result.deleted_count == 0:
             return jsonify({"message": "Profile not found"}), 404
         
+        recommendation_cache.invalidate(user_id)
+        discard_feed(user_id)
+        append_event(PROFILE_CHANGED, user_id)
+        
         return jsonify({"message": "Profile deleted successfully"})
         
     except Exception as error:
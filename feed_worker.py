@@ -0,0 +1,110 @@
+"""
+Offline worker that materializes every user's recommendation feed.
+
+The catalog is read and encoded once per worker process, profiled users are
+split into chunks, and each chunk is scored with get_recommended_posts_batch
+and written to the `recommendations` collection. The API then serves those
+feeds instead of scoring on the request path. Each pass first recomputes the
+trending feed that pads short feeds.
+
+Usage:
+    python feed_worker.py                       # one full pass
+    python feed_worker.py --workers 4           # spread chunks over 4 processes
+    python feed_worker.py --loop --interval 300 # regenerate every 5 minutes
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from mongo_helper import user_profiles_collection
+from services.feed_snapshot import FEED_SNAPSHOT_SIZE
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_INTERVAL = 300
+# Match the ranked-list length the paginated feed snapshots
+DEFAULT_LIMIT = FEED_SNAPSHOT_SIZE
+
+# Catalog encoded once per worker process
+_catalog = None
+
+
+def _init_worker():
+    """Load the catalog when a worker process starts"""
+    global _catalog
+    from post_recommendation_system import load_catalog
+    _catalog = load_catalog()
+
+
+def _materialize_chunk(user_ids, limit, generated_at):
+    """Score one chunk of users and store their feeds"""
+    from post_recommendation_system import get_recommended_posts_batch
+    from services.materialized_feed import save_feeds
+
+    results = get_recommended_posts_batch(user_ids, limit, chunk_size=len(user_ids), catalog=_catalog)
+    return save_feeds(results, limit, generated_at)
+
+
+def run_once(workers=1, chunk_size=DEFAULT_CHUNK_SIZE, limit=DEFAULT_LIMIT):
+    """
+    Materialize the feed of every profiled user
+
+    Returns:
+        Number of feeds written
+    """
+    start_time = time.time()
+    generated_at = datetime.now(timezone.utc)
+
+    # 1. Refresh the trending feed that pads short feeds, then collect every
+    # user with a profile
+    from services.trending import trending_feed
+    trending_feed.compute()
+    user_ids = [profile['user'] for profile in user_profiles_collection.find({}, {"user": 1})]
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+    # 2. Score and store the chunks, in-process or across worker processes
+    written = 0
+    if workers <= 1:
+        _init_worker()
+        for chunk in chunks:
+            written += _materialize_chunk(chunk, limit, generated_at)
+    else:
+        # Spawn fresh interpreters so each worker opens its own MongoClient
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            futures = [executor.submit(_materialize_chunk, chunk, limit, generated_at) for chunk in chunks]
+            for future in futures:
+                written += future.result()
+
+    print(f"Materialized {written} feeds in {time.time() - start_time:.2f} seconds")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendation feeds for every user")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('FEED_WORKERS', 1)),
+                        help="number of worker processes")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="users scored per task")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help="posts per feed")
+    parser.add_argument('--loop', action='store_true', help="keep regenerating feeds")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between passes with --loop")
+    args = parser.parse_args()
+
+    while True:
+        try:
+            run_once(args.workers, args.chunk_size, args.limit)
+        except Exception as e:
+            print(f"Error materializing feeds: {str(e)}")
+            if not args.loop:
+                raise
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,4 +20,17 @@ def token_required(f):
             print(f"Token verification error: {e}")
             return jsonify({'message': 'Token is not valid'}), 401
             
-    return decorated
\ No newline at end of file
+    return decorated
+
+# Users allowed to read internal recommender state (comma-separated user ids)
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.environ.get('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
+
+def admin_required(f):
+    @token_required
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if current_user.get('id') not in ADMIN_USER_IDS:
+            return jsonify({'message': 'Admin access required'}), 403
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
@@ -0,0 +1,36 @@
+import time
+from flask import request, g, Response
+from services.metrics import registry, render_metrics
+
+def register_metrics(app):
+    """Time every request and serve the Prometheus /metrics endpoint"""
+    
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+    
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        
+        # Label by route pattern, not the concrete URL, to keep series bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        labels = (('blueprint', request.blueprint or 'app'), ('route', route), ('method', request.method))
+        status = response.status_code
+        
+        # Streamed bodies are produced after this hook returns, so the timing
+        # stops when the server closes the response, once the body is sent
+        def record():
+            registry.observe('http_request_duration_seconds', labels, time.perf_counter() - start)
+            registry.inc('http_requests_total', labels + (('status', str(status)),))
+            if status >= 500:
+                registry.inc('http_request_errors_total', labels)
+        
+        response.call_on_close(record)
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
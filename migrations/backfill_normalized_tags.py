@@ -0,0 +1,65 @@
+"""
+One-shot migration that stores normalized tags next to the raw values.
+
+Adds `normalizedTags` to every post and `normalizedSkills` /
+`normalizedFeedPreferences` to every profile written before those fields
+were maintained on write. Safe to re-run: documents are simply rewritten.
+
+Usage:
+    python -m migrations.backfill_normalized_tags
+"""
+
+from pymongo import UpdateOne
+
+from mongo_helper import posts_collection, user_profiles_collection
+from services.tags import normalize_tags
+
+BATCH_SIZE = 1000
+
+
+def _flush(collection, operations):
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def backfill_posts():
+    """Write normalizedTags for every post"""
+    count = 0
+    operations = []
+    for post in posts_collection.find({}, {"tags": 1}):
+        operations.append(UpdateOne(
+            {"_id": post['_id']},
+            {"$set": {"normalizedTags": normalize_tags(post.get('tags'))}}
+        ))
+        if len(operations) >= BATCH_SIZE:
+            count += _flush(posts_collection, operations)
+            operations = []
+    return count + _flush(posts_collection, operations)
+
+
+def backfill_profiles():
+    """Write normalizedSkills and normalizedFeedPreferences for every profile"""
+    count = 0
+    operations = []
+    for profile in user_profiles_collection.find({}, {"skills": 1, "feedPreferences": 1}):
+        operations.append(UpdateOne(
+            {"_id": profile['_id']},
+            {"$set": {
+                "normalizedSkills": normalize_tags(profile.get('skills')),
+                "normalizedFeedPreferences": normalize_tags(profile.get('feedPreferences'))
+            }}
+        ))
+        if len(operations) >= BATCH_SIZE:
+            count += _flush(user_profiles_collection, operations)
+            operations = []
+    return count + _flush(user_profiles_collection, operations)
+
+
+def main():
+    print(f"Backfilled normalized tags on {backfill_posts()} posts")
+    print(f"Backfilled normalized skills and preferences on {backfill_profiles()} profiles")
+
+
+if __name__ == "__main__":
+    main()
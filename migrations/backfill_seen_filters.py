@@ -0,0 +1,22 @@
+"""
+One-shot migration that builds the seen-set Bloom filter on every profile.
+
+Profiles written before `seenFilter` was maintained by `view_post` have no
+filter, so the recommender would show them posts they already viewed, and
+filters written as word maps (flat or sliced) are slower to read. Safe to
+re-run: each filter is rebuilt as binary slices from the user's view
+interactions.
+
+Usage:
+    python -m migrations.backfill_seen_filters
+"""
+
+from services.seen_filter import rebuild_all_seen_filters
+
+
+def main():
+    print(f"Rebuilt seen filters on {rebuild_all_seen_filters()} profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+One-shot migration that removes the `viewedBy` array from every post.
+
+Views now live only in the interactions collection, deduplicated by its
+unique (user, post, interactionType) index. Before a post's array is
+dropped, every viewer in it is upserted as a view interaction so no view
+recorded only on the post is lost. Safe to re-run: the upserts are
+idempotent and posts without the array are skipped.
+
+Usage:
+    python -m migrations.strip_viewed_by
+"""
+
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from mongo_helper import posts_collection, interactions_collection
+
+BATCH_SIZE = 1000
+
+
+def _flush(post_ids, views):
+    if views:
+        interactions_collection.bulk_write(views, ordered=False)
+    if post_ids:
+        posts_collection.update_many({"_id": {"$in": post_ids}}, {"$unset": {"viewedBy": ""}})
+    return len(post_ids)
+
+
+def strip_viewed_by():
+    """Move every viewedBy entry to the interactions collection, then drop the arrays"""
+    count = 0
+    post_ids = []
+    views = []
+    now = datetime.now(timezone.utc)
+    for post in posts_collection.find({"viewedBy": {"$exists": True}}, {"viewedBy": 1}):
+        post_ids.append(post['_id'])
+        for viewer in post.get('viewedBy') or []:
+            view = {"user": viewer, "post": post['_id'], "interactionType": "view"}
+            views.append(UpdateOne(view, {"$setOnInsert": {"createdAt": now}}, upsert=True))
+        if len(post_ids) >= BATCH_SIZE or len(views) >= BATCH_SIZE:
+            count += _flush(post_ids, views)
+            post_ids = []
+            views = []
+    return count + _flush(post_ids, views)
+
+
+def main():
+    print(f"Removed viewedBy from {strip_viewed_by()} posts")
+
+
+if __name__ == "__main__":
+    main()
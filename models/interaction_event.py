@@ -0,0 +1,33 @@
+from bson import ObjectId
+
+# Define schema structure (for documentation purposes)
+# Events live in a capped collection, so documents are never updated
+INTERACTION_EVENT_SCHEMA = {
+    "_id": {
+        "type": ObjectId,  # Generated by the writer; consumers read in _id order
+        "required": True
+    },
+    "type": {
+        "type": str,
+        "enum": ["like", "unlike", "view", "post_created", "post_updated", "post_deleted", "profile_changed",
+                 "model_updated"],
+        "required": True
+    },
+    "user": {
+        "type": ObjectId,
+        "ref": "User"  # Likes, unlikes, views and profile changes
+    },
+    "post": {
+        "type": ObjectId,
+        "ref": "Post"  # Likes, unlikes, views and post changes
+    },
+    "tags": {
+        "type": list  # Normalized post tags at the time of the event
+    },
+    "oldTags": {
+        "type": list  # post_updated only: normalized tags before the edit
+    },
+    "users": {
+        "type": list  # model_updated only: users whose derived state was rewritten
+    }
+}
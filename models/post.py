@@ -22,18 +22,18 @@ POST_SCHEMA = {
         "type": list,
         "default": []
     },
+    "normalizedTags": {
+        "type": list,  # normalize_tag() of every tag, written with the post
+        "default": []
+    },
     "likes": {
-        "type": int,
+        "type": int,  # Like interactions, briefly plus likes still being recorded; never negative
         "default": 0
     },
     "views": {
         "type": int,
         "default": 0
     },
-    "viewedBy": {
-        "type": list,
-        "default": []
-    },
     "createdAt": {
         "type": datetime
     },
@@ -44,4 +44,5 @@ POST_SCHEMA = {
 
 # Create indexes for faster queries
 posts_collection.create_index([("user", ASCENDING)])
-posts_collection.create_index([("tags", ASCENDING)])
\ No newline at end of file
+posts_collection.create_index([("tags", ASCENDING)])
+posts_collection.create_index([("normalizedTags", ASCENDING)])
\ No newline at end of file
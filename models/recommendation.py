@@ -0,0 +1,29 @@
+from pymongo import ASCENDING
+from bson import ObjectId
+from datetime import datetime
+from mongo_helper import recommendations_collection
+
+# Define schema structure (for documentation purposes)
+RECOMMENDATION_SCHEMA = {
+    "user": {
+        "type": ObjectId,
+        "ref": "User",
+        "required": True,
+        "unique": True  # One materialized feed per user
+    },
+    "posts": {
+        "type": list,  # Ranked post ObjectIds, best first
+        "default": []
+    },
+    "limit": {
+        "type": int,  # Feed length the list was balanced for
+        "required": True
+    },
+    "generatedAt": {
+        "type": datetime,
+        "required": True
+    }
+}
+
+# Create index on user field for the feed lookup
+recommendations_collection.create_index([("user", ASCENDING)], unique=True)
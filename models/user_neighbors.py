@@ -0,0 +1,24 @@
+from pymongo import ASCENDING
+from bson import ObjectId
+from datetime import datetime
+from mongo_helper import neighbors_collection
+
+# Define schema structure (for documentation purposes)
+USER_NEIGHBORS_SCHEMA = {
+    "user": {
+        "type": ObjectId,
+        "ref": "User",
+        "required": True,
+        "unique": True  # One neighbor list per user
+    },
+    "neighbors": {
+        "type": list,  # [{"user": ObjectId, "similarity": float}], most similar first
+        "default": []
+    },
+    "updatedAt": {
+        "type": datetime
+    }
+}
+
+# Create index on user field for the request-time lookup
+neighbors_collection.create_index([("user", ASCENDING)], unique=True)
@@ -31,6 +31,22 @@ USER_PROFILE_SCHEMA = {
     "occupation": {
         "type": str
     },
+    "normalizedFeedPreferences": {
+        "type": list,  # normalize_tag() of every preference, written with the profile
+        "default": []
+    },
+    "normalizedSkills": {
+        "type": list,  # normalize_tag() of every skill, written with the profile
+        "default": []
+    },
+    "likedTagAffinity": {
+        "type": dict,  # normalized tag -> number of liked posts carrying it
+        "default": {}
+    },
+    "seenFilter": {
+        "type": dict,  # word index -> 64-bit word of a Bloom filter over viewed post ids
+        "default": {}
+    },
     "createdAt": {
         "type": datetime
     },
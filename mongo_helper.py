@@ -1,9 +1,10 @@
 import os
-from pymongo import MongoClient, ASCENDING
-from pymongo.errors import ConnectionFailure
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, CollectionInvalid
 from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
 import certifi
+from services.metrics import mongo_command_listener
 
 # Load environment variables
 load_dotenv()
@@ -18,7 +19,9 @@ try:
         MONGO_URI,
         server_api=ServerApi('1'),
         tlsCAFile=certifi.where(),
-        serverSelectionTimeoutMS=5000
+        serverSelectionTimeoutMS=5000,
+        # Feeds MongoDB command counts and durations to /metrics
+        event_listeners=[mongo_command_listener]
     )
 
     # Test connection
@@ -33,6 +36,23 @@ try:
     posts_collection = db.posts
     interactions_collection = db.interactions
     user_profiles_collection = db.profiles
+    neighbors_collection = db.user_neighbors
+    recommendations_collection = db.recommendations
+    feed_snapshots_collection = db.feed_snapshots
+    trending_collection = db.trending
+    event_checkpoints_collection = db.event_checkpoints
+
+    # Capped, insertion-ordered log of the writes the recommender folds in
+    # (services/event_log.py); the oldest events are dropped once it is full
+    try:
+        db.create_collection(
+            'interaction_events',
+            capped=True,
+            size=int(os.getenv("EVENT_LOG_SIZE_BYTES", 256 * 1024 * 1024))
+        )
+    except CollectionInvalid:
+        pass  # Already exists
+    interaction_events_collection = db.interaction_events
 
     # Create indexes
     users_collection.create_index([("email", ASCENDING)], unique=True)
@@ -41,8 +61,17 @@ try:
         unique=True
     )
     user_profiles_collection.create_index([("user", ASCENDING)], unique=True)
-    posts_collection.create_index([("user", ASCENDING)])
+    # Also serves the keyset pages of a user's posts, newest first
+    posts_collection.create_index([("user", ASCENDING), ("_id", DESCENDING)])
     posts_collection.create_index([("tags", ASCENDING)])
+    posts_collection.create_index([("normalizedTags", ASCENDING)])
+    neighbors_collection.create_index([("user", ASCENDING)], unique=True)
+    recommendations_collection.create_index([("user", ASCENDING)], unique=True)
+    feed_snapshots_collection.create_index([("user", ASCENDING)], unique=True)
+    feed_snapshots_collection.create_index(
+        [("createdAt", ASCENDING)],
+        expireAfterSeconds=int(os.getenv("FEED_SNAPSHOT_TTL", 1800))
+    )
 
     print("✅ Database connection established and indexes created.")
 
@@ -66,5 +95,11 @@ except ConnectionFailure as e:
     posts_collection = db.posts
     interactions_collection = db.interactions
     user_profiles_collection = db.profiles
+    neighbors_collection = db.user_neighbors
+    recommendations_collection = db.recommendations
+    feed_snapshots_collection = db.feed_snapshots
+    trending_collection = db.trending
+    event_checkpoints_collection = db.event_checkpoints
+    interaction_events_collection = db.interaction_events
 
     print("⚠️ Using dummy database objects. The application will start but database operations will fail.")
@@ -2,102 +2,67 @@
 KNN-based post recommendation system that balances user skills and preferences
 """
 
+import os
+
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import MultiLabelBinarizer
 from bson import ObjectId
-import re
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import PyMongoError
 
 # Import MongoDB collections
-from mongo_helper import posts_collection, interactions_collection, user_profiles_collection
+from mongo_helper import posts_collection, interactions_collection, user_profiles_collection, neighbors_collection
+from services.tags import normalize_tag, post_tags, profile_skills, profile_preferences
+from services.tag_index import tag_index
+from services.recommendation_cache import recommendation_cache
+from services.tag_affinity import load_affinity
+from services.neighbor_graph import get_neighbor_liked_posts
+from services.ann_index import post_ann_index, user_vector, ANN_CANDIDATES
+from services.materialized_feed import load_feed
+from services.seen_filter import SeenFilter, seen_positions, FILTER_HASHES
+from services.timing import stage
+from services.trending import trending_feed
+from services.query_pool import submit, wait_for, query_deadline, SERVER_TIMEOUT_MS
+from services.scoring_engine import (
+    TagMatrix,
+    score_candidates,
+    score_users
+)
 
-def normalize_tag(tag):
-    """Normalize a tag by removing special characters and converting to lowercase"""
-    if not tag:
-        return ""
-    # Replace special characters with spaces and convert to lowercase
-    normalized = re.sub(r'[_\-/\s+]', '', tag.lower())
-    return normalized
+# Only the fields scoring reads: leaves description on the server. Queries
+# run on pool threads get a copy, as mongomock mutates the projection it is given
+CANDIDATE_PROJECTION = {"tags": 1, "normalizedTags": 1, "title": 1}
 
-def get_recommended_posts(user_id, limit=10):
+# Candidate documents are small once projected, so fetch them in few round trips
+CANDIDATE_BATCH_SIZE = int(os.environ.get('RECOMMENDER_CANDIDATE_BATCH_SIZE', 10000))
+
+def _raw_bson_enabled():
+    return os.environ.get('RECOMMENDER_RAW_BSON', '').lower() in ('1', 'true', 'yes')
+
+# With RECOMMENDER_RAW_BSON=1 candidates come back as RawBSONDocument and a
+# document is only decoded when scoring first reads one of its fields
+candidate_posts_collection = posts_collection.with_options(
+    codec_options=CodecOptions(document_class=RawBSONDocument)
+) if _raw_bson_enabled() else posts_collection
+
+def balance_recommendations(post_scores, skills, preferences, limit):
     """
-    Generate balanced post recommendations based on user skills and preferences
+    Rank scored posts and keep a balanced mix of skill- and preference-related ones
     
     Args:
-        user_id: User ID to generate recommendations for (string or ObjectId)
-        limit: Number of posts to recommend
+        post_scores: Score dicts in candidate order (sorting is stable, so
+            equal scores keep that order)
+        skills: Normalized user skills
+        preferences: Normalized user feed preferences
+        limit: Number of posts to keep
         
     Returns:
-        List of recommended post IDs as strings
+        Up to `limit` score dicts, highest score first
     """
-    user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
-    
-    # 1. Get user profile and interactions
-    user_profile = user_profiles_collection.find_one({"user": user_id_obj})
-    user_interactions = list(interactions_collection.find({"user": user_id_obj}))
-    
-    # If no user profile, return empty list
-    if not user_profile:
-        return []
-    
-    # 2. Extract user skills and preferences
-    skills = [normalize_tag(skill) for skill in user_profile.get('skills', [])]
-    preferences = [normalize_tag(pref) for pref in user_profile.get('feedPreferences', [])]
-    
-    # 3. Get posts the user has already viewed
-    viewed_post_ids = {i['post'] for i in user_interactions if i['interactionType'] == 'view'}
-    
-    # 4. Get all posts except user's own posts and those already viewed
-    candidate_posts = list(posts_collection.find({
-        "user": {"$ne": user_id_obj},
-        "_id": {"$nin": list(viewed_post_ids)}
-    }))
-    
-    # If no candidate posts, return empty list
-    if not candidate_posts:
-        return []
-    
-    # 5. Calculate direct tag matches for each post
-    post_scores = []
-    for post in candidate_posts:
-        post_id = post['_id']
-        post_tags = [normalize_tag(tag) for tag in post.get('tags', [])]
-        
-        # Count matches with skills and preferences
-        skill_matches = sum(1 for skill in skills if any(skill in tag or tag in skill for tag in post_tags))
-        pref_matches = sum(1 for pref in preferences if any(pref in tag or tag in pref for tag in post_tags))
-        
-        # Calculate a direct matching score (higher is better)
-        direct_score = (skill_matches * 5) + (pref_matches * 5)
-        
-        # Also check for interaction history (likes)
-        interaction_score = 0
-        for interaction in user_interactions:
-            if interaction['post'] == post_id and interaction['interactionType'] == 'like':
-                # Get tags from this liked post to compare with current post
-                liked_post = posts_collection.find_one({"_id": interaction['post']})
-                if liked_post:
-                    liked_tags = [normalize_tag(tag) for tag in liked_post.get('tags', [])]
-                    # Count matching tags between liked post and current post
-                    tag_matches = sum(1 for tag in post_tags if tag in liked_tags)
-                    interaction_score += tag_matches * 3
-        
-        # Combine scores
-        total_score = direct_score + interaction_score
-        
-        post_scores.append({
-            'id': post_id,
-            'score': total_score,
-            'skill_matches': skill_matches,
-            'pref_matches': pref_matches,
-            'tags': post.get('tags', []),
-            'title': post.get('title', '')
-        })
-    
-    # 6. Sort posts by score (highest first)
+    # Sort posts by score (highest first)
     post_scores.sort(key=lambda x: x['score'], reverse=True)
     
-    # 7. Ensure we have a balanced mix of recommendations
+    # Ensure we have a balanced mix of recommendations
     final_recommendations = []
     skill_related = []
     pref_related = []
@@ -135,18 +100,363 @@ def get_recommended_posts(user_id, limit=10):
                 if remaining_count == 0:
                     break
     
-    # 8. Sort final recommendations by score again
+    # Sort final recommendations by score again
     final_recommendations.sort(key=lambda x: x['score'], reverse=True)
     
-    # 9. Extract post IDs for return
-    recommended_post_ids = [str(post['id']) for post in final_recommendations[:limit]]
+    return final_recommendations[:limit]
+
+def get_recommended_posts(user_id, limit=10):
+    """
+    Get balanced post recommendations
+    
+    Served from the per-user cache when possible, then from the feed
+    materialized by feed_worker.py while it is fresh, and only computed
+    online when neither is available.
+    
+    Args:
+        user_id: User ID to generate recommendations for (string or ObjectId)
+        limit: Number of posts to recommend
+        
+    Returns:
+        List of recommended post IDs as strings
+    """
+    with stage('cache_lookup') as record:
+        cached_ids = recommendation_cache.get(user_id, limit)
+        record.items = len(cached_ids) if cached_ids is not None else 0
+    if cached_ids is not None:
+        return cached_ids
+    
+    token = recommendation_cache.snapshot()
+    with stage('feed_lookup') as record:
+        recommended_post_ids = load_feed(user_id, limit)
+        record.items = len(recommended_post_ids) if recommended_post_ids is not None else 0
+    if recommended_post_ids is None:
+        recommended_post_ids = compute_recommended_posts(user_id, limit)
+    recommendation_cache.set(user_id, limit, recommended_post_ids, token)
+    
+    return recommended_post_ids
+
+def compute_recommended_posts(user_id, limit=10):
+    """
+    Generate balanced post recommendations based on user skills and preferences
+    
+    Args:
+        user_id: User ID to generate recommendations for (string or ObjectId)
+        limit: Number of posts to recommend
+        
+    Returns:
+        List of recommended post IDs as strings
+    """
+    user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+    
+    # 1. Start the profile and neighbor reads at once; they only need the user id.
+    # Every wait below shares one deadline, so the reads take at most one budget
+    deadline = query_deadline()
+    profile_future = submit(_fetch_profile, user_id_obj)
+    neighbor_future = submit(_fetch_neighbor_posts, user_id_obj)
+    
+    try:
+        user_profile = wait_for(profile_future, 'profile_fetch', deadline)
+    except (TimeoutError, PyMongoError) as e:
+        print(f"Recommendation read failed: {e}")
+        user_profile = None
+    
+    # Without a profile there is nothing to personalize: serve the trending feed
+    if not user_profile:
+        return [str(post_id) for post_id in trending_feed.top(limit, user_id_obj)]
+    
+    # 2. Extract user skills and preferences (normalized at write time)
+    skills = profile_skills(user_profile)
+    preferences = profile_preferences(user_profile)
+    
+    # 3. Get the seen-set filter and the liked-tag histogram stored on the profile
+    seen = SeenFilter(user_profile)
+    liked_tag_affinity = load_affinity(user_profile)
+    
+    # 4. Use the inverted tag index to collect posts sharing at least one tag with
+    # the user's skills, preferences or liked posts (or, for very large catalogs,
+    # the ANN index to retrieve the closest posts for exact re-scoring), then drop
+    # those the seen-set says were already viewed
+    with stage('candidate_retrieval') as record:
+        tag_index.ensure_built()
+        if post_ann_index is not None:
+            candidate_ids = _ann_candidates(skills, preferences, liked_tag_affinity)
+        else:
+            candidate_ids = tag_index.candidates(skills + preferences, liked_tag_affinity)
+        candidate_ids = {post_id for post_id in candidate_ids if post_id not in seen}
+        record.items = len(candidate_ids)
+    
+    # Fetch those candidates while the neighbor reads may still be in flight,
+    # then fetch whatever unseen posts the user's nearest neighbors liked on top
+    candidate_future = submit(_fetch_candidate_posts, candidate_ids, user_id_obj) if candidate_ids else None
+    try:
+        neighbor_post_ids = wait_for(neighbor_future, 'neighbor_fetch', deadline)
+    except (TimeoutError, PyMongoError) as e:
+        # Neighbor posts only widen the candidate set, so carry on without them
+        print(f"Recommendation read failed: {e}")
+        neighbor_post_ids = set()
+    neighbor_post_ids = {
+        post_id for post_id in neighbor_post_ids
+        if post_id not in candidate_ids and post_id not in seen
+    }
+    neighbor_candidate_future = submit(
+        _fetch_candidate_posts, neighbor_post_ids, user_id_obj, 'neighbor_candidate_query'
+    ) if neighbor_post_ids else None
+    
+    try:
+        candidate_posts = wait_for(candidate_future, 'candidate_query', deadline) if candidate_future else []
+    except (TimeoutError, PyMongoError) as e:
+        print(f"Recommendation read failed: {e}")
+        candidate_posts = []
+    try:
+        if neighbor_candidate_future:
+            candidate_posts += wait_for(neighbor_candidate_future, 'neighbor_candidate_query', deadline)
+    except (TimeoutError, PyMongoError) as e:
+        print(f"Recommendation read failed: {e}")
+    
+    # Sorting by _id keeps ties in a stable order shared with the batch path
+    candidate_posts.sort(key=lambda post: post['_id'])
+    
+    # If no candidate posts, fall back to the trending feed
+    if not candidate_posts:
+        return fill_with_trending([], limit, user_id_obj, seen)
+    
+    # 5. Score every candidate at once with the sparse tag-matrix engine
+    with stage('scoring') as record:
+        post_scores = score_candidates(candidate_posts, skills, preferences, liked_tag_affinity)
+        record.items = len(post_scores)
+    
+    # 6-8. Rank and balance skill- and preference-related posts
+    with stage('balancing') as record:
+        final_recommendations = balance_recommendations(post_scores, skills, preferences, limit)
+        record.items = len(final_recommendations)
+    
+    # 9. Extract post IDs for return, topping up a short feed with trending posts
+    recommended_post_ids = [str(post['id']) for post in final_recommendations]
+    
+    return fill_with_trending(recommended_post_ids, limit, user_id_obj, seen)
+
+def _ann_candidates(skills, preferences, liked_tag_affinity):
+    """Ids of the posts closest to the user in the ANN index"""
+    query = user_vector(
+        tag_index.matching_tags(skills),
+        tag_index.matching_tags(preferences),
+        liked_tag_affinity
+    )
+    return {post_id for post_id, _ in post_ann_index.query(query, ANN_CANDIDATES)}
+
+def _fetch_profile(user_id_obj):
+    with stage('profile_fetch') as record:
+        user_profile = user_profiles_collection.find_one({"user": user_id_obj}, max_time_ms=SERVER_TIMEOUT_MS)
+        record.items = 1 if user_profile else 0
+    return user_profile
+
+def _fetch_neighbor_posts(user_id_obj):
+    with stage('neighbor_fetch') as record:
+        neighbor_post_ids = get_neighbor_liked_posts(user_id_obj, max_time_ms=SERVER_TIMEOUT_MS)
+        record.items = len(neighbor_post_ids)
+    return neighbor_post_ids
+
+def _fetch_candidate_posts(candidate_ids, user_id_obj, stage_name='candidate_query'):
+    """Fetch candidate posts, excluding the user's own"""
+    with stage(stage_name) as record:
+        candidate_posts = list(candidate_posts_collection.find({
+            "_id": {"$in": list(candidate_ids)},
+            "user": {"$ne": user_id_obj}
+        }, dict(CANDIDATE_PROJECTION), max_time_ms=SERVER_TIMEOUT_MS).batch_size(CANDIDATE_BATCH_SIZE))
+        record.items = len(candidate_posts)
+    return candidate_posts
+
+def fill_with_trending(recommended_post_ids, limit, user_id_obj, seen):
+    """Append trending posts the user has not seen until the feed has `limit` posts"""
+    missing = limit - len(recommended_post_ids)
+    if missing <= 0:
+        return recommended_post_ids
+    
+    chosen = {ObjectId(post_id) for post_id in recommended_post_ids}
+    with stage('trending_fill') as record:
+        trending_ids = trending_feed.top(missing, user_id_obj, (chosen, seen))
+        record.items = len(trending_ids)
+    return recommended_post_ids + [str(post_id) for post_id in trending_ids]
+
+def _row_values(matrix, row, cols):
+    """Look up the values of one CSR row at the given (sorted-index) columns"""
+    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+    row_cols, row_data = matrix.indices[start:end], matrix.data[start:end]
+    if not len(row_cols):
+        return np.zeros(len(cols), dtype=np.int64)
+    pos = np.minimum(np.searchsorted(row_cols, cols), len(row_cols) - 1)
+    return np.where(row_cols[pos] == cols, row_data[pos], 0)
+
+def load_catalog():
+    """
+    Read and encode the whole catalog for batch scoring
+    
+    Posts are kept in the same _id order the single-user path uses to break ties.
+    """
+    posts = list(posts_collection.find(
+        {}, {"user": 1, **CANDIDATE_PROJECTION}
+    ).sort("_id", 1).batch_size(CANDIDATE_BATCH_SIZE))
+    author_rows = {}
+    for row, post in enumerate(posts):
+        author_rows.setdefault(post['user'], []).append(row)
+    
+    return {
+        'posts': posts,
+        'tag_matrix': TagMatrix([post_tags(post) for post in posts]),
+        'post_rows': {post['_id']: row for row, post in enumerate(posts)},
+        'author_rows': author_rows,
+        'seen_positions': np.array(
+            [seen_positions(post['_id']) for post in posts], dtype=np.uint64
+        ).reshape(len(posts), FILTER_HASHES)
+    }
+
+def get_recommended_posts_batch(user_ids, limit=10, chunk_size=1000, warm_cache=False, catalog=None):
+    """
+    Generate recommendations for many users in one pass over the catalog
+    
+    The catalog is read and encoded once, profiles and neighbor lists are read
+    with `$in` queries per chunk of users, and each chunk is scored as a single
+    users x posts sparse matrix product. Candidates, ranking and the trending
+    fallbacks follow compute_recommended_posts: with the ANN index enabled
+    only the retrieved posts and the neighbors' likes are ranked, and users
+    left without candidates (including when the catalog is empty) get the
+    trending feed.
+    
+    Args:
+        user_ids: User IDs to generate recommendations for (strings or ObjectIds)
+        limit: Number of posts to recommend per user
+        chunk_size: Number of users scored per matrix product
+        warm_cache: Store the results in the recommendation cache
+        catalog: Result of load_catalog() to reuse across calls
+        
+    Returns:
+        Dict of user ID string -> list of recommended post IDs as strings
+    """
+    user_id_objs = [ObjectId(uid) if isinstance(uid, str) else uid for uid in user_ids]
+    results = {str(uid): [] for uid in user_id_objs}
+    token = recommendation_cache.snapshot()
+    
+    # 1. Load and encode the catalog once
+    if catalog is None:
+        catalog = load_catalog()
+    tag_matrix = catalog['tag_matrix']
+    post_rows = catalog['post_rows']
+    author_rows = catalog['author_rows']
+    posts = catalog['posts']
+    post_seen_positions = catalog['seen_positions']
+    
+    unique_ids = list(dict.fromkeys(user_id_objs))
+    if post_ann_index is not None:
+        tag_index.ensure_built()
+    for chunk_start in range(0, len(unique_ids), chunk_size):
+        chunk = unique_ids[chunk_start:chunk_start + chunk_size]
+        
+        # 2. Read the chunk's profiles and neighbor lists with one query each,
+        # plus one for the likes of all those neighbors
+        profiles = {p['user']: p for p in user_profiles_collection.find({"user": {"$in": chunk}})}
+        
+        neighbor_lists = {
+            entry['user']: [neighbor['user'] for neighbor in entry.get('neighbors', [])]
+            for entry in neighbors_collection.find({"user": {"$in": chunk}}, {"user": 1, "neighbors.user": 1})
+        }
+        liked_rows = {}
+        all_neighbors = list({n for neighbors in neighbor_lists.values() for n in neighbors})
+        if all_neighbors:
+            for interaction in interactions_collection.find(
+                {"user": {"$in": all_neighbors}, "interactionType": "like"}, {"user": 1, "post": 1}
+            ):
+                if interaction['post'] in post_rows:
+                    liked_rows.setdefault(interaction['user'], set()).add(post_rows[interaction['post']])
+        
+        # Users without a profile get the trending feed
+        for uid in chunk:
+            if uid not in profiles:
+                results[str(uid)] = [str(post_id) for post_id in trending_feed.top(limit, uid)]
+        
+        users = [uid for uid in chunk if uid in profiles]
+        if not users:
+            continue
+        seen_filters = {uid: SeenFilter(profiles[uid]) for uid in users}
+        
+        # Nothing to score: the trending feed, as for users without candidates
+        if not posts:
+            for uid in users:
+                results[str(uid)] = fill_with_trending([], limit, uid, seen_filters[uid])
+            continue
+        
+        skill_lists = [profile_skills(profiles[uid]) for uid in users]
+        pref_lists = [profile_preferences(profiles[uid]) for uid in users]
+        affinities = [load_affinity(profiles[uid]) for uid in users]
+        
+        # 3. Score the whole chunk with one sparse product
+        scores, skill_matches, pref_matches = score_users(tag_matrix, skill_lists, pref_lists, affinities)
+        scores.sort_indices()
+        skill_matches.sort_indices()
+        pref_matches.sort_indices()
+        
+        for row, uid in enumerate(users):
+            # Posts liked by the user's neighbors are candidates even without a score
+            peer_rows = set()
+            for neighbor in neighbor_lists.get(uid, []):
+                peer_rows |= liked_rows.get(neighbor, set())
+            
+            if post_ann_index is not None:
+                # Like the single-user path: only what the ANN index retrieves
+                retrieved = {
+                    post_rows[post_id] for post_id in _ann_candidates(skill_lists[row], pref_lists[row], affinities[row])
+                    if post_id in post_rows
+                }
+                cols = np.array(sorted(retrieved | peer_rows), dtype=np.int64)
+                values = _row_values(scores, row, cols)
+                candidate = np.ones(len(cols), dtype=bool)
+            else:
+                start, end = scores.indptr[row], scores.indptr[row + 1]
+                cols, values = scores.indices[start:end], scores.data[start:end]
+                is_peer = np.isin(cols, list(peer_rows))
+                extra = np.setdiff1d(np.fromiter(peer_rows, dtype=cols.dtype, count=len(peer_rows)), cols)
+                cols = np.concatenate([cols, extra])
+                values = np.concatenate([values, np.zeros(len(extra), dtype=values.dtype)])
+                candidate = (values > 0) | np.concatenate([is_peer, np.ones(len(extra), dtype=bool)])
+            
+            # Drop the user's own and already viewed posts
+            seen = seen_filters[uid].contains_positions(post_seen_positions[cols])
+            keep = candidate & ~seen & ~np.isin(cols, author_rows.get(uid, []))
+            cols, values = cols[keep], values[keep]
+            
+            # Highest score first, ties in catalog order
+            order = np.lexsort((cols, -values))
+            cols, values = cols[order], values[order]
+            skill_values = _row_values(skill_matches, row, cols)
+            pref_values = _row_values(pref_matches, row, cols)
+            
+            # Balancing only ever looks at the top `limit` skill- and
+            # preference-related posts plus the top 2 * `limit` overall
+            positions = np.zeros(len(cols), dtype=bool)
+            positions[:2 * limit] = True
+            positions[np.flatnonzero(skill_values > 0)[:limit]] = True
+            positions[np.flatnonzero(pref_values > 0)[:limit]] = True
+            
+            post_scores = [
+                {
+                    'id': posts[cols[i]]['_id'],
+                    'score': int(values[i]),
+                    'skill_matches': int(skill_values[i]),
+                    'pref_matches': int(pref_values[i]),
+                    'tags': posts[cols[i]].get('tags', []),
+                    'title': posts[cols[i]].get('title', '')
+                }
+                for i in np.flatnonzero(positions)
+            ]
+            
+            # 4. Apply the usual skill/preference balancing per user
+            final_recommendations = balance_recommendations(post_scores, skill_lists[row], pref_lists[row], limit)
+            results[str(uid)] = fill_with_trending(
+                [str(post['id']) for post in final_recommendations], limit, uid, seen_filters[uid]
+            )
     
-    # Print debug info
-    print(f"\nUser skills: {user_profile.get('skills', [])}")
-    print(f"User preferences: {user_profile.get('feedPreferences', [])}")
-    print("\nRecommended posts:")
-    for post in final_recommendations[:limit]:
-        print(f"- '{post['title']}' (Tags: {post['tags']}, Score: {post['score']})")
-        print(f"  Skill matches: {post['skill_matches']}, Preference matches: {post['pref_matches']}")
+    if warm_cache:
+        for uid, post_ids in results.items():
+            recommendation_cache.set(uid, limit, post_ids, token)
     
-    return recommended_post_ids
\ No newline at end of file
+    return results
@@ -9,9 +9,13 @@ from controllers.post_controller import (
     delete_post, 
     like_post, 
     unlike_post, 
-    view_post
+    view_post,
+    get_post_viewers,
+    get_recommendation_cache_stats,
+    get_recommendation_timings
 )
-from middleware.auth import token_required
+from middleware.auth import token_required, admin_required
+from services.pagination import wants_stream
 
 # Create blueprint
 post_routes = Blueprint('post', __name__)
@@ -22,11 +26,23 @@ post_routes = Blueprint('post', __name__)
 def create_post_route(current_user):
     return create_post(request.json, current_user)
 
-# Get all posts
+# Get a page of the recommended feed (?cursor=...&limit=...)
 @post_routes.route('/', methods=['GET'])
 @token_required
 def get_all_posts_route(current_user):
-    return get_all_posts(current_user)
+    return get_all_posts(current_user, request.args.get('cursor'), request.args.get('limit'))
+
+# Get recommendation cache stats (admins only)
+@post_routes.route('/recommendations/stats', methods=['GET'])
+@admin_required
+def get_recommendation_cache_stats_route(current_user):
+    return get_recommendation_cache_stats()
+
+# Get recommender per-stage timing histograms (admins only)
+@post_routes.route('/recommendations/timings', methods=['GET'])
+@admin_required
+def get_recommendation_timings_route(current_user):
+    return get_recommendation_timings()
 
 # Get posts by tag
 @post_routes.route('/tag/<tag>', methods=['GET'])
@@ -34,11 +50,11 @@ def get_all_posts_route(current_user):
 def get_posts_by_tag_route(current_user, tag):
     return get_posts_by_tag(tag, current_user)
 
-# Get posts by current user
+# Get a page of the current user's posts (?after=...&limit=..., ?stream=1 for NDJSON)
 @post_routes.route('/myPosts', methods=['GET'])
 @token_required
 def get_user_posts_route(current_user):
-    return get_user_posts(current_user)
+    return get_user_posts(current_user, request.args.get('after'), request.args.get('limit'), wants_stream(request))
 
 # Get post by ID
 @post_routes.route('/<id>', methods=['GET'])
@@ -74,4 +90,10 @@ def unlike_post_route(current_user, id):
 @post_routes.route('/<id>/view', methods=['POST'])
 @token_required
 def view_post_route(current_user, id):
-    return view_post(id, current_user)
\ No newline at end of file
+    return view_post(id, current_user)
+
+# Get the users who viewed a post
+@post_routes.route('/<id>/viewers', methods=['GET'])
+@token_required
+def get_post_viewers_route(current_user, id):
+    return get_post_viewers(id, current_user)
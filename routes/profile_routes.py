@@ -7,6 +7,7 @@ from controllers.profile_controller import (
     delete_profile
 )
 from middleware.auth import token_required
+from services.pagination import wants_stream
 
 # Create blueprint
 profile_routes = Blueprint('profile', __name__)
@@ -29,11 +30,11 @@ def update_profile_route(current_user):
 def get_current_profile_route(current_user):
     return get_current_profile(current_user)
 
-# Get all profiles
+# Get a page of profiles (?after=...&limit=..., ?stream=1 for NDJSON)
 @profile_routes.route('/', methods=['GET'])
 @token_required
 def get_all_profiles_route(current_user):
-    return get_all_profiles()
+    return get_all_profiles(request.args.get('after'), request.args.get('limit'), wants_stream(request))
 
 # Delete profile
 @profile_routes.route('/', methods=['DELETE'])
@@ -0,0 +1,45 @@
+"""
+Sample vocabularies shared by the test data generator and the benchmarks
+"""
+
+SKILLS = [
+    "Python", "JavaScript", "React", "Node.js", "MongoDB", "Flask", "Django",
+    "Machine Learning", "Data Science", "DevOps", "AWS", "Docker", "UI/UX"
+]
+
+FEED_PREFERENCES = [
+    "technology", "web development", "data science", "artificial intelligence",
+    "cloud computing", "mobile development", "design", "career advice",
+    "programming", "databases", "security", "tutorials", "startups"
+]
+
+POST_TAGS = [
+    "python", "javascript", "react", "nodejs", "mongodb", "flask", "django",
+    "machine-learning", "data-science", "devops", "aws", "docker", "ui-ux",
+    "technology", "web-development", "artificial-intelligence", "cloud-computing", 
+    "mobile-development", "design", "career-advice", "programming", "databases", 
+    "security", "tutorials", "startups"
+]
+
+POST_TITLES = [
+    "Getting Started with ReactJS",
+    "Python Best Practices for Beginners",
+    "MongoDB Schema Design Patterns",
+    "Machine Learning Fundamentals",
+    "Career Transition to Tech",
+    "AWS Deployment Guide",
+    "Building RESTful APIs with Flask",
+    "Modern JavaScript Features",
+    "Data Science Project Workflow",
+    "Docker for Development Environments",
+    "Node.js Performance Optimization",
+    "Frontend Design Principles",
+    "Database Security Basics",
+    "DevOps Automation Techniques",
+    "Mobile App Development with React Native"
+]
+
+OCCUPATIONS = [
+    "Software Engineer", "Data Scientist", "Web Developer", "UX Designer",
+    "Product Manager", "DevOps Engineer", "Student", "Teacher"
+]
@@ -0,0 +1,239 @@
+"""
+Approximate nearest-neighbor index over post tag vectors, in pure NumPy.
+
+Posts are embedded by feature-hashing their normalized tags into a fixed
+number of dimensions and L2 normalizing. The index is random-projection LSH
+(SimHash) for cosine similarity: several tables each hash a vector to a
+signature made of the signs of its projections onto random hyperplanes.
+A query looks up its own bucket in every table, optionally multi-probes the
+buckets reached by flipping its least certain bits, and re-ranks only those
+candidates by exact cosine.
+
+Knobs: more tables and more probes raise recall at the cost of latency; more
+bits per table make buckets smaller and queries faster but lower recall.
+
+The index is off by default. Set RECOMMENDER_ANN=1 to retrieve candidates
+through it (before exact re-scoring) instead of the inverted tag index.
+"""
+
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from services.scoring_engine import SKILL_WEIGHT, PREFERENCE_WEIGHT, INTERACTION_WEIGHT
+
+DEFAULT_DIMENSIONS = 128
+DEFAULT_TABLES = 12
+DEFAULT_BITS = 10
+DEFAULT_PROBES = 4
+
+
+def hash_tag(tag, dimensions=DEFAULT_DIMENSIONS):
+    """Stable feature-hashing bucket for a normalized tag"""
+    return zlib.crc32(tag.encode('utf-8')) % dimensions
+
+
+def tag_vector(weighted_tags, dimensions=DEFAULT_DIMENSIONS):
+    """
+    Embed weighted tags as an L2-normalized hashed vector
+
+    Args:
+        weighted_tags: Iterable of (normalized tag, weight) pairs
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for tag, weight in weighted_tags:
+        vector[hash_tag(tag, dimensions)] += weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def post_vector(normalized_tags, dimensions=DEFAULT_DIMENSIONS):
+    """Embed a post's normalized tags"""
+    return tag_vector(((tag, 1.0) for tag in normalized_tags), dimensions)
+
+
+def user_vector(skill_tags, preference_tags, liked_tag_affinity, dimensions=DEFAULT_DIMENSIONS):
+    """
+    Embed a user with the same weights the exact scorer uses
+
+    Args:
+        skill_tags: Vocabulary tags matched by the user's skills
+        preference_tags: Vocabulary tags matched by the user's preferences
+        liked_tag_affinity: Normalized tag -> number of liked posts carrying it
+    """
+    weighted_tags = [(tag, SKILL_WEIGHT) for tag in skill_tags]
+    weighted_tags += [(tag, PREFERENCE_WEIGHT) for tag in preference_tags]
+    weighted_tags += [(tag, INTERACTION_WEIGHT * count) for tag, count in liked_tag_affinity.items()]
+    return tag_vector(weighted_tags, dimensions)
+
+
+class LSHIndex:
+    """Random-hyperplane LSH index supporting build, insert, delete and top-k query"""
+
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS, n_tables=DEFAULT_TABLES,
+                 n_bits=DEFAULT_BITS, n_probes=DEFAULT_PROBES, seed=0):
+        self.dimensions = dimensions
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_probes = n_probes
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((n_tables * n_bits, dimensions)).astype(np.float32)
+        self._bit_values = np.int64(1) << np.arange(n_bits, dtype=np.int64)
+
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._buckets = [{} for _ in range(self.n_tables)]  # signature -> set of rows
+        self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        self._signatures = np.zeros((0, self.n_tables), dtype=np.int64)
+        self._ids = []     # row -> post id (None for a free row)
+        self._rows = {}    # post id -> row
+        self._free = []
+
+    def _project(self, vectors):
+        """Projections shaped (n, tables, bits)"""
+        return (vectors @ self._planes.T).reshape(len(vectors), self.n_tables, self.n_bits)
+
+    def _signatures_of(self, projections):
+        return ((projections > 0) * self._bit_values).sum(axis=2)
+
+    def _grow(self, capacity):
+        if capacity <= len(self._vectors):
+            return
+        capacity = max(capacity, 2 * len(self._vectors), 64)
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        vectors[:len(self._vectors)] = self._vectors
+        signatures = np.zeros((capacity, self.n_tables), dtype=np.int64)
+        signatures[:len(self._signatures)] = self._signatures
+        self._vectors, self._signatures = vectors, signatures
+
+    def build(self, items):
+        """
+        Replace the index contents
+
+        Args:
+            items: Iterable of (post id, vector) pairs
+        """
+        items = list(items)
+        with self._lock:
+            self._clear()
+            if not items:
+                return 0
+            self._grow(len(items))
+            vectors = np.stack([vector for _, vector in items]).astype(np.float32)
+            signatures = self._signatures_of(self._project(vectors))
+            self._vectors[:len(items)] = vectors
+            self._signatures[:len(items)] = signatures
+            for row, (post_id, _) in enumerate(items):
+                self._ids.append(post_id)
+                self._rows[post_id] = row
+                for table in range(self.n_tables):
+                    self._buckets[table].setdefault(int(signatures[row, table]), set()).add(row)
+            return len(items)
+
+    def insert(self, post_id, vector):
+        """Add a post, replacing its previous vector if it was already indexed"""
+        vector = np.asarray(vector, dtype=np.float32)
+        signature = self._signatures_of(self._project(vector[None, :]))[0]
+        with self._lock:
+            self._delete(post_id)
+            if self._free:
+                row = self._free.pop()
+                self._ids[row] = post_id
+            else:
+                row = len(self._ids)
+                self._grow(row + 1)
+                self._ids.append(post_id)
+            self._rows[post_id] = row
+            self._vectors[row] = vector
+            self._signatures[row] = signature
+            for table in range(self.n_tables):
+                self._buckets[table].setdefault(int(signature[table]), set()).add(row)
+
+    def delete(self, post_id):
+        """Remove a post; its row is reused by later inserts"""
+        with self._lock:
+            self._delete(post_id)
+
+    def _delete(self, post_id):
+        row = self._rows.pop(post_id, None)
+        if row is None:
+            return
+        for table in range(self.n_tables):
+            signature = int(self._signatures[row, table])
+            bucket = self._buckets[table].get(signature)
+            if bucket is not None:
+                bucket.discard(row)
+                if not bucket:
+                    del self._buckets[table][signature]
+        self._ids[row] = None
+        self._vectors[row] = 0
+        self._free.append(row)
+
+    def _candidate_rows(self, vector, n_probes):
+        projections = self._project(vector[None, :])[0]
+        signatures = self._signatures_of(projections[None, :])[0]
+        # Probe the buckets reached by flipping the least certain bits
+        uncertain = np.argsort(np.abs(projections), axis=1)[:, :n_probes]
+
+        rows = set()
+        for table in range(self.n_tables):
+            signature = int(signatures[table])
+            rows |= self._buckets[table].get(signature, set())
+            for bit in uncertain[table]:
+                rows |= self._buckets[table].get(signature ^ (1 << int(bit)), set())
+        return rows
+
+    def query(self, vector, k, n_probes=None):
+        """
+        Approximate top-k posts by cosine similarity
+
+        Returns:
+            List of (post id, similarity), most similar first
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        n_probes = self.n_probes if n_probes is None else n_probes
+        with self._lock:
+            rows = self._candidate_rows(vector, min(n_probes, self.n_bits))
+            if not rows:
+                return []
+            rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            return self._top_k(rows, self._vectors[rows] @ vector, k)
+
+    def exact_query(self, vector, k):
+        """Exact top-k by brute force, used to measure recall"""
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            rows = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            if not len(rows):
+                return []
+            return self._top_k(rows, self._vectors[rows] @ vector, k)
+
+    def _top_k(self, rows, similarities, k):
+        if len(rows) > k:
+            top = np.argpartition(-similarities, k - 1)[:k]
+            rows, similarities = rows[top], similarities[top]
+        order = np.argsort(-similarities, kind='stable')
+        return [(self._ids[rows[i]], float(similarities[i])) for i in order]
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def _ann_enabled():
+    return os.environ.get('RECOMMENDER_ANN', '').lower() in ('1', 'true', 'yes')
+
+
+# Number of approximate candidates re-scored exactly per request
+ANN_CANDIDATES = int(os.environ.get('RECOMMENDER_ANN_CANDIDATES', 500))
+
+# Shared index for the whole process, or None when ANN retrieval is disabled
+post_ann_index = LSHIndex(
+    n_tables=int(os.environ.get('RECOMMENDER_ANN_TABLES', DEFAULT_TABLES)),
+    n_bits=int(os.environ.get('RECOMMENDER_ANN_BITS', DEFAULT_BITS)),
+    n_probes=int(os.environ.get('RECOMMENDER_ANN_PROBES', DEFAULT_PROBES))
+) if _ann_enabled() else None
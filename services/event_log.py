@@ -0,0 +1,243 @@
+"""
+Append-only log of the writes the recommender derives state from.
+
+The post, profile and view write paths append compact events (likes,
+unlikes, views, post and profile changes) to the capped
+`interaction_events` collection. Consumers read the log in `_id` order and
+fold the events into derived structures:
+
+- a checkpointed consumer stores its position in `event_checkpoints`, so a
+  restart resumes where it stopped. Its first run starts at the oldest
+  event in the log. A lease on the checkpoint keeps one
+  process at a time consuming, however many API processes run it.
+- a process-local tail keeps its position in memory and starts at the head
+  of the log, for in-process state that is rebuilt at startup anyway.
+
+Event ids are generated by the writers, so ids from different processes
+only order by second. Consumers therefore stay EVENT_SETTLE_SECONDS behind
+the head, so an event cannot appear behind a position they already passed.
+If a checkpointed consumer falls a whole capped log behind, its last event
+is gone and it cannot tell what it missed. It then calls its rebuild
+function and restarts from the head.
+
+The position is saved once per batch, so a batch that fails part-way, or
+whose lease runs out and passes to another process, is read again from its
+start. Handlers must therefore be idempotent: applying a run of events twice
+has to leave the same state as applying it once.
+"""
+
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from mongo_helper import interaction_events_collection, event_checkpoints_collection
+
+EVENT_SETTLE_SECONDS = float(os.environ.get('EVENT_SETTLE_SECONDS', 2))
+EVENT_BATCH_SIZE = int(os.environ.get('EVENT_BATCH_SIZE', 1000))
+EVENT_POLL_SECONDS = float(os.environ.get('EVENT_POLL_SECONDS', 1))
+EVENT_LEASE_SECONDS = float(os.environ.get('EVENT_LEASE_SECONDS', 30))
+
+# Event types
+LIKE = 'like'
+UNLIKE = 'unlike'
+VIEW = 'view'
+POST_CREATED = 'post_created'
+POST_UPDATED = 'post_updated'
+POST_DELETED = 'post_deleted'
+PROFILE_CHANGED = 'profile_changed'
+MODEL_UPDATED = 'model_updated'  # written by the model updater after a fold
+
+# Position before every event
+LOG_START = ObjectId('0' * 24)
+
+
+def make_event(event_type, user=None, post=None, **fields):
+    """Event document; only the fields that are set are stored"""
+    event = {"_id": ObjectId(), "type": event_type}
+    if user is not None:
+        event["user"] = ObjectId(user) if isinstance(user, str) else user
+    if post is not None:
+        event["post"] = post
+    event.update(fields)
+    return event
+
+
+def append_event(event_type, user=None, post=None, **fields):
+    """Append one event; failures are logged, never raised to the write path"""
+    try:
+        interaction_events_collection.insert_one(make_event(event_type, user, post, **fields))
+    except Exception as e:
+        print(f"Event log append error: {e}")
+
+
+def append_events(events):
+    """Append events built with make_event in one write"""
+    if not events:
+        return
+    try:
+        interaction_events_collection.insert_many(events, ordered=False)
+    except Exception as e:
+        print(f"Event log append error: {e}")
+
+
+def settled_head():
+    """Position before which no new event can still appear"""
+    settled = datetime.now(timezone.utc) - timedelta(seconds=EVENT_SETTLE_SECONDS)
+    return ObjectId.from_datetime(settled)
+
+
+class EventConsumer:
+    """
+    Reads the log in order and hands runs of same-type events to handlers
+
+    Args:
+        name: Checkpoint id, or None for a process-local tail
+        handlers: Event type -> function taking a list of events; types
+            without a handler are skipped
+        rebuild: For checkpointed consumers, function that rebuilds the
+            derived state from the raw collections after a gap
+    """
+
+    def __init__(self, name, handlers, rebuild=None, batch_size=EVENT_BATCH_SIZE):
+        self.name = name
+        self.handlers = handlers
+        self.rebuild = rebuild
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._position = None   # exclusive lower bound of the next read
+        self._last_event = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, position=None):
+        """
+        Consume in a background thread
+
+        Args:
+            position: Where a process-local tail starts (default: the head)
+        """
+        if self.name is None and self._position is None:
+            self._position = position or settled_head()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"events-{self.name or 'tail'}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.poll() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Event consumer {self.name or 'tail'} error: {e}")
+            self._stop.wait(EVENT_POLL_SECONDS)
+
+    def poll(self):
+        """
+        Apply the next batch of settled events
+
+        Returns:
+            Number of events read (0 when caught up or another process holds
+            the lease)
+        """
+        if self.name is not None:
+            if not self._load_checkpoint():
+                return 0
+        elif self._position is None:
+            self._position = settled_head()
+
+        head = settled_head()
+        events = list(interaction_events_collection.find(
+            {"_id": {"$gt": self._position, "$lt": head}}
+        ).sort("_id", 1).limit(self.batch_size))
+
+        # Hand consecutive events of one type over together so handlers can batch writes
+        runs = []
+        for event in events:
+            if not runs or runs[-1][0]['type'] != event['type']:
+                runs.append([])
+            runs[-1].append(event)
+        for run in runs:
+            # Stop if the lease passed to another process during the batch
+            if self.name is not None and not self._renew_lease():
+                print(f"Event consumer {self.name} lost its lease")
+                return 0
+            self._apply(run)
+
+        if events:
+            self._position = self._last_event = events[-1]['_id']
+        else:
+            # Everything before the head has been read
+            self._position = head
+        if self.name is not None:
+            self._save_checkpoint()
+        return len(events)
+
+    def _apply(self, events):
+        if events and events[0]['type'] in self.handlers:
+            self.handlers[events[0]['type']](events)
+
+    def _lease(self):
+        # UTC, like every stored date, so processes in any timezone agree on expiry
+        return {"owner": self.owner, "leaseUntil": datetime.now(timezone.utc) + timedelta(seconds=EVENT_LEASE_SECONDS)}
+
+    def _renew_lease(self):
+        """Extend the lease if this process still holds it"""
+        result = event_checkpoints_collection.update_one(
+            {"_id": self.name, "owner": self.owner}, {"$set": self._lease()}
+        )
+        return result.matched_count == 1
+
+    def _load_checkpoint(self):
+        """Take or renew the lease and load the stored position"""
+        lease = self._lease()
+        checkpoint = event_checkpoints_collection.find_one_and_update(
+            {"_id": self.name, "$or": [{"owner": self.owner}, {"leaseUntil": {"$lt": datetime.now(timezone.utc)}}]},
+            {"$set": lease},
+            return_document=ReturnDocument.AFTER
+        )
+        if checkpoint is None:
+            try:
+                # First run: fold everything still in the log, including the
+                # events written before any consumer was running
+                checkpoint = dict(lease, _id=self.name, position=LOG_START, lastEvent=None)
+                event_checkpoints_collection.insert_one(checkpoint)
+            except DuplicateKeyError:
+                # The checkpoint exists and another process holds the lease
+                self._position = None
+                return False
+
+        self._position = checkpoint['position']
+        self._last_event = checkpoint.get('lastEvent')
+        if self._last_event is not None and not interaction_events_collection.find_one(
+            {"_id": self._last_event}, {"_id": 1}
+        ):
+            self._recover()
+        return True
+
+    def _recover(self):
+        print(f"Event consumer {self.name} fell behind the capped log, rebuilding")
+        # Events written during the rebuild are applied again afterwards,
+        # which idempotent handlers absorb
+        head = settled_head()
+        if self.rebuild is not None:
+            self.rebuild()
+        self._position = head
+        self._last_event = None
+        self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        event_checkpoints_collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": {
+                "position": self._position, "lastEvent": self._last_event, "updatedAt": datetime.now(timezone.utc)
+            }}
+        )
@@ -0,0 +1,96 @@
+"""
+Ranked-list snapshots backing the cursor-paginated feed.
+
+The first page of a feed session stores the user's whole ranked list (up to
+FEED_SNAPSHOT_SIZE posts) in the `feed_snapshots` collection under a fresh
+version. Every later page is a `$slice` of that list, so deep scrolling never
+re-scores and pages never overlap. Continuation tokens are opaque strings
+encoding the snapshot version and the offset of the next page. Starting a new
+session replaces the snapshot, and snapshots expire after FEED_SNAPSHOT_TTL
+seconds; cursors into a replaced or expired snapshot are rejected.
+"""
+
+import base64
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from mongo_helper import feed_snapshots_collection
+
+FEED_SNAPSHOT_SIZE = int(os.environ.get('FEED_SNAPSHOT_SIZE', 200))
+FEED_SNAPSHOT_TTL = int(os.environ.get('FEED_SNAPSHOT_TTL', 1800))
+MAX_PAGE_SIZE = 50
+
+
+def encode_cursor(version, offset):
+    """Opaque continuation token for the page starting at offset"""
+    return base64.urlsafe_b64encode(f"{version}:{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Reverse encode_cursor
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        version, offset = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        offset = int(offset)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not ObjectId.is_valid(version) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return version, offset
+
+
+def create_snapshot(user_id, post_ids):
+    """
+    Store a new ranked list for a user, replacing their previous snapshot
+
+    Returns:
+        Version string of the new snapshot
+    """
+    user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+    version = str(ObjectId())
+    feed_snapshots_collection.replace_one(
+        {"user": user_id_obj},
+        {
+            "user": user_id_obj,
+            "version": version,
+            "posts": [ObjectId(post_id) for post_id in post_ids],
+            "size": len(post_ids),
+            # UTC, which is how the TTL index reads it
+            "createdAt": datetime.now(timezone.utc)
+        },
+        upsert=True
+    )
+    return version
+
+
+def read_page(user_id, version, offset, limit):
+    """
+    Slice one page out of a user's snapshot
+
+    Returns:
+        Tuple of (post ID strings, snapshot size), or None if the snapshot
+        was replaced or has expired
+    """
+    user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+    snapshot = feed_snapshots_collection.find_one(
+        {"user": user_id_obj, "version": version},
+        {"posts": {"$slice": [offset, limit]}, "size": 1, "createdAt": 1}
+    )
+    if not snapshot:
+        return None
+    # The TTL monitor only runs once a minute, so check the age here as well
+    # (pymongo returns naive datetimes in UTC)
+    created_at = snapshot['createdAt']
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - created_at > timedelta(seconds=FEED_SNAPSHOT_TTL):
+        return None
+
+    return [str(post_id) for post_id in snapshot.get('posts', [])], snapshot['size']
@@ -0,0 +1,82 @@
+"""
+Materialized feeds precomputed offline by feed_worker.py.
+
+Each user's ranked post list is stored in the `recommendations` collection
+with the time it was generated. The API serves it while it is fresh and
+falls back to online scoring when it is missing or older than
+MATERIALIZED_FEED_MAX_AGE seconds. Feeds are discarded as soon as the
+user's likes, views or profile change.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from mongo_helper import recommendations_collection
+
+FEED_MAX_AGE_SECONDS = float(os.environ.get('MATERIALIZED_FEED_MAX_AGE', 900))
+
+
+def load_feed(user_id, limit):
+    """
+    Get a user's materialized feed
+
+    Returns:
+        List of post ID strings, or None if the feed is missing, stale or was
+        balanced for a different length
+    """
+    user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+    feed = recommendations_collection.find_one({"user": user_id_obj})
+    if not feed or feed.get('limit') != limit:
+        return None
+
+    # pymongo returns naive datetimes in UTC
+    generated_at = feed['generatedAt']
+    if generated_at.tzinfo is None:
+        generated_at = generated_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - generated_at > timedelta(seconds=FEED_MAX_AGE_SECONDS):
+        return None
+
+    return [str(post_id) for post_id in feed.get('posts', [])]
+
+
+def save_feeds(results, limit, generated_at):
+    """
+    Store materialized feeds
+
+    Args:
+        results: Dict of user ID string -> list of post ID strings
+        limit: Feed length the lists were balanced for
+        generated_at: Generation timestamp written on every feed (aware UTC)
+    """
+    operations = [
+        ReplaceOne(
+            {"user": ObjectId(user_id)},
+            {
+                "user": ObjectId(user_id),
+                "posts": [ObjectId(post_id) for post_id in post_ids],
+                "limit": limit,
+                "generatedAt": generated_at
+            },
+            upsert=True
+        )
+        for user_id, post_ids in results.items()
+    ]
+    if operations:
+        recommendations_collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def discard_feed(user_id):
+    """Drop a user's materialized feed after their likes, views or profile change"""
+    user_id_obj = ObjectId(user_id) if isinstance(user_id, str) else user_id
+    recommendations_collection.delete_one({"user": user_id_obj})
+
+
+def discard_feeds(user_ids):
+    """Drop the materialized feeds of several users in one write"""
+    recommendations_collection.delete_many({"user": {"$in": [
+        ObjectId(user_id) if isinstance(user_id, str) else user_id for user_id in user_ids
+    ]}})
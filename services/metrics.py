@@ -0,0 +1,178 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Collected here:
+- HTTP request latency histograms and request/error counters per blueprint
+  and route (recorded by middleware/metrics.py)
+- MongoDB command counts and durations from a pymongo command listener
+  passed to the MongoClient in mongo_helper.py
+- Recommendation cache counters, per-stage pipeline histograms and the view
+  buffer backlog, read from their own modules at scrape time
+
+Updates hold the registry lock only long enough to bump a number, and a
+scrape copies the values under the lock and formats them after releasing
+it, so scraping does not stall the request path.
+"""
+
+import threading
+
+from pymongo import monitoring
+
+from services.timing import Histogram
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+
+class MetricsRegistry:
+    """Labelled counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}        # name -> (type, help text)
+        self._counters = {}    # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: Histogram}
+
+    def counter(self, name, help_text):
+        self._help[name] = ('counter', help_text)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name, help_text):
+        self._help[name] = ('histogram', help_text)
+        self._histograms.setdefault(name, {})
+
+    def inc(self, name, labels, value=1):
+        """
+        Add to a counter
+
+        Args:
+            labels: Tuple of (label, value) pairs
+        """
+        with self._lock:
+            series = self._counters[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value):
+        """Record one observation in a histogram"""
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(LATENCY_BUCKETS_SECONDS)
+            histogram.observe(value)
+
+    def collect(self):
+        """Copy every series so formatting can happen outside the lock"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {labels: histogram.copy() for labels, histogram in series.items()}
+                for name, series in self._histograms.items()
+            }
+        return counters, histograms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(name, labels, histogram, scale=1.0):
+    """Cumulative bucket, sum and count samples of one histogram series"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        bound_label = _format_value(bound * scale if bound != float('inf') else bound)
+        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound_label),))} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum * scale)}")
+    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+def _header(name, metric_type, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Count and time every MongoDB command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, 'success')
+
+    def failed(self, event):
+        self._record(event, 'failure')
+
+    def _record(self, event, status):
+        command = (('command', event.command_name),)
+        registry.inc('mongodb_commands_total', command + (('status', status),))
+        registry.observe('mongodb_command_duration_seconds', command, event.duration_micros / 1e6)
+
+
+def render_metrics():
+    """Every metric in the Prometheus text format"""
+    # Imported here so mongo_helper can import this module for the listener
+    from services.recommendation_cache import recommendation_cache
+    from services.timing import pipeline_timings
+    from services.view_buffer import view_buffer
+
+    counters, histograms = registry.collect()
+    lines = []
+    for name, series in counters.items():
+        lines += _header(name, *registry._help[name])
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in series.items()]
+    for name, series in histograms.items():
+        lines += _header(name, *registry._help[name])
+        for labels, histogram in series.items():
+            lines += _histogram_lines(name, labels, histogram)
+
+    # Recommendation cache counters
+    cache_stats = recommendation_cache.stats()
+    for key, metric_type, help_text in (
+        ('entries', 'gauge', "Users with a cached feed"),
+        ('hits', 'counter', "Cache lookups that returned a feed"),
+        ('misses', 'counter', "Cache lookups that found no feed"),
+        ('evictions', 'counter', "Feeds evicted to respect the size limit"),
+        ('expirations', 'counter', "Feeds dropped after their TTL"),
+        ('invalidations', 'counter', "Feeds dropped by writes")
+    ):
+        name = f"recommendation_cache_{key}" + ('_total' if metric_type == 'counter' else '')
+        lines += _header(name, metric_type, help_text)
+        lines.append(f"{name} {cache_stats[key]}")
+
+    name = 'view_buffer_pending'
+    lines += _header(name, 'gauge', "Views waiting for the next view buffer flush")
+    lines.append(f"{name} {view_buffer.pending()}")
+
+    # Recommender pipeline stages, recorded in milliseconds
+    name = 'recommender_stage_duration_seconds'
+    lines += _header(name, 'histogram', "Wall time of each recommendation pipeline stage")
+    for stage_name, histogram in pipeline_timings.duration_histograms().items():
+        lines += _histogram_lines(name, (('stage', stage_name),), histogram, scale=0.001)
+
+    return '\n'.join(lines) + '\n'
+
+
+# Shared registry for the whole process
+registry = MetricsRegistry()
+registry.counter('http_requests_total', "HTTP requests by blueprint, route, method and status")
+registry.counter('http_request_errors_total', "HTTP requests that ended in a 5xx response")
+registry.histogram('http_request_duration_seconds', "HTTP request latency by blueprint, route and method")
+registry.counter('mongodb_commands_total', "MongoDB commands by name and outcome")
+registry.histogram('mongodb_command_duration_seconds', "MongoDB command latency by name")
+
+mongo_command_listener = MongoCommandListener()
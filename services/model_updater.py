@@ -0,0 +1,251 @@
+"""
+Folds the event log into the recommender's derived state.
+
+Two consumers of services/event_log.py:
+
+- `model_updater` (checkpointed, one process at a time) owns the persisted
+  state: liked-tag histograms and neighbor staleness from likes, unlikes and
+  post tag changes, seen filters from views, and the interactions of
+  deleted posts. It drops the materialized feeds of the users it touches.
+  A batch replayed after a failure or a lease handover changes nothing:
+  histogram increments only apply to profiles that have not folded their
+  event yet, seen-filter bits are OR-ed in and deletes are deletes. If it
+  falls a whole capped log behind, it rebuilds histograms and seen filters
+  from the raw collections.
+- `index_tail` (one per API process) keeps process-resident state current
+  with writes made by every process: the tag/ANN index for post events,
+  and the recommendation cache for profile edits and for the users the
+  model updater reports after each fold.
+
+Usage:
+    python -m services.model_updater          # consume until caught up
+    python -m services.model_updater --loop   # keep consuming
+"""
+
+import argparse
+import time
+
+from pymongo import UpdateOne
+
+from mongo_helper import (
+    interactions_collection, interaction_events_collection, posts_collection, user_profiles_collection
+)
+from services.event_log import (
+    EventConsumer, EVENT_POLL_SECONDS, append_event,
+    LIKE, UNLIKE, VIEW, POST_CREATED, POST_UPDATED, POST_DELETED, PROFILE_CHANGED, MODEL_UPDATED
+)
+from services.materialized_feed import discard_feeds
+from services.recommendation_cache import recommendation_cache
+from services.seen_filter import SEEN_FIELD, SEEN_SLICE_FIELD, seen_update, rebuild_all_seen_filters
+from services.tag_affinity import (
+    affinity_increments, affinity_unfolded, affinity_update, merge_increments, rebuild_all_affinities
+)
+from services.tag_index import tag_index
+
+
+def _folded(user_ids):
+    """
+    After a fold's write: drop the users' materialized feeds and cached
+    lists here, and tell the other processes' tails to drop theirs
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    discard_feeds(user_ids)
+    for user_id in user_ids:
+        recommendation_cache.invalidate(user_id)
+    append_event(MODEL_UPDATED, users=user_ids)
+
+
+def _fold_likes(events, delta):
+    # One write per user: the increments of all their events in the run,
+    # applied unless the profile has already folded the last of them
+    increments, last_event = {}, {}
+    for event in events:
+        user_id = event['user']
+        merge_increments(increments.setdefault(user_id, {}), affinity_increments(event.get('tags'), delta))
+        last_event[user_id] = event['_id']
+    user_profiles_collection.bulk_write([
+        UpdateOne(
+            dict(affinity_unfolded(event_id), user=user_id),
+            # The event id doubles as the neighbor-graph stale marker, so a
+            # replay writes the same one
+            affinity_update(increments[user_id], event_id, stale=event_id)
+        )
+        for user_id, event_id in last_event.items()
+    ], ordered=False)
+    _folded(last_event)
+
+
+def fold_likes(events):
+    _fold_likes(events, 1)
+
+
+def fold_unlikes(events):
+    _fold_likes(events, -1)
+
+
+def fold_views(events):
+    """One seen-filter slice write per user (setting bits again is a no-op)"""
+    posts_per_user = {}
+    for event in events:
+        posts_per_user.setdefault(event['user'], []).append(event['post'])
+    profiles = user_profiles_collection.find(
+        {"user": {"$in": list(posts_per_user)}}, {"user": 1, SEEN_FIELD: 1, SEEN_SLICE_FIELD: 1}
+    )
+    operations = [
+        UpdateOne({"_id": profile['_id']}, seen_update(profile, posts_per_user[profile['user']]))
+        for profile in profiles
+    ]
+    if operations:
+        user_profiles_collection.bulk_write(operations, ordered=False)
+    _folded(posts_per_user)
+
+
+def likers_at(event):
+    """
+    Users who liked the event's post when the event was written
+
+    The interactions collection is already ahead of the consumer, so likes
+    and unlikes of the post logged after the event are rolled back.
+    """
+    likers = {i['user'] for i in interactions_collection.find(
+        {"post": event['post'], "interactionType": "like"}, {"user": 1}
+    )}
+    later = interaction_events_collection.find(
+        {"post": event['post'], "type": {"$in": [LIKE, UNLIKE]}, "_id": {"$gt": event['_id']}},
+        {"user": 1, "type": 1}
+    ).sort("_id", 1)
+    decided = set()
+    for later_event in later:
+        user_id = later_event['user']
+        if user_id in decided:
+            continue
+        decided.add(user_id)
+        # The first later event tells whether the user was a liker at the time
+        if later_event['type'] == LIKE:
+            likers.discard(user_id)
+        else:
+            likers.add(user_id)
+    return likers
+
+
+def shift_affinity(event, likers, old_tags, new_tags=None):
+    """
+    Shift the histograms of everyone who liked a post when its tags change
+    or the post is deleted (new_tags=None)
+    """
+    if not likers:
+        return
+    increments = merge_increments(affinity_increments(old_tags, -1), affinity_increments(new_tags, 1))
+    user_profiles_collection.update_many(
+        dict(affinity_unfolded(event['_id']), user={"$in": list(likers)}),
+        affinity_update(increments, event['_id'])
+    )
+
+
+def fold_post_updates(events):
+    """Tag changes: move the likers' counts from the old tags to the new ones"""
+    touched = set()
+    for event in events:
+        likers = likers_at(event)
+        shift_affinity(event, likers, event.get('oldTags'), event.get('tags'))
+        touched |= likers
+    _folded(touched)
+
+
+def fold_post_deletes(events):
+    """Deletes: take the posts' tags off their likers, then drop the interactions"""
+    touched = set()
+    for event in events:
+        likers = likers_at(event)
+        shift_affinity(event, likers, event.get('tags'))
+        interactions_collection.delete_many({"post": event['post']})
+        touched |= likers
+    _folded(touched)
+
+
+def delete_orphaned_interactions(batch_size=1000):
+    """Delete the interactions of posts that no longer exist"""
+    post_ids = interactions_collection.distinct("post")
+    count = 0
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start:start + batch_size]
+        existing = {post['_id'] for post in posts_collection.find({"_id": {"$in": batch}}, {"_id": 1})}
+        orphaned = [post_id for post_id in batch if post_id not in existing]
+        if orphaned:
+            count += interactions_collection.delete_many({"post": {"$in": orphaned}}).deleted_count
+    return count
+
+
+def rebuild():
+    """Recompute the state this consumer maintains from the raw collections"""
+    # Post deletes lost with the gap left their interactions behind
+    delete_orphaned_interactions()
+    rebuild_all_affinities()
+    rebuild_all_seen_filters()
+
+
+model_updater = EventConsumer('model_updater', {
+    LIKE: fold_likes,
+    UNLIKE: fold_unlikes,
+    VIEW: fold_views,
+    POST_UPDATED: fold_post_updates,
+    POST_DELETED: fold_post_deletes
+}, rebuild=rebuild)
+
+
+def _index_posts(events):
+    for event in events:
+        tag_index.update_post(event['post'], event.get('tags'))
+    recommendation_cache.invalidate_all()
+
+
+def _unindex_posts(events):
+    for event in events:
+        tag_index.remove_post(event['post'])
+    recommendation_cache.invalidate_all()
+
+
+def _invalidate_users(events):
+    for event in events:
+        recommendation_cache.invalidate(event['user'])
+
+
+def _invalidate_folded_users(events):
+    for event in events:
+        for user_id in event.get('users', []):
+            recommendation_cache.invalidate(user_id)
+
+
+# Likes, unlikes and views only change what the recommender reads once the
+# model updater has folded them, so their cached lists are dropped on its
+# model_updated events rather than on the raw events
+index_tail = EventConsumer(None, {
+    POST_CREATED: _index_posts,
+    POST_UPDATED: _index_posts,
+    POST_DELETED: _unindex_posts,
+    PROFILE_CHANGED: _invalidate_users,
+    MODEL_UPDATED: _invalidate_folded_users
+})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold the interaction event log into the recommender state")
+    parser.add_argument('--loop', action='store_true', help="keep consuming new events")
+    args = parser.parse_args()
+
+    count = 0
+    while True:
+        read = model_updater.poll()
+        count += read
+        if read == model_updater.batch_size:
+            continue
+        if not args.loop:
+            break
+        time.sleep(EVENT_POLL_SECONDS)
+    print(f"Folded {count} events")
+
+
+if __name__ == "__main__":
+    main()
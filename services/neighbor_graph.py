@@ -0,0 +1,180 @@
+"""
+Offline user-user KNN neighbor graph for peer-based recommendations.
+
+Every user is encoded as a profile tag vector (normalized skills and feed
+preferences) next to an interaction vector (liked posts), each block L2
+normalized so both carry equal weight. A cosine NearestNeighbors model finds
+the top-K most similar users, and the result is persisted to the
+`user_neighbors` collection. The request path only reads that list.
+
+Profiles are flagged with `neighborsStale` whenever their skills,
+preferences or likes change, so refreshes only re-query those users. The flag
+is a fresh marker on every change, and a refresh only clears it if it still
+holds the marker read with the profile, so a change made while the graph is
+being computed keeps the user flagged for the next refresh.
+
+Usage:
+    python -m services.neighbor_graph            # refresh stale users
+    python -m services.neighbor_graph --full     # rebuild every user
+"""
+
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+from bson import ObjectId
+from scipy import sparse
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import normalize
+
+from mongo_helper import interactions_collection, user_profiles_collection, neighbors_collection
+from services.tags import profile_skills, profile_preferences
+
+DEFAULT_NEIGHBORS = 10
+STALE_FIELD = 'neighborsStale'
+
+
+def stale_marker():
+    """
+    Value of STALE_FIELD for a profile that just changed (unique per change;
+    the model updater uses the id of the event it folded instead)
+    """
+    return ObjectId()
+
+
+def _one_hot(rows_of_keys, n_rows):
+    """Binary sparse matrix with one column per distinct key"""
+    columns = {}
+    rows, cols = [], []
+    for row, keys in enumerate(rows_of_keys):
+        for key in set(keys):
+            rows.append(row)
+            cols.append(columns.setdefault(key, len(columns)))
+    data = np.ones(len(rows), dtype=np.float64)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(n_rows, max(len(columns), 1)))
+
+
+def build_user_vectors():
+    """
+    Encode every profiled user
+
+    Returns:
+        Tuple of (user ids in row order, CSR matrix of user vectors,
+        user id -> STALE_FIELD marker of the flagged users)
+    """
+    profiles = list(user_profiles_collection.find({}, {
+        "user": 1, "skills": 1, "feedPreferences": 1, "normalizedSkills": 1, "normalizedFeedPreferences": 1,
+        STALE_FIELD: 1
+    }))
+    user_ids = [profile['user'] for profile in profiles]
+    stale = {profile['user']: profile[STALE_FIELD] for profile in profiles if STALE_FIELD in profile}
+    rows = {user_id: row for row, user_id in enumerate(user_ids)}
+
+    profile_terms = [profile_skills(profile) + profile_preferences(profile) for profile in profiles]
+
+    liked_posts = [[] for _ in user_ids]
+    for interaction in interactions_collection.find({"interactionType": "like"}, {"user": 1, "post": 1}):
+        row = rows.get(interaction['user'])
+        if row is not None:
+            liked_posts[row].append(interaction['post'])
+
+    vectors = sparse.hstack([
+        normalize(_one_hot(profile_terms, len(user_ids))),
+        normalize(_one_hot(liked_posts, len(user_ids)))
+    ]).tocsr()
+    return user_ids, vectors, stale
+
+
+def _fit(vectors, k):
+    """Fit a cosine KNN model over all user vectors"""
+    model = NearestNeighbors(n_neighbors=min(k + 1, vectors.shape[0]), metric='cosine', algorithm='brute')
+    model.fit(vectors)
+    return model
+
+
+def _neighbor_documents(model, vectors, user_ids, rows, k):
+    """Query the model for the given rows and shape the neighbor lists"""
+    distances, indices = model.kneighbors(vectors[rows])
+    now = datetime.now(timezone.utc)
+    for row, row_distances, row_indices in zip(rows, distances, indices):
+        neighbors = [
+            {"user": user_ids[i], "similarity": float(1 - distance)}
+            for distance, i in zip(row_distances, row_indices)
+            if i != row and distance < 1
+        ][:k]
+        yield {"user": user_ids[row], "neighbors": neighbors, "updatedAt": now}
+
+
+def _save(documents, stale):
+    """Store neighbor lists and clear the flags of users unchanged since they were read"""
+    count = 0
+    for document in documents:
+        neighbors_collection.replace_one({"user": document['user']}, document, upsert=True)
+        if document['user'] in stale:
+            user_profiles_collection.update_one(
+                {"user": document['user'], STALE_FIELD: stale[document['user']]},
+                {"$unset": {STALE_FIELD: ""}}
+            )
+        count += 1
+    return count
+
+
+def build_neighbor_graph(k=DEFAULT_NEIGHBORS):
+    """Rebuild the neighbor list of every user"""
+    user_ids, vectors, stale = build_user_vectors()
+    if len(user_ids) < 2:
+        return 0
+
+    model = _fit(vectors, k)
+    return _save(_neighbor_documents(model, vectors, user_ids, list(range(len(user_ids))), k), stale)
+
+
+def refresh_stale_neighbors(k=DEFAULT_NEIGHBORS):
+    """Recompute neighbor lists only for users whose profile or likes changed"""
+    if not user_profiles_collection.find_one({STALE_FIELD: {"$exists": True}}, {"_id": 1}):
+        return 0
+
+    user_ids, vectors, stale = build_user_vectors()
+    if len(user_ids) < 2:
+        return 0
+
+    model = _fit(vectors, k)
+    rows = [row for row, user_id in enumerate(user_ids) if user_id in stale]
+    return _save(_neighbor_documents(model, vectors, user_ids, rows, k), stale)
+
+
+def get_neighbor_liked_posts(user_id, max_time_ms=None):
+    """
+    Posts liked by a user's precomputed neighbors
+
+    Args:
+        max_time_ms: Server-side time limit for each of the two reads
+
+    Returns:
+        Set of post ObjectIds (empty if the graph has no entry for the user)
+    """
+    entry = neighbors_collection.find_one({"user": user_id}, {"neighbors.user": 1}, max_time_ms=max_time_ms)
+    neighbor_ids = [neighbor['user'] for neighbor in (entry or {}).get('neighbors', [])]
+    if not neighbor_ids:
+        return set()
+
+    return {i['post'] for i in interactions_collection.find(
+        {"user": {"$in": neighbor_ids}, "interactionType": "like"}, {"post": 1}, max_time_ms=max_time_ms
+    )}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the user-user KNN neighbor graph")
+    parser.add_argument('--full', action='store_true', help="rebuild every user instead of only stale ones")
+    parser.add_argument('-k', type=int, default=DEFAULT_NEIGHBORS, help="neighbors per user")
+    args = parser.parse_args()
+
+    if args.full:
+        count = build_neighbor_graph(args.k)
+    else:
+        count = refresh_stale_neighbors(args.k)
+    print(f"Updated neighbor lists for {count} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Keyset pagination and NDJSON streaming for list endpoints.
+
+List endpoints order by `_id` and page with `?after=<id>&limit=<n>`: a page
+is the next `limit` documents past `after` (DEFAULT_PAGE_SIZE, at most
+MAX_PAGE_SIZE). The X-Next-After response header carries the `after` value
+for the next page and is omitted on the last one. Every page is a range scan
+on an `_id`-ordered index, so deep pages cost the same as the first.
+
+With `?stream=1` (or `Accept: application/x-ndjson`) the response is one JSON
+document per line, written from the cursor as it is read; without a limit it
+covers the whole result set. Documents are formatted STREAM_CHUNK_SIZE at a
+time, so memory stays flat and the first bytes go out after one chunk. A
+streamed page has no X-Next-After header: the `_id` of its last line is the
+next `after`.
+"""
+
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, current_app, jsonify, stream_with_context
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 100))
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream(request):
+    """Whether the client asked for an NDJSON stream"""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def parse_page_args(after, limit, stream=False):
+    """
+    Validate the ?after= and ?limit= query arguments
+
+    Returns:
+        (after ObjectId or None, limit); the limit is None for an
+        unbounded stream
+
+    Raises:
+        ValueError: With a message for the client
+    """
+    if after:
+        try:
+            after = ObjectId(after)
+        except (InvalidId, TypeError):
+            raise ValueError("Invalid after id")
+    else:
+        after = None
+
+    if limit is None:
+        return after, (None if stream else DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("Invalid limit")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"Limit must be between 1 and {MAX_PAGE_SIZE}")
+    return after, limit
+
+
+def keyset_filter(query, after, descending=False):
+    """Restrict a query to the documents past `after` in `_id` order"""
+    if after is None:
+        return query
+    return dict(query, _id={"$lt" if descending else "$gt": after})
+
+
+def page_response(documents, limit, format_documents):
+    """
+    JSON array response for one page
+
+    Args:
+        documents: The page, read with .limit(limit)
+        limit: Page size; a full page gets an X-Next-After header
+        format_documents: Function turning a list of raw documents into
+            JSON-ready ones
+    """
+    last_id = documents[-1]['_id'] if documents else None
+    response = jsonify(format_documents(documents))
+    if limit is not None and len(documents) == limit:
+        response.headers['X-Next-After'] = str(last_id)
+    return response
+
+
+def ndjson_response(cursor, format_documents, label):
+    """
+    Streamed NDJSON response over a cursor
+
+    Errors after the first bytes can no longer become a 500, so they are
+    logged and end the stream early.
+    """
+    def generate():
+        try:
+            chunk = []
+            for document in cursor:
+                chunk.append(document)
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    yield _lines(format_documents(chunk))
+                    chunk = []
+            if chunk:
+                yield _lines(format_documents(chunk))
+        except Exception as e:
+            print(f'{label} stream error: {e}')
+        finally:
+            cursor.close()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def _lines(documents):
+    # Same encoding as jsonify, one document per line
+    return ''.join(current_app.json.dumps(document) + '\n' for document in documents)
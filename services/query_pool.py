@@ -0,0 +1,54 @@
+"""
+Shared bounded thread pool for issuing independent MongoDB reads concurrently.
+
+pymongo releases the GIL while waiting on the network, so reads submitted
+here overlap their round trips. A request's reads share one deadline,
+RECOMMENDER_QUERY_TIMEOUT_MS after its fan-out starts (query_deadline()), so
+waiting on several of them never takes longer than the budget. The server is
+asked to abort each query (max_time_ms) RECOMMENDER_QUERY_TIMEOUT_MARGIN_MS
+before the budget runs out, so a slow query normally ends on the server with
+ExecutionTimeout instead of running on after the caller gave up.
+"""
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+QUERY_WORKERS = int(os.environ.get('RECOMMENDER_QUERY_WORKERS', 16))
+QUERY_TIMEOUT_MS = int(os.environ.get('RECOMMENDER_QUERY_TIMEOUT_MS', 2000))
+QUERY_TIMEOUT_MARGIN_MS = int(os.environ.get('RECOMMENDER_QUERY_TIMEOUT_MARGIN_MS', 100))
+
+# Server-side limit passed as max_time_ms
+SERVER_TIMEOUT_MS = max(1, QUERY_TIMEOUT_MS - QUERY_TIMEOUT_MARGIN_MS)
+
+_pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='recommender-query')
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn on the pool, carrying over the caller's context (e.g. the request trace)"""
+    return _pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def query_deadline():
+    """Deadline shared by every wait_for of one request's fan-out"""
+    return time.monotonic() + QUERY_TIMEOUT_MS / 1000
+
+
+def wait_for(future, name, deadline=None):
+    """
+    Result of a submitted read, waiting until the deadline from
+    query_deadline() (at most QUERY_TIMEOUT_MS from now if None)
+
+    Raises:
+        TimeoutError: If the read missed its deadline
+        pymongo.errors.PyMongoError: If the read failed, including
+            ExecutionTimeout when the server aborted it
+    """
+    if deadline is None:
+        deadline = query_deadline()
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"{name} exceeded the {QUERY_TIMEOUT_MS}ms request budget")
@@ -0,0 +1,128 @@
+"""
+Per-user cache of ranked recommendation lists with TTL and LRU eviction.
+
+Entries are invalidated by the controllers whenever something that feeds the
+recommender changes: a user's likes, views or profile drop that user's entry,
+and any post write drops every entry.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class RecommendationCache:
+    """Thread-safe LRU cache of user id -> {limit: ranked post id list}"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user id -> (expires_at, {limit: ids})
+
+        # Invalidation sequence numbers guard against a computation that started
+        # before an invalidation storing its (now stale) result afterwards
+        self._sequence = 0
+        self._catalog_sequence = 0
+        self._user_sequences = OrderedDict()  # user id -> sequence of last invalidation
+        self._sequence_floor = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, user_id, limit):
+        """Return the cached ranked id list, or None on a miss"""
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            ids = entry[1].get(limit) if entry is not None else None
+            if ids is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(ids)
+
+    def snapshot(self):
+        """Token to pass to set() so stale results are discarded"""
+        with self._lock:
+            return self._sequence
+
+    def set(self, user_id, limit, ids, token):
+        """Store a ranked id list unless the user or catalog changed since token"""
+        key = str(user_id)
+        with self._lock:
+            if (token < self._sequence_floor or token < self._catalog_sequence
+                    or token < self._user_sequences.get(key, 0)):
+                return False
+
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = (time.monotonic() + self.ttl_seconds, {})
+                self._entries[key] = entry
+            entry[1][limit] = list(ids)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, user_id):
+        """Drop one user's cached feed after their likes, views or profile change"""
+        key = str(user_id)
+        with self._lock:
+            self._sequence += 1
+            self._user_sequences[key] = self._sequence
+            self._user_sequences.move_to_end(key)
+            while len(self._user_sequences) > self.max_entries:
+                _, sequence = self._user_sequences.popitem(last=False)
+                self._sequence_floor = max(self._sequence_floor, sequence)
+
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_all(self):
+        """Drop every cached feed after a post is created, updated or deleted"""
+        with self._lock:
+            self._sequence += 1
+            self._catalog_sequence = self._sequence
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+# Shared cache for the whole process
+recommendation_cache = RecommendationCache(
+    ttl_seconds=float(os.environ.get('RECOMMENDATION_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+    max_entries=int(os.environ.get('RECOMMENDATION_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+)
@@ -0,0 +1,188 @@
+"""
+Vectorized scoring engine for the post recommender.
+
+Candidate posts are encoded as a CSR post x tag matrix and the user's skills,
+preferences and liked-tag affinity as sparse vectors, so every candidate is
+scored with a few sparse matrix products instead of nested Python loops.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from services.tags import post_tags
+from services.term_affinity import term_affinity
+
+# Scoring weights
+SKILL_WEIGHT = 5
+PREFERENCE_WEIGHT = 5
+INTERACTION_WEIGHT = 3
+
+
+class TagMatrix:
+    """CSR encoding of the normalized tags of a list of posts"""
+
+    def __init__(self, post_tags):
+        """
+        Args:
+            post_tags: One list of normalized tags per post, in row order
+        """
+        # Cells hold tag counts rather than 0/1 so a post listing two tags
+        # that normalize to the same value counts both, like the original loop
+        columns = {}
+        indices = []
+        indptr = [0]
+        for tags in post_tags:
+            for tag in tags:
+                indices.append(columns.setdefault(tag, len(columns)))
+            indptr.append(len(indices))
+
+        data = np.ones(len(indices), dtype=np.int32)
+        self.matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(post_tags), len(columns)))
+        self.matrix.sum_duplicates()
+        self.vocabulary = list(columns)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+
+def term_match_matrix(terms, vocabulary):
+    """
+    Build a sparse vocabulary x terms matrix with a 1 wherever a term fuzzily
+    matches a tag. Duplicate terms get their own column so they count twice,
+    exactly like iterating over the raw list.
+    """
+    vocabulary_rows = {term_affinity.term_id(tag): row for row, tag in enumerate(vocabulary)}
+
+    matches = {}  # distinct term -> matching vocabulary rows
+    rows, cols = [], []
+    for col, term in enumerate(terms):
+        if term not in matches:
+            # Set intersection on interned ids instead of substring checks
+            matched_ids = term_affinity.matching_ids(term)
+            matches[term] = [vocabulary_rows[i] for i in matched_ids.intersection(vocabulary_rows)]
+        rows.extend(matches[term])
+        cols.extend([col] * len(matches[term]))
+
+    data = np.ones(len(rows), dtype=np.int32)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(vocabulary), len(terms)))
+
+
+def count_term_matches(tag_matrix, terms):
+    """Number of terms matching at least one tag of each post"""
+    if not terms or not tag_matrix.vocabulary:
+        return np.zeros(tag_matrix.shape[0], dtype=np.int64)
+
+    hits = tag_matrix.matrix @ term_match_matrix(terms, tag_matrix.vocabulary)
+    # A term counts once per post no matter how many of its tags it matches
+    return np.asarray((hits > 0).sum(axis=1), dtype=np.int64).ravel()
+
+
+def affinity_vector(liked_tag_affinity, vocabulary):
+    """Dense vocabulary-aligned vector of liked-tag counts"""
+    return np.fromiter((liked_tag_affinity.get(tag, 0) for tag in vocabulary),
+                       dtype=np.int64, count=len(vocabulary))
+
+
+def score_tag_matrix(tag_matrix, skills, preferences, liked_tag_affinity):
+    """
+    Score every row of a tag matrix
+
+    Args:
+        tag_matrix: TagMatrix of candidate posts
+        skills: Normalized user skills
+        preferences: Normalized user feed preferences
+        liked_tag_affinity: Normalized tag -> number of liked posts carrying it
+
+    Returns:
+        Tuple of (scores, skill_matches, pref_matches) arrays
+    """
+    skill_matches = count_term_matches(tag_matrix, skills)
+    pref_matches = count_term_matches(tag_matrix, preferences)
+    interaction_scores = tag_matrix.matrix @ affinity_vector(liked_tag_affinity, tag_matrix.vocabulary)
+    interaction_scores = interaction_scores * INTERACTION_WEIGHT
+
+    scores = (skill_matches * SKILL_WEIGHT) + (pref_matches * PREFERENCE_WEIGHT) + interaction_scores
+    return scores, skill_matches, pref_matches
+
+
+def score_candidates(candidate_posts, skills, preferences, liked_tag_affinity):
+    """
+    Score candidate posts with the sparse engine
+
+    Returns:
+        List of score dicts in candidate order, the same shape produced by the
+        original per-post loop
+    """
+    tag_matrix = TagMatrix([post_tags(post) for post in candidate_posts])
+
+    scores, skill_matches, pref_matches = score_tag_matrix(tag_matrix, skills, preferences, liked_tag_affinity)
+
+    return [
+        {
+            'id': post['_id'],
+            'score': int(scores[i]),
+            'skill_matches': int(skill_matches[i]),
+            'pref_matches': int(pref_matches[i]),
+            'tags': post.get('tags', []),
+            'title': post.get('title', '')
+        }
+        for i, post in enumerate(candidate_posts)
+    ]
+
+
+def grouped_term_matches(tag_matrix, term_lists):
+    """
+    Posts x users matrix counting, for every user, how many of their terms
+    match at least one tag of each post
+    """
+    shape = (tag_matrix.shape[0], len(term_lists))
+    terms = [term for user_terms in term_lists for term in user_terms]
+    if not terms or not tag_matrix.vocabulary:
+        return sparse.csr_matrix(shape, dtype=np.int64)
+
+    hits = (tag_matrix.matrix @ term_match_matrix(terms, tag_matrix.vocabulary)) > 0
+    # Fold each user's term columns back into a single column
+    owners = np.repeat(np.arange(len(term_lists)), [len(user_terms) for user_terms in term_lists])
+    grouping = sparse.csr_matrix(
+        (np.ones(len(terms), dtype=np.int64), (np.arange(len(terms)), owners)),
+        shape=(len(terms), len(term_lists))
+    )
+    return (hits.astype(np.int64) @ grouping).tocsr()
+
+
+def affinity_matrix(liked_tag_affinities, vocabulary):
+    """Sparse vocabulary x users matrix of liked-tag counts"""
+    columns = {tag: i for i, tag in enumerate(vocabulary)}
+    rows, cols, data = [], [], []
+    for user, affinity in enumerate(liked_tag_affinities):
+        for tag, count in affinity.items():
+            if tag in columns:
+                rows.append(columns[tag])
+                cols.append(user)
+                data.append(count)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(vocabulary), len(liked_tag_affinities)),
+                             dtype=np.int64)
+
+
+def score_users(tag_matrix, skill_lists, preference_lists, liked_tag_affinities):
+    """
+    Score every post of a tag matrix for many users at once
+
+    Args:
+        tag_matrix: TagMatrix of the catalog
+        skill_lists: Normalized skills, one list per user
+        preference_lists: Normalized feed preferences, one list per user
+        liked_tag_affinities: Liked-tag histograms, one dict per user
+
+    Returns:
+        Tuple of (scores, skill_matches, pref_matches) sparse users x posts
+        CSR matrices. A post is a candidate for a user exactly when its
+        score is non-zero.
+    """
+    skill_matches = grouped_term_matches(tag_matrix, skill_lists)
+    pref_matches = grouped_term_matches(tag_matrix, preference_lists)
+    interaction = tag_matrix.matrix @ affinity_matrix(liked_tag_affinities, tag_matrix.vocabulary)
+
+    scores = (skill_matches * SKILL_WEIGHT) + (pref_matches * PREFERENCE_WEIGHT) + (interaction * INTERACTION_WEIGHT)
+    return scores.T.tocsr(), skill_matches.T.tocsr(), pref_matches.T.tocsr()
@@ -0,0 +1,188 @@
+"""
+Per-user rotating Bloom filter of viewed posts.
+
+Each profile carries a `seenFilter` map of slice number -> slice, where a
+slice is a SEEN_FILTER_BITS Bloom filter over the ids of posts the user
+viewed, stored as BSON binary (little-endian 64-bit words) so the
+recommender decodes it with one np.frombuffer call, and a `seenSlice`
+document naming the slice currently being filled and roughly how many views
+it holds. The model updater ORs the bits of newly viewed posts into the
+current slice and writes it back, and the recommender drops retrieved
+candidates that test positive in any slice in-process, so neither the stored
+filter nor the candidate query grows with browsing history.
+
+A slice is closed once it holds SLICE_CAPACITY views, the point where its
+false-positive rate reaches SEEN_FILTER_FP_RATE / SEEN_FILTER_SLICES, and a
+new one is started. At most SEEN_FILTER_SLICES slices are kept: starting one
+more drops the oldest, so the views that age out are those of the oldest
+slice. The false-positive rate of the whole filter therefore stays under
+SEEN_FILTER_FP_RATE however much the user browses; with the defaults (8
+slices of 65536 bits, 1%) it remembers the last ~37000 views in at most
+64 KB.
+"""
+
+import hashlib
+import math
+import os
+
+import numpy as np
+from bson import Binary
+
+from mongo_helper import interactions_collection, user_profiles_collection
+
+SEEN_FIELD = 'seenFilter'
+SEEN_SLICE_FIELD = 'seenSlice'
+
+FILTER_BITS = int(os.environ.get('SEEN_FILTER_BITS', 65536))
+FILTER_SLICES = int(os.environ.get('SEEN_FILTER_SLICES', 8))
+FILTER_FP_RATE = float(os.environ.get('SEEN_FILTER_FP_RATE', 0.01))
+
+# Per-slice false-positive target, the optimal hash count for it, and the
+# number of views a slice takes before its bits reach that rate
+_SLICE_FP_RATE = FILTER_FP_RATE / FILTER_SLICES
+FILTER_HASHES = int(os.environ.get('SEEN_FILTER_HASHES', math.ceil(math.log2(1 / _SLICE_FP_RATE))))
+SLICE_CAPACITY = max(1, int(
+    -FILTER_BITS / FILTER_HASHES * math.log(1 - _SLICE_FP_RATE ** (1 / FILTER_HASHES))
+))
+
+_WORDS = (FILTER_BITS + 63) // 64
+
+# Filters written before slicing were one flat slice probed with 5 hashes
+_LEGACY_HASHES = 5
+
+_WORD_MASK = (1 << 64) - 1
+
+
+def seen_positions(post_id):
+    """Bit positions of a post id (double hashing over one blake2b digest)"""
+    digest = hashlib.blake2b(post_id.binary, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % FILTER_BITS for i in range(FILTER_HASHES)]
+
+
+def _slice_words(post_ids, words=None):
+    """Set the bits of the given posts in a slice's words (a new slice if None)"""
+    if words is None:
+        words = np.zeros(_WORDS, dtype='<u8')
+    positions = np.array([seen_positions(post_id) for post_id in post_ids], dtype=np.uint64).ravel()
+    if positions.size:
+        np.bitwise_or.at(words, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+    return words
+
+
+def _encode(words):
+    return Binary(words.astype('<u8', copy=False).tobytes())
+
+
+def _decode(stored):
+    """Words of a stored slice, from binary or from the word maps written before it"""
+    if isinstance(stored, bytes):
+        return np.frombuffer(stored, dtype='<u8', count=_WORDS).copy()
+    words = np.zeros(_WORDS, dtype='<u8')
+    for word, value in stored.items():
+        words[int(word)] = int(value) & _WORD_MASK
+    return words
+
+
+def seen_filter_fields(post_ids):
+    """
+    Stored filter fields for the given viewed post ids, oldest view first
+
+    Only the views that fit in the newest SEEN_FILTER_SLICES slices are kept.
+    """
+    post_ids = list(post_ids)
+    slice_count = max(1, math.ceil(len(post_ids) / SLICE_CAPACITY))
+    first = max(0, slice_count - FILTER_SLICES)
+    slices = {}
+    for number in range(first, slice_count):
+        slices[str(number)] = _encode(_slice_words(post_ids[number * SLICE_CAPACITY:(number + 1) * SLICE_CAPACITY]))
+    views = len(post_ids) - (slice_count - 1) * SLICE_CAPACITY
+    return {SEEN_FIELD: slices, SEEN_SLICE_FIELD: {"number": slice_count - 1, "views": views}}
+
+
+def compute_seen_filter(user_id):
+    """Build a user's filter fields from scratch out of their view interactions"""
+    return seen_filter_fields(i['post'] for i in interactions_collection.find(
+        {"user": user_id, "interactionType": "view"}, {"post": 1}
+    ).sort("_id", 1))
+
+
+def seen_update(profile, post_ids):
+    """
+    Profile update adding newly viewed posts to the current slice
+
+    Args:
+        profile: The user's profile with at least `user`, `seenSlice` and
+            `seenFilter`
+        post_ids: Ids of the posts the user newly viewed
+
+    The slice is rewritten with the new bits OR-ed in, so applying the same
+    views twice only advances the slice's view count.
+    """
+    current = profile.get(SEEN_SLICE_FIELD)
+    stored = profile.get(SEEN_FIELD) or {}
+    if current is None or not all(isinstance(value, bytes) for value in stored.values()):
+        # Filter from before binary slices: rebuild it in the current layout
+        return {"$set": compute_seen_filter(profile['user'])}
+
+    number, views = current['number'], current['views']
+    update = {"$set": {}}
+    if views > 0 and views + len(post_ids) > SLICE_CAPACITY:
+        number += 1
+        words = _slice_words(post_ids)
+        update["$set"][SEEN_SLICE_FIELD] = {"number": number, "views": len(post_ids)}
+        if number >= FILTER_SLICES:
+            update["$unset"] = {f"{SEEN_FIELD}.{number - FILTER_SLICES}": ""}
+    else:
+        previous = stored.get(str(number))
+        words = _slice_words(post_ids, None if previous is None else _decode(previous))
+        update["$inc"] = {f"{SEEN_SLICE_FIELD}.views": len(post_ids)}
+
+    update["$set"][f"{SEEN_FIELD}.{number}"] = _encode(words)
+    return update
+
+
+def rebuild_all_seen_filters():
+    """One-shot backfill of every profile's filter"""
+    count = 0
+    for profile in user_profiles_collection.find({}, {"user": 1}):
+        user_profiles_collection.update_one(
+            {"_id": profile['_id']},
+            {"$set": compute_seen_filter(profile['user'])}
+        )
+        count += 1
+    return count
+
+
+class SeenFilter:
+    """Read-only view of the filter stored on a profile document"""
+
+    def __init__(self, profile):
+        stored = profile.get(SEEN_FIELD) or {}
+        if stored and not isinstance(next(iter(stored.values())), (bytes, dict)):
+            # Flat word map from before slicing
+            slices, self.hashes = [stored], _LEGACY_HASHES
+        else:
+            slices, self.hashes = list(stored.values()), FILTER_HASHES
+
+        self.words = np.zeros((max(1, len(slices)), _WORDS), dtype=np.uint64)
+        for row, stored_slice in enumerate(slices):
+            self.words[row] = _decode(stored_slice)
+
+    def __contains__(self, post_id):
+        return bool(self.contains_positions([seen_positions(post_id)])[0])
+
+    def contains_positions(self, positions):
+        """
+        Vectorized membership test
+
+        Args:
+            positions: Array of shape (n, FILTER_HASHES) from seen_positions
+
+        Returns:
+            Boolean array of length n, true where any slice has every bit set
+        """
+        positions = np.asarray(positions, dtype=np.uint64).reshape(-1, FILTER_HASHES)[:, :self.hashes]
+        bits = (self.words[:, positions >> np.uint64(6)] >> (positions & np.uint64(63))) & np.uint64(1)
+        return bits.all(axis=2).any(axis=0)
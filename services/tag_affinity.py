@@ -0,0 +1,149 @@
+"""
+Per-user liked-tag affinity histograms.
+
+Each profile carries a `likedTagAffinity` map of normalized tag -> number of
+liked posts carrying that tag, so the recommender loads it with the profile
+in a single read instead of re-reading every liked post. It is maintained
+incrementally with `$inc` as the model updater folds like, unlike and post
+events from the event log, so a fold costs one small write per user however
+many likes the user has.
+
+`likedTagAffinityEvent` records the id of the last event folded into the
+histogram, and every fold only matches profiles that have not folded its
+event yet, so a run replayed after a failure or a lease handover is not
+counted twice. Histograms computed from scratch (new profiles and the
+model updater's rebuild) record the settled head of the log, so only the
+events after it are folded on top. A like or unlike landing within the
+settle window of that computation can be counted twice until the next
+rebuild.
+"""
+
+from mongo_helper import posts_collection, interactions_collection, user_profiles_collection
+from services.tags import post_tags
+from services.neighbor_graph import STALE_FIELD
+from services.event_log import settled_head
+
+AFFINITY_FIELD = 'likedTagAffinity'
+AFFINITY_EVENT_FIELD = 'likedTagAffinityEvent'
+
+# MongoDB field names cannot contain '.' or start with '$'
+_KEY_ESCAPES = (('.', '．'), ('$', '＄'))
+
+
+def encode_affinity_key(tag):
+    """Escape a normalized tag so it can be used as a field name"""
+    for char, escaped in _KEY_ESCAPES:
+        tag = tag.replace(char, escaped)
+    return tag
+
+
+def decode_affinity_key(key):
+    """Reverse encode_affinity_key"""
+    for char, escaped in _KEY_ESCAPES:
+        key = key.replace(escaped, char)
+    return key
+
+
+def affinity_increments(normalized_tags, delta):
+    """`$inc` document adding delta for every distinct normalized tag"""
+    return {f"{AFFINITY_FIELD}.{encode_affinity_key(tag)}": delta for tag in set(normalized_tags or []) if tag}
+
+
+def merge_increments(increments, more):
+    """Add one `$inc` document into another, dropping the keys that cancel out"""
+    for key, delta in more.items():
+        increments[key] = increments.get(key, 0) + delta
+        if not increments[key]:
+            del increments[key]
+    return increments
+
+
+def affinity_unfolded(event_id):
+    """Profile filter matching histograms that have not folded the event yet"""
+    return {AFFINITY_EVENT_FIELD: {"$not": {"$gte": event_id}}}
+
+
+def affinity_update(increments, event_id, stale=None):
+    """
+    Profile update applying histogram increments folded up to event_id and,
+    after the user's own likes changed, flagging them for a neighbor graph
+    refresh
+
+    Args:
+        stale: STALE_FIELD marker to flag the user with, or None
+    """
+    update = {"$set": {AFFINITY_EVENT_FIELD: event_id}}
+    if increments:
+        update["$inc"] = increments
+    if stale is not None:
+        update["$set"][STALE_FIELD] = stale
+    return update
+
+
+def affinity_histogram(liked_tag_lists):
+    """Stored histogram for the normalized tag lists of a user's liked posts"""
+    histogram = {}
+    for tags in liked_tag_lists:
+        for tag in set(tags):
+            if tag:
+                key = encode_affinity_key(tag)
+                histogram[key] = histogram.get(key, 0) + 1
+    return histogram
+
+
+def compute_affinities(user_ids):
+    """
+    Build the histograms of several users from scratch out of their like
+    interactions, in one interactions read and one posts read
+
+    Returns:
+        Dict of user id -> histogram, with an entry for every requested user
+    """
+    liked = {user_id: [] for user_id in user_ids}
+    if not liked:
+        return {}
+    for interaction in interactions_collection.find(
+        {"user": {"$in": list(liked)}, "interactionType": "like"}, {"user": 1, "post": 1}
+    ):
+        liked[interaction['user']].append(interaction['post'])
+
+    post_ids = list({post_id for posts in liked.values() for post_id in posts})
+    tags_by_post = {
+        post['_id']: post_tags(post)
+        for post in posts_collection.find({"_id": {"$in": post_ids}}, {"normalizedTags": 1, "tags": 1})
+    } if post_ids else {}
+
+    # Likes of deleted posts are skipped until their interactions are removed
+    return {
+        user_id: affinity_histogram(tags_by_post[post_id] for post_id in posts if post_id in tags_by_post)
+        for user_id, posts in liked.items()
+    }
+
+
+def compute_affinity_fields(user_id):
+    """
+    Profile fields with a user's histogram built from scratch and the log
+    position it is current to
+    """
+    # Read the position first: every event before it was written after its
+    # interaction, so the histogram below already counts it
+    position = settled_head()
+    return {AFFINITY_FIELD: compute_affinities([user_id])[user_id], AFFINITY_EVENT_FIELD: position}
+
+
+def rebuild_all_affinities():
+    """One-shot backfill of every profile's histogram"""
+    count = 0
+    for profile in user_profiles_collection.find({}, {"user": 1}):
+        user_profiles_collection.update_one(
+            {"_id": profile['_id']},
+            {"$set": compute_affinity_fields(profile['user'])}
+        )
+        count += 1
+    return count
+
+
+def load_affinity(profile):
+    """Decode the histogram stored on a profile document, dropping empty counts"""
+    stored = profile.get(AFFINITY_FIELD) or {}
+    return {decode_affinity_key(key): count for key, count in stored.items() if count > 0}
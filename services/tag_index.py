@@ -0,0 +1,136 @@
+"""
+Process-resident inverted index from normalized post tag to post ids.
+
+The index is built once from the posts collection at startup and kept current
+by the post controller and, for posts written by other processes, by the
+event log tail in services/model_updater.py, so candidate generation only has
+to union a handful of posting lists instead of scanning the whole catalog.
+"""
+
+import threading
+
+from mongo_helper import posts_collection
+from services.tags import post_tags
+from services.term_affinity import term_affinity
+from services.ann_index import post_ann_index, post_vector
+
+
+class TagIndex:
+    """Inverted index of normalized tag -> set of post ObjectIds"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}   # normalized tag -> set of post ids
+        self._post_tags = {}  # post id -> tuple of normalized tags
+        self._built = False
+
+    def build(self):
+        """(Re)build the index from every post in the database"""
+        postings = {}
+        tags_by_post = {}
+
+        cursor = posts_collection.find({}, {"normalizedTags": 1, "tags": 1})
+        for post in cursor or []:
+            tags = tuple(post_tags(post))
+            tags_by_post[post['_id']] = tags
+            for tag in tags:
+                postings.setdefault(tag, set()).add(post['_id'])
+
+        with self._lock:
+            self._postings = postings
+            self._post_tags = tags_by_post
+            self._built = True
+
+        # Precompute fuzzy matches for the whole tag vocabulary in one pass
+        term_affinity.rebuild(list(postings))
+
+        if post_ann_index is not None:
+            post_ann_index.build((post_id, post_vector(tags)) for post_id, tags in tags_by_post.items())
+
+        return len(tags_by_post)
+
+    def ensure_built(self):
+        """Build the index lazily for processes that did not build it at startup"""
+        if not self._built:
+            self.build()
+
+    def add_post(self, post_id, normalized_tags):
+        """Index a newly created post"""
+        normalized = tuple(normalized_tags or [])
+        with self._lock:
+            self._remove(post_id)
+            self._post_tags[post_id] = normalized
+            for tag in normalized:
+                if tag not in self._postings:
+                    term_affinity.term_id(tag)
+                self._postings.setdefault(tag, set()).add(post_id)
+
+        if post_ann_index is not None:
+            post_ann_index.insert(post_id, post_vector(normalized))
+
+    def update_post(self, post_id, normalized_tags):
+        """Re-index a post whose tags changed"""
+        self.add_post(post_id, normalized_tags)
+
+    def remove_post(self, post_id):
+        """Drop a deleted post from the index"""
+        with self._lock:
+            self._remove(post_id)
+
+        if post_ann_index is not None:
+            post_ann_index.delete(post_id)
+
+    def _remove(self, post_id):
+        for tag in self._post_tags.pop(post_id, ()):
+            posting = self._postings.get(tag)
+            if posting is None:
+                continue
+            posting.discard(post_id)
+            if not posting:
+                del self._postings[tag]
+
+    def tags_for_posts(self, post_ids):
+        """Return the set of normalized tags carried by the given posts"""
+        with self._lock:
+            tags = set()
+            for post_id in post_ids:
+                tags.update(self._post_tags.get(post_id, ()))
+            return tags
+
+    def matching_tags(self, terms):
+        """Indexed tags fuzzily matched by any of the given normalized terms"""
+        matched_ids = set()
+        for term in set(terms):
+            matched_ids |= term_affinity.matching_ids(term)
+        with self._lock:
+            return {
+                tag for tag in (term_affinity.term(term_id) for term_id in matched_ids)
+                if tag in self._postings
+            }
+
+    def candidates(self, terms, exact_tags=()):
+        """
+        Return ids of posts sharing at least one tag with the user
+
+        Args:
+            terms: Normalized skills and preferences, matched fuzzily against tags
+            exact_tags: Normalized tags (e.g. from liked posts) matched exactly
+
+        Returns:
+            Set of post ObjectIds
+        """
+        matched_tags = self.matching_tags(terms)
+        matched_tags.update(exact_tags)
+
+        with self._lock:
+            post_ids = set()
+            for tag in matched_tags:
+                post_ids.update(self._postings.get(tag, ()))
+            return post_ids
+
+    def __len__(self):
+        return len(self._post_tags)
+
+
+# Shared index for the whole process
+tag_index = TagIndex()
@@ -0,0 +1,43 @@
+"""
+Tag normalization and matching helpers shared by the recommender
+"""
+
+import re
+
+
+def normalize_tag(tag):
+    """Normalize a tag by removing special characters and converting to lowercase"""
+    if not tag:
+        return ""
+    # Replace special characters with spaces and convert to lowercase
+    normalized = re.sub(r'[_\-/\s+]', '', tag.lower())
+    return normalized
+
+
+def tags_match(term, tag):
+    """Fuzzy match used for skills and preferences: either string contains the other"""
+    return term in tag or tag in term
+
+
+def normalize_tags(tags):
+    """Normalize a list of raw tags, skills or preferences"""
+    return [normalize_tag(tag) for tag in tags or []]
+
+
+def post_tags(post):
+    """Normalized tags of a post, as stored at write time"""
+    stored = post.get('normalizedTags')
+    # Fall back for documents written before the backfill migration ran
+    return stored if stored is not None else normalize_tags(post.get('tags'))
+
+
+def profile_skills(profile):
+    """Normalized skills of a profile, as stored at write time"""
+    stored = profile.get('normalizedSkills')
+    return stored if stored is not None else normalize_tags(profile.get('skills'))
+
+
+def profile_preferences(profile):
+    """Normalized feed preferences of a profile, as stored at write time"""
+    stored = profile.get('normalizedFeedPreferences')
+    return stored if stored is not None else normalize_tags(profile.get('feedPreferences'))
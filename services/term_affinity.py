@@ -0,0 +1,167 @@
+"""
+Vocabulary-level table of fuzzy matches between normalized terms.
+
+Skills and preferences match a tag when either string contains the other.
+Instead of running that substring check for every skill x tag x candidate on
+every request, each distinct tag is interned to an integer id once, and the
+table records the set of term ids it matches. Matching is then a set lookup on
+integer ids.
+
+Full rebuilds find every substring pair with an Aho-Corasick automaton, so the
+cost grows with the total length of the vocabulary rather than its square.
+Tags first seen after a rebuild are added incrementally.
+
+Skills and preferences that are not tags are matched against the vocabulary
+without being interned, so free-form user input cannot grow the table. Their
+matches are kept in an LRU cache of QUERY_TERM_CACHE_SIZE terms, which tags
+interned later are added to.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+from services.tags import tags_match
+
+QUERY_TERM_CACHE_SIZE = int(os.environ.get('QUERY_TERM_CACHE_SIZE', 10000))
+
+
+def substring_pairs(terms):
+    """
+    Find every (i, j) such that terms[i] is a substring of terms[j]
+
+    Builds one Aho-Corasick automaton over all terms and scans each term
+    through it.
+    """
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+    for i, term in enumerate(terms):
+        node = 0
+        for char in term:
+            child = goto[node].get(char)
+            if child is None:
+                child = len(goto)
+                goto.append({})
+                fail.append(0)
+                output.append([])
+                goto[node][char] = child
+            node = child
+        output[node].append(i)
+
+    # Breadth-first pass to wire failure links and merge outputs
+    queue = deque()
+    for child in goto[0].values():
+        output[child] = output[child] + output[0]
+        queue.append(child)
+    while queue:
+        node = queue.popleft()
+        for char, child in goto[node].items():
+            queue.append(child)
+            state = fail[node]
+            while state and char not in goto[state]:
+                state = fail[state]
+            fail[child] = goto[state].get(char, 0)
+            output[child] = output[child] + output[fail[child]]
+
+    pairs = set()
+    for j, term in enumerate(terms):
+        node = 0
+        for char in term:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for i in output[node]:
+                pairs.add((i, j))
+    return pairs
+
+
+class TermAffinityTable:
+    """Interned term ids and, for each id, the ids of every term it fuzzily matches"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids = {}      # term -> id
+        self._terms = []    # id -> term
+        self._matches = []  # id -> set of matching ids (itself included)
+        self._query_matches = OrderedDict()  # query-only term -> set of matching ids
+        self._generation = 0  # bumped by rebuilds, which renumber every id
+
+    def rebuild(self, terms):
+        """Rebuild the whole table for a vocabulary"""
+        terms = list(dict.fromkeys(terms))
+        matches = [{i} for i in range(len(terms))]
+        for i, j in substring_pairs(terms):
+            matches[i].add(j)
+            matches[j].add(i)
+
+        with self._lock:
+            self._ids = {term: i for i, term in enumerate(terms)}
+            self._terms = terms
+            self._matches = matches
+            self._query_matches.clear()
+            self._generation += 1
+        return len(terms)
+
+    def term_id(self, term):
+        """Intern a tag, matching it against the vocabulary if it is new"""
+        term_id = self._ids.get(term)
+        if term_id is not None:
+            return term_id
+
+        with self._lock:
+            term_id = self._ids.get(term)
+            if term_id is not None:
+                return term_id
+
+            term_id = len(self._terms)
+            matches = {term_id}
+            for other_id, other in enumerate(self._terms):
+                if tags_match(term, other):
+                    matches.add(other_id)
+                    self._matches[other_id].add(term_id)
+            for query, query_matches in self._query_matches.items():
+                if tags_match(query, term):
+                    query_matches.add(term_id)
+            self._query_matches.pop(term, None)
+
+            self._terms.append(term)
+            self._matches.append(matches)
+            self._ids[term] = term_id
+            return term_id
+
+    def term(self, term_id):
+        return self._terms[term_id]
+
+    def matching_ids(self, term):
+        """Ids of every interned term the given term fuzzily matches"""
+        with self._lock:
+            term_id = self._ids.get(term)
+            if term_id is not None:
+                return set(self._matches[term_id])
+            matches = self._query_matches.get(term)
+            if matches is not None:
+                self._query_matches.move_to_end(term)
+                return set(matches)
+            terms, generation = self._terms, self._generation
+            scanned = len(terms)
+
+        # Scan outside the lock; ids are only appended until the next rebuild
+        matches = {i for i in range(scanned) if tags_match(term, terms[i])}
+
+        with self._lock:
+            if generation != self._generation:
+                return self.matching_ids(term)
+            # Tags interned during the scan
+            matches.update(i for i in range(scanned, len(self._terms)) if tags_match(term, self._terms[i]))
+            self._query_matches[term] = matches
+            while len(self._query_matches) > QUERY_TERM_CACHE_SIZE:
+                self._query_matches.popitem(last=False)
+            return set(matches)
+
+    def __len__(self):
+        return len(self._terms)
+
+
+# Shared table for the whole process
+term_affinity = TermAffinityTable()
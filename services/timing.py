@@ -0,0 +1,183 @@
+"""
+Per-stage timing instrumentation for the recommendation pipeline.
+
+Stages are wrapped in `with stage('name') as record:` blocks, which measure
+wall time and let the caller set `record.items` to the number of items the
+stage handled. Sampled measurements feed process-wide histograms (see
+`pipeline_timings.snapshot()`), and when RECOMMENDER_SERVER_TIMING=1 the
+controllers also return them for the current request in a `Server-Timing`
+header.
+
+RECOMMENDER_TIMING_SAMPLE_RATE (default 1.0) is the fraction of requests whose
+stages are recorded in the histograms.
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+ITEM_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000, float('inf'))
+
+SAMPLE_RATE = float(os.environ.get('RECOMMENDER_TIMING_SAMPLE_RATE', 1.0))
+SERVER_TIMING_ENABLED = os.environ.get('RECOMMENDER_SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+
+class Histogram:
+    """Per-bucket counts plus the total count and sum"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def copy(self):
+        histogram = Histogram(self.bounds)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.counts)},
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class PipelineTimings:
+    """Thread-safe duration and item-count histograms per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}  # stage -> Histogram of milliseconds
+        self._items = {}      # stage -> Histogram of item counts
+
+    def observe(self, name, duration_ms, items=None):
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = Histogram(DURATION_BUCKETS_MS)
+            durations.observe(duration_ms)
+            if items is not None:
+                histogram = self._items.get(name)
+                if histogram is None:
+                    histogram = self._items[name] = Histogram(ITEM_BUCKETS)
+                histogram.observe(items)
+
+    def snapshot(self):
+        """Histograms of every stage, keyed by stage name"""
+        with self._lock:
+            return {
+                name: {
+                    "durationMs": durations.snapshot(),
+                    "items": self._items[name].snapshot() if name in self._items else None
+                }
+                for name, durations in self._durations.items()
+            }
+
+    def duration_histograms(self):
+        """Copies of the duration histograms, keyed by stage name"""
+        with self._lock:
+            return {name: durations.copy() for name, durations in self._durations.items()}
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._items.clear()
+
+
+class StageRecord:
+    """Measurement of one stage; callers fill in `items`"""
+
+    __slots__ = ('name', 'duration_ms', 'items')
+
+    def __init__(self, name):
+        self.name = name
+        self.duration_ms = 0.0
+        self.items = None
+
+
+class Trace:
+    """Stages recorded during one request"""
+
+    def __init__(self, sampled):
+        self.sampled = sampled
+        self.stages = []
+
+    def server_timing(self):
+        """Value of the Server-Timing header for this request"""
+        entries = []
+        for record in self.stages:
+            entry = f"{record.name};dur={record.duration_ms:.2f}"
+            if record.items is not None:
+                entry += f';desc="{record.items} items"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+_current_trace = contextvars.ContextVar('recommender_trace', default=None)
+
+
+def start_trace():
+    """Begin collecting stages for the current request"""
+    trace = Trace(random.random() < SAMPLE_RATE)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    """Stop collecting stages for the current request"""
+    _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time one pipeline stage"""
+    record = StageRecord(name)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.duration_ms = (time.perf_counter() - start) * 1000
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages.append(record)
+            sampled = trace.sampled
+        else:
+            # Work outside a request (batch jobs, scripts) is sampled per stage
+            sampled = random.random() < SAMPLE_RATE
+        if sampled:
+            pipeline_timings.observe(name, record.duration_ms, record.items)
+
+
+# Shared histograms for the whole process
+pipeline_timings = PipelineTimings()
@@ -0,0 +1,132 @@
+"""
+Global trending feed used for cold start.
+
+Every post is scored by engagement decayed with age:
+
+    (LIKE_WEIGHT * likes + views + 1) * 0.5 ** (age_hours / TRENDING_HALF_LIFE_HOURS)
+
+and the top TRENDING_SIZE posts are kept as an in-process snapshot and in the
+`trending` collection. feed_worker.py recomputes it on every pass; API
+processes reload the stored snapshot once theirs is older than
+TRENDING_REFRESH_SECONDS (recomputing only if nothing fresh is stored), and
+keep serving the old snapshot while that happens.
+
+The recommender serves it to users without a profile and uses it to fill
+personalized feeds that come up short.
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from mongo_helper import posts_collection, trending_collection
+
+LIKE_WEIGHT = 2
+TRENDING_SIZE = int(os.environ.get('TRENDING_SIZE', 200))
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+TRENDING_REFRESH_SECONDS = float(os.environ.get('TRENDING_REFRESH_SECONDS', 300))
+
+_DOCUMENT_ID = 'global'
+
+
+def trending_score(post, now):
+    """
+    Engagement score of a post, halved every TRENDING_HALF_LIFE_HOURS
+
+    Args:
+        post: Post document with likes, views and optionally createdAt
+        now: Aware UTC datetime
+    """
+    created_at = _utc(post.get('createdAt') or post['_id'].generation_time)
+    age_hours = max((now - created_at).total_seconds() / 3600, 0)
+    engagement = LIKE_WEIGHT * post.get('likes', 0) + post.get('views', 0) + 1
+    return engagement * 0.5 ** (age_hours / TRENDING_HALF_LIFE_HOURS)
+
+
+def _utc(moment):
+    # pymongo returns naive datetimes in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+class TrendingFeed:
+    """Snapshot of (post id, author id) pairs, most trending first"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._loaded_at = None  # monotonic time of the last load or recompute
+
+    def compute(self):
+        """Recompute the feed from every post and store it"""
+        now = datetime.now(timezone.utc)
+        cursor = posts_collection.find({}, {"user": 1, "likes": 1, "views": 1, "createdAt": 1})
+        top = heapq.nlargest(TRENDING_SIZE, cursor or [], key=lambda post: trending_score(post, now))
+        entries = [(post['_id'], post['user']) for post in top]
+
+        trending_collection.replace_one(
+            {"_id": _DOCUMENT_ID},
+            {
+                "_id": _DOCUMENT_ID,
+                "posts": [{"post": post_id, "user": author} for post_id, author in entries],
+                "generatedAt": now
+            },
+            upsert=True
+        )
+        self._swap(entries)
+        return len(entries)
+
+    def _load(self):
+        """Load the stored feed, recomputing it if it is missing or stale"""
+        stored = trending_collection.find_one({"_id": _DOCUMENT_ID})
+        if not stored or (datetime.now(timezone.utc) - _utc(stored['generatedAt'])).total_seconds() > TRENDING_REFRESH_SECONDS:
+            return self.compute()
+        self._swap([(entry['post'], entry['user']) for entry in stored.get('posts', [])])
+        return len(self._entries)
+
+    def _swap(self, entries):
+        self._entries = entries
+        self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < TRENDING_REFRESH_SECONDS:
+            return
+        # One thread refreshes; the others keep serving the current snapshot
+        blocking = self._loaded_at is None
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= TRENDING_REFRESH_SECONDS:
+                self._load()
+        except Exception as e:
+            print(f"Trending feed refresh error: {e}")
+        finally:
+            self._lock.release()
+
+    def top(self, limit, user_id=None, exclude=()):
+        """
+        Most trending post ids
+
+        Args:
+            limit: Number of posts to return
+            user_id: Skip posts written by this user (ObjectId)
+            exclude: Containers of post ids to skip (e.g. the seen filter and
+                the posts already recommended)
+
+        Returns:
+            List of post ObjectIds
+        """
+        self._ensure_fresh()
+        post_ids = []
+        for post_id, author in self._entries:
+            if author == user_id or any(post_id in skipped for skipped in exclude):
+                continue
+            post_ids.append(post_id)
+            if len(post_ids) == limit:
+                break
+        return post_ids
+
+
+# Shared feed for the whole process
+trending_feed = TrendingFeed()
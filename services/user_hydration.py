@@ -0,0 +1,87 @@
+"""
+Attaches author details to posts and profiles in API responses.
+
+A response collects the distinct user ids of all its rows and resolves the
+ones not in a small process-wide LRU of user id -> email with one `$in`
+query, so an endpoint costs at most one users read however many rows it
+returns. Emails cannot be changed through the API, so entries are only
+evicted by size (USER_EMAIL_CACHE_SIZE, default 10000).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from mongo_helper import users_collection
+from services.metrics import registry
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class UserEmailCache:
+    """Thread-safe LRU cache of user id -> email"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_many(self, user_ids):
+        """Cached emails of the given ids; misses are left out"""
+        found = {}
+        with self._lock:
+            for user_id in user_ids:
+                email = self._entries.get(user_id)
+                if email is not None:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = email
+        return found
+
+    def put_many(self, emails):
+        with self._lock:
+            for user_id, email in emails.items():
+                self._entries[user_id] = email
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def user_emails(user_ids):
+    """
+    Resolve user ids (ObjectIds) to emails with at most one query
+
+    Returns:
+        Dict of user id -> email; unknown users are left out
+    """
+    wanted = set(user_ids)
+    emails = user_email_cache.get_many(wanted)
+    missing = [user_id for user_id in wanted if user_id not in emails]
+    registry.inc('user_email_cache_lookups_total', (('result', 'hit'),), len(emails))
+    registry.inc('user_email_cache_lookups_total', (('result', 'miss'),), len(missing))
+
+    if missing:
+        fetched = {
+            user['_id']: user['email']
+            for user in users_collection.find({"_id": {"$in": missing}}, {"email": 1})
+            if user.get('email')
+        }
+        user_email_cache.put_many(fetched)
+        emails.update(fetched)
+    return emails
+
+
+def attach_users(documents):
+    """Replace each document's `user` id with {"_id", "email"} in place"""
+    emails = user_emails(document['user'] for document in documents)
+    for document in documents:
+        user_id = document['user']
+        document['user'] = {"_id": str(user_id), "email": emails.get(user_id)}
+    return documents
+
+
+registry.counter('user_email_cache_lookups_total', "Author email lookups, by result (hit, miss)")
+
+# Shared cache for the whole process
+user_email_cache = UserEmailCache(
+    max_entries=int(os.environ.get('USER_EMAIL_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+)
@@ -0,0 +1,189 @@
+"""
+Write-behind buffer for post views.
+
+`view_post` only records the (user, post) pair in memory. A background
+thread flushes the buffer every VIEW_FLUSH_INTERVAL_MS (default 500), or
+sooner once VIEW_FLUSH_EVENTS distinct views (default 1000) are pending.
+A flush is:
+
+1. one unordered bulk_write of idempotent view upserts on interactions
+2. one unordered bulk_write of `$inc views`, coalesced per post and
+   counting only the views whose upsert inserted
+3. one insert of the new views into the event log, from which the model
+   updater folds them into seen filters and then drops the cached feeds of
+   those users
+
+Repeat views of a post by the same user within an interval coalesce in
+memory. At most VIEW_BUFFER_MAX_EVENTS views are held: past that, record()
+makes the request wait for a flush instead of growing the buffer, for at
+most VIEW_BACKPRESSURE_TIMEOUT_MS (default 1000). If the flusher is stalled
+that long the view is dropped and counted in
+view_buffer_dropped_views_total, so request threads never hang on it.
+Whatever is pending is flushed when the process exits.
+
+View counters therefore lag behind a view by up to one flush interval, and
+seen filters by that plus the model updater's lag.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from mongo_helper import interactions_collection, posts_collection
+from services.event_log import append_events, make_event, VIEW
+from services.metrics import registry
+
+VIEW_FLUSH_INTERVAL_MS = int(os.environ.get('VIEW_FLUSH_INTERVAL_MS', 500))
+VIEW_FLUSH_EVENTS = int(os.environ.get('VIEW_FLUSH_EVENTS', 1000))
+VIEW_BUFFER_MAX_EVENTS = int(os.environ.get('VIEW_BUFFER_MAX_EVENTS', 10000))
+VIEW_BACKPRESSURE_TIMEOUT_MS = int(os.environ.get('VIEW_BACKPRESSURE_TIMEOUT_MS', 1000))
+
+_DUPLICATE_KEY = 11000
+
+
+class ViewBuffer:
+    """Thread-safe buffer of pending (user, post) views"""
+
+    def __init__(self, flush_interval_ms, flush_events, max_events, backpressure_timeout_ms):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_events = flush_events
+        self.max_events = max_events
+        self.backpressure_timeout = backpressure_timeout_ms / 1000
+        self._condition = threading.Condition()
+        self._pending = {}  # (user id, post id) -> time of the first view
+        self._thread = None
+        self._closed = False
+
+    def record(self, user_id, post_id):
+        """
+        Queue a view (ObjectIds), waiting for a flush if the buffer is full
+
+        Returns:
+            False if the buffer stayed full and the view was dropped
+        """
+        with self._condition:
+            if self._closed:
+                batch = {(user_id, post_id): datetime.now(timezone.utc)}
+            else:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='view-buffer', daemon=True)
+                    self._thread.start()
+                if len(self._pending) >= self.max_events:
+                    registry.inc('view_buffer_backpressure_waits_total', ())
+                    self._condition.notify_all()
+                    if not self._condition.wait_for(
+                        lambda: len(self._pending) < self.max_events or self._closed,
+                        timeout=self.backpressure_timeout
+                    ):
+                        registry.inc('view_buffer_dropped_views_total', ())
+                        return False
+                self._pending.setdefault((user_id, post_id), datetime.now(timezone.utc))
+                if len(self._pending) >= self.flush_events:
+                    self._condition.notify_all()
+                return True
+        # After shutdown there is no flusher left: write through
+        self._write(batch)
+        return True
+
+    def pending(self):
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self):
+        """Write everything pending now, on the calling thread"""
+        with self._condition:
+            batch, self._pending = self._pending, {}
+            self._condition.notify_all()
+        self._write(batch)
+
+    def close(self):
+        """Stop the flusher and write what is left"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.flush_events,
+                    timeout=self.flush_interval
+                )
+                batch, self._pending = self._pending, {}
+                closed = self._closed
+                # Wake requests held back by a full buffer
+                self._condition.notify_all()
+            self._write(batch)
+            if closed:
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            new_views = self._upsert_views(batch)
+            if new_views:
+                self._apply_new_views(new_views)
+        except Exception as e:
+            registry.inc('view_buffer_views_total', (('outcome', 'failed'),), len(batch))
+            print(f"View buffer flush error: {e}")
+        finally:
+            registry.observe('view_buffer_flush_duration_seconds', (), time.perf_counter() - started)
+
+    def _upsert_views(self, batch):
+        """Insert the views that are new; returns their (user, post) pairs"""
+        keys = list(batch)
+        operations = [
+            UpdateOne(
+                {"user": user_id, "post": post_id, "interactionType": "view"},
+                {"$setOnInsert": {"createdAt": batch[(user_id, post_id)]}},
+                upsert=True
+            )
+            for user_id, post_id in keys
+        ]
+        try:
+            inserted = interactions_collection.bulk_write(operations, ordered=False).upserted_ids
+        except BulkWriteError as e:
+            # Two processes upserting the same first view race on the unique
+            # index; the loser's view is a repeat, anything else is an error
+            inserted = {entry['index']: entry['_id'] for entry in e.details.get('upserted', [])}
+            errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != _DUPLICATE_KEY]
+            if errors:
+                registry.inc('view_buffer_views_total', (('outcome', 'failed'),), len(errors))
+                print(f"View buffer flush error: {errors[0].get('errmsg')}")
+        registry.inc('view_buffer_views_total', (('outcome', 'new'),), len(inserted))
+        registry.inc('view_buffer_views_total', (('outcome', 'repeat'),), len(keys) - len(inserted))
+        return [keys[index] for index in inserted]
+
+    @staticmethod
+    def _apply_new_views(new_views):
+        views_per_post = Counter(post_id for _, post_id in new_views)
+        posts_collection.bulk_write([
+            UpdateOne({"_id": post_id}, {"$inc": {"views": count}})
+            for post_id, count in views_per_post.items()
+        ], ordered=False)
+
+        append_events([make_event(VIEW, user_id, post_id) for user_id, post_id in new_views])
+
+
+registry.counter('view_buffer_views_total', "Buffered views written, by outcome (new, repeat, failed)")
+registry.counter('view_buffer_backpressure_waits_total', "Views that waited for a flush because the buffer was full")
+registry.counter('view_buffer_dropped_views_total', "Views dropped because the buffer stayed full past the backpressure timeout")
+registry.histogram('view_buffer_flush_duration_seconds', "Wall time of one view buffer flush")
+
+# Shared buffer for the whole process
+view_buffer = ViewBuffer(
+    VIEW_FLUSH_INTERVAL_MS, VIEW_FLUSH_EVENTS, VIEW_BUFFER_MAX_EVENTS, VIEW_BACKPRESSURE_TIMEOUT_MS
+)
+atexit.register(view_buffer.close)
@@ -2,59 +2,30 @@
 Test data generator for post recommendation system.
 This script creates test users, profiles, posts, and interactions
 directly in MongoDB without going through the API.
+
+Usage:
+    python test_data.py                                  # small dataset plus checks
+    python test_data.py --bulk --users 100000 --workers 8 --seed 7
 """
 
+import argparse
+import hashlib
+import multiprocessing
 import random
 import string
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import bcrypt
 
 # Import MongoDB collections
 from mongo_helper import users_collection, posts_collection, interactions_collection, user_profiles_collection
 
 # Sample data for test generation
-SKILLS = [
-    "Python", "JavaScript", "React", "Node.js", "MongoDB", "Flask", "Django",
-    "Machine Learning", "Data Science", "DevOps", "AWS", "Docker", "UI/UX"
-]
-
-FEED_PREFERENCES = [
-    "technology", "web development", "data science", "artificial intelligence",
-    "cloud computing", "mobile development", "design", "career advice",
-    "programming", "databases", "security", "tutorials", "startups"
-]
-
-POST_TAGS = [
-    "python", "javascript", "react", "nodejs", "mongodb", "flask", "django",
-    "machine-learning", "data-science", "devops", "aws", "docker", "ui-ux",
-    "technology", "web-development", "artificial-intelligence", "cloud-computing", 
-    "mobile-development", "design", "career-advice", "programming", "databases", 
-    "security", "tutorials", "startups"
-]
-
-POST_TITLES = [
-    "Getting Started with ReactJS",
-    "Python Best Practices for Beginners",
-    "MongoDB Schema Design Patterns",
-    "Machine Learning Fundamentals",
-    "Career Transition to Tech",
-    "AWS Deployment Guide",
-    "Building RESTful APIs with Flask",
-    "Modern JavaScript Features",
-    "Data Science Project Workflow",
-    "Docker for Development Environments",
-    "Node.js Performance Optimization",
-    "Frontend Design Principles",
-    "Database Security Basics",
-    "DevOps Automation Techniques",
-    "Mobile App Development with React Native"
-]
-
-OCCUPATIONS = [
-    "Software Engineer", "Data Scientist", "Web Developer", "UX Designer",
-    "Product Manager", "DevOps Engineer", "Student", "Teacher"
-]
+from sample_data import SKILLS, FEED_PREFERENCES, POST_TAGS, POST_TITLES, OCCUPATIONS
 
 def generate_random_string(length=10):
     """Generate a random string of specified length"""
@@ -143,7 +114,7 @@ def create_test_posts(users, count_per_user=5):
     posts = []
     
     # Date range for posts (past 30 days)
-    end_date = datetime.now()
+    end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=30)
     
     for user in users:
@@ -170,7 +141,6 @@ def create_test_posts(users, count_per_user=5):
                 "tags": tags,
                 "likes": 0,
                 "views": 0,
-                "viewedBy": [],
                 "createdAt": created_at,
                 "updatedAt": created_at
             }
@@ -231,10 +201,7 @@ def create_test_interactions(users, posts):
                 # Update post view count
                 posts_collection.update_one(
                     {"_id": post["_id"]},
-                    {
-                        "$inc": {"views": 1},
-                        "$addToSet": {"viewedBy": user["_id"]}
-                    }
+                    {"$inc": {"views": 1}}
                 )
                 
                 print(f"Created view interaction: {user['email']} viewed '{post['title']}'")
@@ -315,7 +282,6 @@ def create_specialized_test_cases():
             "tags": tags,
             "likes": 0,
             "views": 0,
-            "viewedBy": [],
             "createdAt": datetime.now(),
             "updatedAt": datetime.now()
         }
@@ -348,7 +314,6 @@ def create_specialized_test_cases():
             "tags": tags,
             "likes": 0,
             "views": 0,
-            "viewedBy": [],
             "createdAt": datetime.now(),
             "updatedAt": datetime.now()
         }
@@ -381,7 +346,6 @@ def create_specialized_test_cases():
             "tags": tags,
             "likes": 0,
             "views": 0,
-            "viewedBy": [],
             "createdAt": datetime.now(),
             "updatedAt": datetime.now()
         }
@@ -494,8 +458,224 @@ def test_recommendation_system():
         if post:
             print(f"{i+1}. '{post['title']}' with tags: {post['tags']}")
 
+def _seeded_object_id(seed, kind, index):
+    """ObjectId derived from the seed, so any worker can refer to any document"""
+    return ObjectId(hashlib.blake2b(f"{seed}:{kind}:{index}".encode(), digest_size=12).digest())
+
+def _seeded_post_tags(seed, post_index):
+    """Raw tags of a bulk post, reproducible from its index alone"""
+    rng = random.Random(f"{seed}:tags:{post_index}")
+    return rng.sample(POST_TAGS, rng.randint(2, 5))
+
+def _insert_new(collection, documents):
+    """
+    insert_many(ordered=False) that relies on unique indexes instead of pre-checks
+    
+    Returns:
+        The documents that were actually inserted (duplicates are skipped)
+    """
+    if not documents:
+        return []
+    try:
+        collection.insert_many(documents, ordered=False)
+        return documents
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != 11000 for error in errors):
+            raise
+        duplicates = {error['index'] for error in errors}
+        return [document for i, document in enumerate(documents) if i not in duplicates]
+
+def _generate_bulk_shard(shard_start, shard_end, config):
+    """Generate and insert users shard_start..shard_end-1 with their profiles, posts and interactions"""
+    from services.tags import normalize_tags
+    from services.tag_affinity import AFFINITY_FIELD, affinity_histogram
+    from services.seen_filter import seen_filter_fields
+    from services.neighbor_graph import STALE_FIELD, stale_marker
+    
+    seed = config['seed']
+    posts_per_user = config['posts_per_user']
+    total_posts = config['users'] * posts_per_user
+    batch_size = config['batch_size']
+    end_date = datetime.now(timezone.utc)
+    counts = {'users': 0, 'profiles': 0, 'posts': 0, 'interactions': 0}
+    
+    users, profiles, posts, interactions = [], [], [], []
+    
+    def flush(force=False):
+        for name, collection, documents in (
+            ('users', users_collection, users),
+            ('profiles', user_profiles_collection, profiles),
+            ('posts', posts_collection, posts),
+            ('interactions', interactions_collection, interactions)
+        ):
+            if documents and (force or len(documents) >= batch_size):
+                counts[name] += len(_insert_new(collection, documents))
+                documents.clear()
+    
+    for user_index in range(shard_start, shard_end):
+        rng = random.Random(f"{seed}:user:{user_index}")
+        user_id = _seeded_object_id(seed, 'user', user_index)
+        now = end_date - timedelta(days=rng.randint(0, 30))
+        users.append({
+            "_id": user_id,
+            "email": f"loaduser{user_index}@example.com",
+            "password": config['password_hash'],
+            "createdAt": now,
+            "updatedAt": now
+        })
+        
+        # Posts of this user
+        for post_index in range(user_index * posts_per_user, (user_index + 1) * posts_per_user):
+            tags = _seeded_post_tags(seed, post_index)
+            created_at = end_date - timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+            posts.append({
+                "_id": _seeded_object_id(seed, 'post', post_index),
+                "user": user_id,
+                "title": f"{rng.choice(POST_TITLES)} #{post_index}",
+                "description": f"Load test post about {tags[0]}.",
+                "tags": tags,
+                "normalizedTags": normalize_tags(tags),
+                "likes": 0,
+                "views": 0,
+                "createdAt": created_at,
+                "updatedAt": created_at
+            })
+        
+        # Views and likes of other users' posts
+        own = range(user_index * posts_per_user, (user_index + 1) * posts_per_user)
+        viewed = {
+            post_index for post_index in rng.sample(range(total_posts), min(config['views_per_user'], total_posts))
+            if post_index not in own
+        }
+        liked = {post_index for post_index in viewed if rng.random() < config['like_ratio']}
+        for interaction_type, post_indexes in (('view', viewed), ('like', liked)):
+            for post_index in post_indexes:
+                interactions.append({
+                    "user": user_id,
+                    "post": _seeded_object_id(seed, 'post', post_index),
+                    "interactionType": interaction_type,
+                    "createdAt": now,
+                    "updatedAt": now
+                })
+        
+        # Profile, with the derived fields the API maintains on write
+        skills = rng.sample(SKILLS, rng.randint(2, 5))
+        preferences = rng.sample(FEED_PREFERENCES, rng.randint(2, 5))
+        profiles.append({
+            "user": user_id,
+            "name": f"Load User {user_index}",
+            "age": rng.randint(18, 50),
+            "feedPreferences": preferences,
+            "skills": skills,
+            "occupation": rng.choice(OCCUPATIONS),
+            "normalizedFeedPreferences": normalize_tags(preferences),
+            "normalizedSkills": normalize_tags(skills),
+            AFFINITY_FIELD: affinity_histogram(normalize_tags(_seeded_post_tags(seed, i)) for i in liked),
+            **seen_filter_fields(_seeded_object_id(seed, 'post', i) for i in viewed),
+            STALE_FIELD: stale_marker(),
+            "createdAt": now,
+            "updatedAt": now
+        })
+        
+        flush()
+    
+    flush(force=True)
+    return counts
+
+def _rebuild_post_counters(batch_size):
+    """Set likes and views of every interacted post from the interactions"""
+    operations = []
+    updated = 0
+    for entry in interactions_collection.aggregate([
+        {"$group": {
+            "_id": "$post",
+            "views": {"$sum": {"$cond": [{"$eq": ["$interactionType", "view"]}, 1, 0]}},
+            "likes": {"$sum": {"$cond": [{"$eq": ["$interactionType", "like"]}, 1, 0]}}
+        }}
+    ], allowDiskUse=True):
+        operations.append(UpdateOne({"_id": entry['_id']}, {"$set": {
+            "views": entry['views'],
+            "likes": entry['likes']
+        }}))
+        if len(operations) >= batch_size:
+            posts_collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        posts_collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+def generate_bulk_data(users=10000, posts_per_user=10, views_per_user=50, like_ratio=0.3,
+                       workers=4, seed=42, shard_size=1000, batch_size=5000):
+    """
+    Generate a large, reproducible load-test dataset
+    
+    Users are split into shards generated in parallel worker processes. Every
+    document id is derived from the seed, so the same parameters always
+    produce the same data and re-running only inserts what is missing.
+    
+    Returns:
+        Dict of inserted document counts
+    """
+    start_time = time.time()
+    
+    # Every bulk user gets the same password, so hash it once
+    config = {
+        'users': users,
+        'posts_per_user': posts_per_user,
+        'views_per_user': views_per_user,
+        'like_ratio': like_ratio,
+        'seed': seed,
+        'batch_size': batch_size,
+        'password_hash': bcrypt.hashpw(b"password123", bcrypt.gensalt()).decode('utf-8')
+    }
+    shards = [(start, min(start + shard_size, users)) for start in range(0, users, shard_size)]
+    
+    totals = {'users': 0, 'profiles': 0, 'posts': 0, 'interactions': 0}
+    def add(counts):
+        for name, count in counts.items():
+            totals[name] += count
+        print(f"Shard done: {totals}")
+    
+    if workers <= 1:
+        for start, end in shards:
+            add(_generate_bulk_shard(start, end, config))
+    else:
+        # Spawn fresh interpreters so each worker opens its own MongoClient
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_generate_bulk_shard, start, end, config) for start, end in shards]
+            for future in futures:
+                add(future.result())
+    
+    # Posts are referenced across shards, so their counters are set once every
+    # shard is in; absolute values keep re-runs correct
+    print(f"Updated counters on {_rebuild_post_counters(batch_size)} posts")
+    
+    print(f"Generated {totals} in {time.time() - start_time:.2f} seconds")
+    return totals
+
 def main():
     """Main function to generate test data"""
+    parser = argparse.ArgumentParser(description="Generate test data for the recommendation system")
+    parser.add_argument('--bulk', action='store_true', help="generate a large load-test dataset with bulk writes")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts-per-user', type=int, default=10)
+    parser.add_argument('--views-per-user', type=int, default=50)
+    parser.add_argument('--like-ratio', type=float, default=0.3, help="fraction of views that are also liked")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--shard-size', type=int, default=1000, help="users generated per worker task")
+    parser.add_argument('--batch-size', type=int, default=5000, help="documents per insert_many")
+    args = parser.parse_args()
+    
+    if args.bulk:
+        generate_bulk_data(args.users, args.posts_per_user, args.views_per_user, args.like_ratio,
+                           args.workers, args.seed, args.shard_size, args.batch_size)
+        return
+    
     try:
         print("Starting test data generation...")
         
@@ -519,7 +699,17 @@ def main():
         print("\n=== Creating Specialized Test Cases ===")
         create_specialized_test_cases()
         
-        # Step 6: Test recommendation system
+        # Step 6: Derive the normalized tags, liked-tag histograms and seen
+        # filters the API maintains on write for the documents inserted directly above
+        print("\n=== Rebuilding Derived Recommendation Fields ===")
+        from migrations.backfill_normalized_tags import backfill_posts, backfill_profiles
+        from services.tag_affinity import rebuild_all_affinities
+        from services.seen_filter import rebuild_all_seen_filters
+        print(f"Normalized tags on {backfill_posts()} posts and {backfill_profiles()} profiles")
+        print(f"Rebuilt affinities for {rebuild_all_affinities()} profiles")
+        print(f"Rebuilt seen filters for {rebuild_all_seen_filters()} profiles")
+        
+        # Step 7: Test recommendation system
         print("\n=== Testing Recommendation System ===")
         test_recommendation_system()
         
@@ -0,0 +1,47 @@
+"""
+Shared test setup: an in-memory mongomock database stands in for mongo_helper
+so the services and controllers can be exercised without a MongoDB server.
+"""
+
+import sys
+import types
+
+import mongomock
+import pytest
+from pymongo import ASCENDING
+
+_client = mongomock.MongoClient()
+_db = _client['postrecds']
+
+mongo_helper = types.ModuleType('mongo_helper')
+mongo_helper.client = _client
+mongo_helper.db = _db
+mongo_helper.users_collection = _db.users
+mongo_helper.posts_collection = _db.posts
+mongo_helper.interactions_collection = _db.interactions
+mongo_helper.user_profiles_collection = _db.profiles
+mongo_helper.neighbors_collection = _db.user_neighbors
+mongo_helper.recommendations_collection = _db.recommendations
+mongo_helper.feed_snapshots_collection = _db.feed_snapshots
+mongo_helper.trending_collection = _db.trending
+mongo_helper.event_checkpoints_collection = _db.event_checkpoints
+mongo_helper.interaction_events_collection = _db.interaction_events
+sys.modules['mongo_helper'] = mongo_helper
+
+
+def _create_indexes():
+    _db.users.create_index([("email", ASCENDING)], unique=True)
+    _db.interactions.create_index(
+        [("user", ASCENDING), ("post", ASCENDING), ("interactionType", ASCENDING)],
+        unique=True
+    )
+    _db.profiles.create_index([("user", ASCENDING)], unique=True)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    """Empty database for every test"""
+    for name in _db.list_collection_names():
+        _db.drop_collection(name)
+    _create_indexes()
+    return _db
@@ -0,0 +1,30 @@
+import jwt
+import pytest
+from flask import Flask
+
+import middleware.auth
+from routes.post_routes import post_routes
+
+ADMIN_ID = '64b000000000000000000001'
+USER_ID = '64b000000000000000000002'
+SECRET = 'admin-route-test-secret-0123456789abcdef'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('JWT_SECRET', SECRET)
+    monkeypatch.setattr(middleware.auth, 'ADMIN_USER_IDS', {ADMIN_ID})
+    app = Flask(__name__)
+    app.register_blueprint(post_routes, url_prefix='/api/posts')
+    return app.test_client()
+
+
+def _headers(user_id):
+    return {'x-auth-token': jwt.encode({"id": user_id, "email": "a@b.c"}, SECRET, algorithm="HS256")}
+
+
+@pytest.mark.parametrize('route', ['/api/posts/recommendations/stats', '/api/posts/recommendations/timings'])
+def test_internal_recommender_routes_are_admin_only(client, route):
+    assert client.get(route).status_code == 401
+    assert client.get(route, headers=_headers(USER_ID)).status_code == 403
+    assert client.get(route, headers=_headers(ADMIN_ID)).status_code == 200
@@ -0,0 +1,83 @@
+import random
+
+from bson import ObjectId
+import pytest
+
+import post_recommendation_system
+from post_recommendation_system import compute_recommended_posts, get_recommended_posts_batch, load_catalog
+from services import tag_index as tag_index_module
+from services.ann_index import LSHIndex
+from services.seen_filter import seen_filter_fields
+from services.tag_affinity import compute_affinity_fields
+from services.tag_index import tag_index
+from services.trending import trending_feed
+
+TAGS = ["python", "java", "javascript", "go", "mongodb", "react", "design", "devops", "cloud", "rust"]
+LIMIT = 5
+
+
+@pytest.fixture
+def ann(monkeypatch):
+    index = LSHIndex(n_tables=4, n_bits=4)
+    monkeypatch.setattr(post_recommendation_system, 'post_ann_index', index)
+    monkeypatch.setattr(tag_index_module, 'post_ann_index', index)
+    # Few enough that retrieval drops posts the exact scoring would rank
+    monkeypatch.setattr(post_recommendation_system, 'ANN_CANDIDATES', 8)
+    return index
+
+
+def _catalog(db, seed=7):
+    rng = random.Random(seed)
+    users = [ObjectId() for _ in range(8)]
+    posts = []
+    for i in range(60):
+        tags = rng.sample(TAGS, rng.randint(1, 3))
+        posts.append(db.posts.insert_one({
+            "user": rng.choice(users), "title": f"Post {i}", "tags": tags, "normalizedTags": tags,
+            "likes": rng.randint(0, 5), "views": rng.randint(0, 20)
+        }).inserted_id)
+
+    # The last user has no profile
+    for user in users[:-1]:
+        liked = rng.sample(posts, rng.randint(0, 6))
+        viewed = rng.sample(posts, rng.randint(0, 10))
+        db.interactions.insert_many(
+            [{"user": user, "post": post, "interactionType": "like"} for post in liked]
+            + [{"user": user, "post": post, "interactionType": "view"} for post in viewed]
+        )
+        skills = rng.sample(TAGS + ["py", "script", "web"], rng.randint(0, 3))
+        preferences = rng.sample(TAGS, rng.randint(0, 2))
+        db.profiles.insert_one({
+            "user": user, "normalizedSkills": skills, "normalizedFeedPreferences": preferences,
+            **compute_affinity_fields(user), **seen_filter_fields(viewed)
+        })
+        neighbors = [other for other in rng.sample(users[:-1], 2) if other != user]
+        db.user_neighbors.insert_one({"user": user, "neighbors": [{"user": other} for other in neighbors]})
+
+    tag_index.build()
+    trending_feed.compute()
+    return users
+
+
+def _assert_parity(users, catalog=None):
+    batch = get_recommended_posts_batch(users, LIMIT, chunk_size=3, catalog=catalog)
+    for user in users:
+        assert batch[str(user)] == compute_recommended_posts(user, LIMIT)
+
+
+def test_batch_matches_single_user_path(db):
+    _assert_parity(_catalog(db))
+
+
+def test_batch_matches_single_user_path_with_ann(db, ann):
+    _assert_parity(_catalog(db))
+
+
+def test_empty_catalog_falls_back_to_trending(db):
+    users = _catalog(db)
+    # Every post is gone, but the trending snapshot still lists them
+    db.posts.delete_many({})
+    tag_index.build()
+
+    _assert_parity(users, catalog=load_catalog())
+    assert all(len(post_ids) == LIMIT for post_ids in get_recommended_posts_batch(users, LIMIT).values())
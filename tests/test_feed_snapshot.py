@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from services.feed_snapshot import FEED_SNAPSHOT_TTL, create_snapshot, read_page
+
+
+def test_snapshot_age_is_measured_in_utc(db):
+    user = ObjectId()
+    posts = [ObjectId() for _ in range(3)]
+    version = create_snapshot(user, posts)
+
+    stored = db.feed_snapshots.find_one({"user": user})['createdAt']
+    assert abs(stored.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)) < timedelta(minutes=1)
+    assert read_page(user, version, 1, 5) == ([str(post) for post in posts[1:]], 3)
+
+
+def test_expired_snapshot_is_rejected(db):
+    user = ObjectId()
+    version = create_snapshot(user, [ObjectId()])
+    expired = datetime.now(timezone.utc) - timedelta(seconds=FEED_SNAPSHOT_TTL + 5)
+    db.feed_snapshots.update_one({"user": user}, {"$set": {"createdAt": expired.replace(tzinfo=None)}})
+
+    assert read_page(user, version, 0, 5) is None
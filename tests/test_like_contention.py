@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+import random
+import threading
+
+from bson import ObjectId
+from flask import Flask
+import mongomock
+import pytest
+
+from controllers.post_controller import like_post, unlike_post
+
+THREADS = 16
+OPERATIONS = 200
+
+
+@pytest.fixture
+def atomic_operations(monkeypatch):
+    """
+    Make each mongomock operation atomic, as each is on a server
+
+    mongomock stores a document before checking the unique indexes and
+    removes it again on a violation, so an unguarded concurrent delete can
+    match a document the server would never have written.
+    """
+    lock = threading.RLock()
+
+    def locked(method):
+        def call(*args, **kwargs):
+            with lock:
+                return method(*args, **kwargs)
+        return call
+
+    for name in ('insert_one', 'update_one', 'delete_one', 'find_one', 'find_one_and_update'):
+        monkeypatch.setattr(mongomock.Collection, name, locked(getattr(mongomock.Collection, name)))
+
+
+def _worker(app, user_ids, post_ids, seed, results):
+    rng = random.Random(seed)
+    with app.app_context():
+        for _ in range(OPERATIONS):
+            user = {"id": str(rng.choice(user_ids))}
+            post_id = str(rng.choice(post_ids))
+            action = like_post if rng.random() < 0.5 else unlike_post
+            result = action(post_id, user)
+            if isinstance(result, tuple):
+                results.append((result[1], None))
+            else:
+                results.append((200, result.get_json()['likes']))
+
+
+def test_like_counters_match_interactions_under_contention(db, atomic_operations):
+    # Few users and posts, so threads keep racing on the same likes
+    user_ids = [ObjectId() for _ in range(4)]
+    post_ids = [ObjectId() for _ in range(3)]
+    db.posts.insert_many([{
+        "_id": post_id, "user": user_ids[0], "title": "Contention", "tags": ["python"],
+        "normalizedTags": ["python"], "likes": 0, "views": 0
+    } for post_id in post_ids])
+
+    app = Flask(__name__)
+    results = [[] for _ in range(THREADS)]
+    threads = [
+        threading.Thread(target=_worker, args=(app, user_ids, post_ids, seed, results[seed]))
+        for seed in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statuses = [status for thread_results in results for status, _ in thread_results]
+    counts = [likes for thread_results in results for _, likes in thread_results if likes is not None]
+    assert 500 not in statuses
+    assert statuses.count(400) > 0  # duplicate likes and racing unlikes happened
+    assert min(counts) >= 0
+    for post in db.posts.find({}, {"likes": 1}):
+        assert post['likes'] == db.interactions.count_documents({"post": post['_id'], "interactionType": "like"})
+
+
+def test_like_of_missing_post_records_nothing(db):
+    with Flask(__name__).app_context():
+        result = like_post(str(ObjectId()), {"id": str(ObjectId())})
+
+    assert result[1] == 404
+    assert db.interactions.count_documents({}) == 0
+
+
+def test_likes_are_stamped_in_utc(db):
+    post = db.posts.insert_one({"user": ObjectId(), "title": "Stamped", "normalizedTags": [], "likes": 0}).inserted_id
+    with Flask(__name__).app_context():
+        like_post(str(post), {"id": str(ObjectId())})
+
+    created_at = db.interactions.find_one({"post": post})['createdAt'].replace(tzinfo=timezone.utc)
+    assert abs(created_at - datetime.now(timezone.utc)) < timedelta(minutes=1)
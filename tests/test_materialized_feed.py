@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from services.materialized_feed import FEED_MAX_AGE_SECONDS, load_feed, save_feeds
+
+
+def test_feed_age_is_measured_in_utc(db):
+    user, post = ObjectId(), ObjectId()
+    save_feeds({str(user): [str(post)]}, 10, datetime.now(timezone.utc))
+
+    stored = db.recommendations.find_one({"user": user})['generatedAt']
+    assert abs(stored.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)) < timedelta(minutes=1)
+    assert load_feed(user, 10) == [str(post)]
+
+
+def test_expired_feed_is_not_served(db):
+    user = ObjectId()
+    expired = datetime.now(timezone.utc) - timedelta(seconds=FEED_MAX_AGE_SECONDS + 5)
+    save_feeds({str(user): [str(ObjectId())]}, 10, expired.replace(tzinfo=None))
+
+    assert load_feed(user, 10) is None
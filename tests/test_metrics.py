@@ -0,0 +1,30 @@
+import time
+
+from flask import Flask, Response
+
+from middleware.metrics import register_metrics
+from services.metrics import registry
+
+LABELS = (('blueprint', 'app'), ('route', '/slow-stream'), ('method', 'GET'))
+
+
+def test_streamed_responses_are_timed_until_the_body_is_sent():
+    app = Flask(__name__)
+    register_metrics(app)
+
+    @app.route('/slow-stream')
+    def slow_stream():
+        def generate():
+            for _ in range(3):
+                time.sleep(0.05)
+                yield "line\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    with app.test_client() as client:
+        response = client.get('/slow-stream')
+        assert response.get_data(as_text=True) == "line\n" * 3
+        response.close()
+
+    counters, histograms = registry.collect()
+    assert counters['http_requests_total'][LABELS + (('status', '200'),)] == 1
+    assert histograms['http_request_duration_seconds'][LABELS].sum >= 0.15
@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+import pytest
+
+from services import event_log, tag_affinity
+from services.event_log import (
+    EventConsumer, LOG_START, append_event, LIKE, UNLIKE, VIEW, POST_UPDATED, POST_DELETED, MODEL_UPDATED
+)
+from services.model_updater import model_updater, index_tail, delete_orphaned_interactions
+from services.recommendation_cache import recommendation_cache
+from services.seen_filter import SEEN_FIELD, SeenFilter, seen_filter_fields
+from services.tag_affinity import compute_affinity_fields, load_affinity
+
+
+@pytest.fixture(autouse=True)
+def settled(monkeypatch):
+    # Treat every event as settled so a poll reads what the test just wrote
+    monkeypatch.setattr(event_log, 'EVENT_SETTLE_SECONDS', -5)
+
+
+def _consumer(db, handlers):
+    consumer = EventConsumer('test_updater', handlers)
+    db.event_checkpoints.insert_one({
+        "_id": consumer.name, "position": LOG_START, "lastEvent": None, "leaseUntil": datetime(2000, 1, 1)
+    })
+    return consumer
+
+
+def _rewind(db, consumer):
+    db.event_checkpoints.update_one({"_id": consumer.name}, {"$set": {"position": LOG_START}})
+
+
+def _like(db, user, post, tags):
+    db.interactions.insert_one({"user": user, "post": post, "interactionType": "like"})
+    append_event(LIKE, user, post, tags=tags)
+
+
+def _affinity(db, user):
+    # Counts that went back to 0 stay stored; the recommender skips them
+    return load_affinity(db.profiles.find_one({"user": user}))
+
+
+def _seed(db):
+    user = ObjectId()
+    db.profiles.insert_one({"user": user, "name": "Reader"})
+    python_post = db.posts.insert_one({"title": "a", "tags": ["Python"], "normalizedTags": ["python"]}).inserted_id
+    cooking_post = db.posts.insert_one({"title": "b", "tags": ["Cooking"], "normalizedTags": ["cooking"]}).inserted_id
+    return user, python_post, cooking_post
+
+
+def test_failed_run_is_not_applied_twice(db):
+    user, python_post, cooking_post = _seed(db)
+    failures = []
+
+    def flaky_views(events):
+        if not failures:
+            failures.append(events)
+            raise RuntimeError("transient")
+
+    consumer = _consumer(db, dict(model_updater.handlers, **{VIEW: flaky_views}))
+    _like(db, user, python_post, ["python"])
+    append_event(VIEW, user, cooking_post)
+    _like(db, user, cooking_post, ["cooking"])
+
+    with pytest.raises(RuntimeError):
+        consumer.poll()
+    consumer.poll()
+
+    assert _affinity(db, user) == {"python": 1, "cooking": 1}
+
+
+def test_replayed_batch_changes_nothing(db):
+    user, python_post, cooking_post = _seed(db)
+    consumer = _consumer(db, dict(model_updater.handlers, **{VIEW: lambda events: None}))
+
+    _like(db, user, python_post, ["python"])
+    _like(db, user, cooking_post, ["cooking"])
+    db.interactions.delete_one({"user": user, "post": python_post})
+    append_event(UNLIKE, user, python_post, tags=["python"])
+    db.posts.update_one({"_id": cooking_post}, {"$set": {"tags": ["Baking"], "normalizedTags": ["baking"]}})
+    append_event(POST_UPDATED, user, cooking_post, oldTags=["cooking"], tags=["baking"])
+    consumer.poll()
+
+    applied = db.profiles.find_one({"user": user})
+    assert load_affinity(applied) == {"baking": 1}
+
+    _rewind(db, consumer)
+    consumer.poll()
+    assert db.profiles.find_one({"user": user}) == applied
+
+
+def test_post_delete_drops_interactions_and_affinity(db):
+    user, python_post, _ = _seed(db)
+    consumer = _consumer(db, model_updater.handlers)
+
+    _like(db, user, python_post, ["python"])
+    consumer.poll()
+    db.posts.delete_one({"_id": python_post})
+    append_event(POST_DELETED, user, python_post, tags=["python"])
+    consumer.poll()
+
+    assert db.interactions.count_documents({"post": python_post}) == 0
+    assert _affinity(db, user) == {}
+
+    _rewind(db, consumer)
+    consumer.poll()
+    assert _affinity(db, user) == {}
+
+
+def test_first_run_folds_events_already_in_the_log(db):
+    user, python_post, cooking_post = _seed(db)
+    _like(db, user, python_post, ["python"])
+    _like(db, user, cooking_post, ["cooking"])
+    db.posts.delete_one({"_id": cooking_post})
+    append_event(POST_DELETED, user, cooking_post, tags=["cooking"])
+
+    # No checkpoint yet
+    consumer = EventConsumer('test_first_run', model_updater.handlers)
+    assert consumer.poll() == 3
+    assert _affinity(db, user) == {"python": 1}
+    assert db.interactions.count_documents({"post": cooking_post}) == 0
+
+
+def test_rebuild_deletes_orphaned_interactions(db):
+    user, python_post, cooking_post = _seed(db)
+    db.interactions.insert_one({"user": user, "post": python_post, "interactionType": "like"})
+    db.interactions.insert_one({"user": user, "post": cooking_post, "interactionType": "view"})
+    db.posts.delete_one({"_id": cooking_post})
+
+    assert delete_orphaned_interactions() == 1
+    assert db.interactions.count_documents({}) == 1
+
+
+def test_feeds_are_invalidated_after_the_fold(db):
+    user, python_post, _ = _seed(db)
+    tail = EventConsumer(None, index_tail.handlers)
+    tail._position = LOG_START
+    recommendation_cache.set(user, 10, ["cached"], recommendation_cache.snapshot())
+
+    # The raw like does not touch the cache: the profile is not folded yet
+    _like(db, user, python_post, ["python"])
+    tail.poll()
+    assert recommendation_cache.get(user, 10) == ["cached"]
+
+    # The fold writes the profile, drops the cache, and reports the user
+    _consumer(db, model_updater.handlers).poll()
+    assert recommendation_cache.get(user, 10) is None
+    folded = db.interaction_events.find_one({"type": MODEL_UPDATED})
+    assert folded['users'] == [user]
+
+    recommendation_cache.set(user, 10, ["recomputed"], recommendation_cache.snapshot())
+    tail.poll()
+    assert recommendation_cache.get(user, 10) is None
+
+
+def _leased(db, name, lease_until):
+    db.event_checkpoints.insert_one({
+        "_id": name, "position": LOG_START, "lastEvent": None, "owner": "other-process",
+        "leaseUntil": lease_until.replace(tzinfo=None)  # pymongo hands dates back naive, in UTC
+    })
+    return EventConsumer(name, model_updater.handlers)
+
+
+def test_live_lease_is_not_taken_over(db):
+    consumer = _leased(db, 'test_live', datetime.now(timezone.utc) + timedelta(seconds=30))
+    assert consumer.poll() == 0
+    assert db.event_checkpoints.find_one({"_id": 'test_live'})['owner'] == "other-process"
+
+
+def test_expired_lease_is_taken_over(db):
+    consumer = _leased(db, 'test_expired', datetime.now(timezone.utc) - timedelta(seconds=1))
+    consumer.poll()
+    checkpoint = db.event_checkpoints.find_one({"_id": 'test_expired'})
+    assert checkpoint['owner'] == consumer.owner
+    assert checkpoint['leaseUntil'].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+
+
+def test_like_folds_increment_without_rescanning(db, monkeypatch):
+    user, python_post, _ = _seed(db)
+    consumer = _consumer(db, model_updater.handlers)
+    _like(db, user, python_post, ["python"])
+
+    def rescan(user_ids):
+        raise AssertionError("folds must not recompute histograms")
+
+    monkeypatch.setattr(tag_affinity, 'compute_affinities', rescan)
+    consumer.poll()
+    assert _affinity(db, user) == {"python": 1}
+
+
+def test_histograms_built_from_scratch_skip_events_they_count(db):
+    user, python_post, cooking_post = _seed(db)
+    _like(db, user, python_post, ["python"])
+    _like(db, user, cooking_post, ["cooking"])
+    # A profile created (or rebuilt) after the likes already counts them
+    db.profiles.update_one({"user": user}, {"$set": compute_affinity_fields(user)})
+
+    _consumer(db, model_updater.handlers).poll()
+    assert _affinity(db, user) == {"python": 1, "cooking": 1}
+
+
+def test_view_folds_set_bits_in_the_current_slice(db):
+    user, python_post, cooking_post = _seed(db)
+    db.profiles.update_one({"user": user}, {"$set": seen_filter_fields([])})
+    consumer = _consumer(db, model_updater.handlers)
+    append_event(VIEW, user, python_post)
+    consumer.poll()
+
+    seen = SeenFilter(db.profiles.find_one({"user": user}))
+    assert python_post in seen and cooking_post not in seen
+
+    _rewind(db, consumer)
+    consumer.poll()
+    assert db.profiles.find_one({"user": user})[SEEN_FIELD] == seen_filter_fields([python_post])[SEEN_FIELD]
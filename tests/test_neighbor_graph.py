@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from services import neighbor_graph
+from services.neighbor_graph import STALE_FIELD, stale_marker, refresh_stale_neighbors
+
+
+def _profiles(db, count=3):
+    users = [ObjectId() for _ in range(count)]
+    db.profiles.insert_many([{
+        "user": user, "normalizedSkills": ["python"], "normalizedFeedPreferences": [], STALE_FIELD: stale_marker()
+    } for user in users])
+    return users
+
+
+def test_refresh_clears_flags(db):
+    users = _profiles(db)
+
+    assert refresh_stale_neighbors() == 3
+    assert db.profiles.count_documents({STALE_FIELD: {"$exists": True}}) == 0
+    assert db.user_neighbors.count_documents({}) == 3
+    assert refresh_stale_neighbors() == 0
+
+
+def test_neighbor_lists_are_stamped_in_utc(db):
+    _profiles(db)
+    refresh_stale_neighbors()
+
+    for document in db.user_neighbors.find():
+        updated_at = document['updatedAt']
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        assert abs(datetime.now(timezone.utc) - updated_at) < timedelta(minutes=1)
+
+
+def test_change_during_refresh_stays_flagged(db, monkeypatch):
+    users = _profiles(db)
+    fit = neighbor_graph._fit
+
+    def fit_while_profile_changes(vectors, k):
+        db.profiles.update_one({"user": users[0]}, {"$set": {STALE_FIELD: stale_marker()}})
+        return fit(vectors, k)
+
+    monkeypatch.setattr(neighbor_graph, '_fit', fit_while_profile_changes)
+    assert refresh_stale_neighbors() == 3
+
+    flagged = [profile['user'] for profile in db.profiles.find({STALE_FIELD: {"$exists": True}})]
+    assert flagged == [users[0]]
+
+
+def test_flags_written_before_markers_are_cleared(db):
+    users = _profiles(db)
+    db.profiles.update_many({}, {"$set": {STALE_FIELD: True}})
+
+    assert refresh_stale_neighbors() == 3
+    assert db.profiles.count_documents({STALE_FIELD: {"$exists": True}}) == 0
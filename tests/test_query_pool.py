@@ -0,0 +1,25 @@
+import time
+
+import pytest
+
+from services import query_pool
+from services.query_pool import query_deadline, submit, wait_for
+
+
+def test_waits_share_one_request_deadline(monkeypatch):
+    monkeypatch.setattr(query_pool, 'QUERY_TIMEOUT_MS', 300)
+    deadline = query_deadline()
+    fast = submit(time.sleep, 0.2)
+    slow = submit(time.sleep, 0.45)
+
+    started = time.monotonic()
+    wait_for(fast, 'fast', deadline)
+    # Each wait on its own budget would let this one finish
+    with pytest.raises(TimeoutError):
+        wait_for(slow, 'slow', deadline)
+    assert time.monotonic() - started < 0.4
+
+
+def test_wait_without_deadline_gets_a_full_budget(monkeypatch):
+    monkeypatch.setattr(query_pool, 'QUERY_TIMEOUT_MS', 300)
+    assert wait_for(submit(lambda: 42), 'answer') == 42
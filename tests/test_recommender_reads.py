@@ -0,0 +1,55 @@
+from bson import ObjectId
+import pytest
+from pymongo.errors import ExecutionTimeout
+
+import post_recommendation_system
+from post_recommendation_system import compute_recommended_posts
+from services.tag_index import tag_index
+
+
+def _timeout(*args, **kwargs):
+    raise ExecutionTimeout("operation exceeded time limit", 50)
+
+
+@pytest.fixture
+def catalog(db):
+    user, author = ObjectId(), ObjectId()
+    db.profiles.insert_one({"user": user, "skills": ["Python"], "normalizedSkills": ["python"]})
+    posts = db.posts.insert_many([
+        {"user": author, "title": f"Python {i}", "tags": ["Python"], "normalizedTags": ["python"]}
+        for i in range(3)
+    ]).inserted_ids
+    neighbor_post = db.posts.insert_one(
+        {"user": author, "title": "Cooking", "tags": ["Cooking"], "normalizedTags": ["cooking"]}
+    ).inserted_id
+    tag_index.build()
+    return user, posts, neighbor_post
+
+
+def test_neighbor_reads_failing_on_the_server_only_drop_neighbor_posts(catalog, monkeypatch):
+    user, posts, neighbor_post = catalog
+    monkeypatch.setattr(post_recommendation_system, '_fetch_neighbor_posts', _timeout)
+    assert sorted(compute_recommended_posts(user, limit=3)) == sorted(str(post) for post in posts)
+
+    fetch_candidates = post_recommendation_system._fetch_candidate_posts
+
+    def neighbor_candidates_time_out(candidate_ids, user_id, stage_name='candidate_query'):
+        if stage_name == 'neighbor_candidate_query':
+            _timeout()
+        return fetch_candidates(candidate_ids, user_id, stage_name)
+
+    monkeypatch.setattr(post_recommendation_system, '_fetch_neighbor_posts', lambda user_id: {neighbor_post})
+    monkeypatch.setattr(post_recommendation_system, '_fetch_candidate_posts', neighbor_candidates_time_out)
+    assert sorted(compute_recommended_posts(user, limit=3)) == sorted(str(post) for post in posts)
+
+
+def test_neighbor_candidates_are_merged(catalog, monkeypatch):
+    user, posts, neighbor_post = catalog
+    monkeypatch.setattr(post_recommendation_system, '_fetch_neighbor_posts', lambda user_id: {neighbor_post})
+    assert str(neighbor_post) in compute_recommended_posts(user, limit=4)
+
+
+def test_profile_read_failing_on_the_server_degrades(catalog, monkeypatch):
+    user, _, _ = catalog
+    monkeypatch.setattr(post_recommendation_system, '_fetch_profile', _timeout)
+    assert isinstance(compute_recommended_posts(user, limit=3), list)
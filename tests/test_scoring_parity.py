@@ -0,0 +1,102 @@
+import random
+
+from bson import ObjectId
+import pytest
+
+from services.scoring_engine import (
+    TagMatrix, score_candidates, score_users, SKILL_WEIGHT, PREFERENCE_WEIGHT, INTERACTION_WEIGHT
+)
+from services.tag_affinity import affinity_histogram
+
+# Normalized tags that overlap as substrings, so fuzzy matching matters
+VOCABULARY = [
+    "java", "javascript", "script", "go", "golang", "mongo", "mongodb", "db", "python", "py",
+    "react", "reactnative", "native", "ml", "html", "css", "design", "uiux", "ux", "devops",
+    "ops", "aws", "cloud", "cloudcomputing", "security", "rust", "data", "datascience"
+]
+# Terms users type that are not tags themselves
+EXTRA_TERMS = ["nodejs", "web", "computing", "science", "sql", "typescript", ""]
+
+
+def score_candidates_loop(candidate_posts, skills, preferences, liked_posts):
+    """
+    Reference per-post loop the engine must agree with
+
+    Skill and preference matching is the original `skill in tag or tag in
+    skill` loop. The interaction score counts every tag a candidate shares
+    with a liked post, once per liked post carrying it (the liked-tag
+    affinity definition), computed here from the liked posts themselves.
+    """
+    liked_tag_sets = [set(post['normalizedTags']) for post in liked_posts]
+    post_scores = []
+    for post in candidate_posts:
+        tags = post['normalizedTags']
+
+        skill_matches = sum(1 for skill in skills if any(skill in tag or tag in skill for tag in tags))
+        pref_matches = sum(1 for pref in preferences if any(pref in tag or tag in pref for tag in tags))
+        direct_score = (skill_matches * SKILL_WEIGHT) + (pref_matches * PREFERENCE_WEIGHT)
+
+        tag_matches = sum(1 for tag in tags for liked_tags in liked_tag_sets if tag in liked_tags)
+        interaction_score = tag_matches * INTERACTION_WEIGHT
+
+        post_scores.append({
+            'id': post['_id'],
+            'score': direct_score + interaction_score,
+            'skill_matches': skill_matches,
+            'pref_matches': pref_matches
+        })
+    return post_scores
+
+
+def _catalog(rng, size):
+    return [{
+        "_id": ObjectId(),
+        "title": f"Post {i}",
+        # Duplicate tags happen when raw tags normalize to the same value
+        "normalizedTags": [rng.choice(VOCABULARY) for _ in range(rng.randint(0, 6))]
+    } for i in range(size)]
+
+
+def _user(rng, posts):
+    terms = VOCABULARY + EXTRA_TERMS
+    skills = [rng.choice(terms) for _ in range(rng.randint(0, 5))]
+    preferences = [rng.choice(terms) for _ in range(rng.randint(0, 5))]
+    liked_posts = rng.sample(posts, rng.randint(0, 15))
+    return skills, preferences, liked_posts
+
+
+def _ranking(post_scores):
+    ranked = sorted(post_scores, key=lambda x: x['score'], reverse=True)
+    return [(p['id'], p['score'], p['skill_matches'], p['pref_matches']) for p in ranked]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_engine_matches_reference_loop(seed):
+    rng = random.Random(seed)
+    posts = _catalog(rng, 200)
+    skills, preferences, liked_posts = _user(rng, posts)
+    affinity = affinity_histogram(post['normalizedTags'] for post in liked_posts)
+
+    expected = score_candidates_loop(posts, skills, preferences, liked_posts)
+    actual = score_candidates(posts, skills, preferences, affinity)
+
+    assert _ranking(actual) == _ranking(expected)
+
+
+def test_batch_engine_matches_reference_loop():
+    rng = random.Random(99)
+    posts = _catalog(rng, 300)
+    users = [_user(rng, posts) for _ in range(25)]
+
+    scores, skill_matches, pref_matches = score_users(
+        TagMatrix([post['normalizedTags'] for post in posts]),
+        [skills for skills, _, _ in users],
+        [preferences for _, preferences, _ in users],
+        [affinity_histogram(post['normalizedTags'] for post in liked) for _, _, liked in users]
+    )
+
+    for row, (skills, preferences, liked_posts) in enumerate(users):
+        expected = score_candidates_loop(posts, skills, preferences, liked_posts)
+        assert scores[row].toarray().ravel().tolist() == [p['score'] for p in expected]
+        assert skill_matches[row].toarray().ravel().tolist() == [p['skill_matches'] for p in expected]
+        assert pref_matches[row].toarray().ravel().tolist() == [p['pref_matches'] for p in expected]
@@ -0,0 +1,107 @@
+import hashlib
+
+from bson import Int64, ObjectId
+
+from services.seen_filter import (
+    SEEN_FIELD, SEEN_SLICE_FIELD, FILTER_FP_RATE, FILTER_SLICES, SLICE_CAPACITY,
+    SeenFilter, seen_filter_fields, seen_update, seen_positions
+)
+
+
+def _ids(prefix, count):
+    return [ObjectId(hashlib.blake2b(f"{prefix}:{i}".encode(), digest_size=12).digest()) for i in range(count)]
+
+
+def _false_positive_rate(seen, count=20000):
+    return sum(post_id in seen for post_id in _ids('unseen', count)) / count
+
+
+def _apply(document, update):
+    """Apply the $set/$inc/$unset operators seen_update emits"""
+    def parent(path):
+        node = document
+        *parents, leaf = path.split('.')
+        for key in parents:
+            node = node.setdefault(key, {})
+        return node, leaf
+
+    for path, value in update.get('$set', {}).items():
+        node, leaf = parent(path)
+        node[leaf] = value
+    for path, value in update.get('$inc', {}).items():
+        node, leaf = parent(path)
+        node[leaf] = node.get(leaf, 0) + value
+    for path in update.get('$unset', {}):
+        node, leaf = parent(path)
+        node.pop(leaf, None)
+
+
+def _word_map(post_ids, hashes):
+    """Word index -> signed Int64 word, the layout before binary slices"""
+    words = {}
+    for post_id in post_ids:
+        for position in seen_positions(post_id)[:hashes]:
+            words[position >> 6] = words.get(position >> 6, 0) | (1 << (position & 63))
+    return {str(word): Int64(mask - (1 << 64) if mask >= 1 << 63 else mask) for word, mask in words.items()}
+
+
+def test_false_positive_rate_stays_capped_for_heavy_users():
+    views = _ids('viewed', SLICE_CAPACITY * (FILTER_SLICES + 4))
+    fields = seen_filter_fields(views)
+    seen = SeenFilter(fields)
+
+    assert len(fields[SEEN_FIELD]) == FILTER_SLICES
+    assert _false_positive_rate(seen) < FILTER_FP_RATE * 1.5
+    # The views of every kept slice are remembered
+    assert all(post_id in seen for post_id in views[-SLICE_CAPACITY * FILTER_SLICES:])
+
+
+def test_incremental_updates_rotate_slices():
+    user = ObjectId()
+    profile = {"user": user, **seen_filter_fields([])}
+    views = _ids('viewed', SLICE_CAPACITY * (FILTER_SLICES + 2))
+    for start in range(0, len(views), 500):
+        batch = views[start:start + 500]
+        _apply(profile, seen_update(profile, batch))
+        # Replaying a fold sets no new bits (unless it opens a new slice)
+        number = profile[SEEN_SLICE_FIELD]['number']
+        replayed = seen_update(profile, batch)
+        if "$inc" in replayed:
+            assert replayed["$set"][f"{SEEN_FIELD}.{number}"] == profile[SEEN_FIELD][str(number)]
+
+    seen = SeenFilter(profile)
+    assert len(profile[SEEN_FIELD]) <= FILTER_SLICES
+    assert profile[SEEN_SLICE_FIELD]['views'] <= SLICE_CAPACITY
+    assert _false_positive_rate(seen) < FILTER_FP_RATE * 1.5
+    assert all(post_id in seen for post_id in views[-SLICE_CAPACITY * (FILTER_SLICES - 1):])
+
+
+def test_slices_are_stored_as_binary():
+    fields = seen_filter_fields(_ids('viewed', 10))
+    assert all(isinstance(value, bytes) for value in fields[SEEN_FIELD].values())
+    assert len(fields[SEEN_FIELD]['0']) * 8 == 65536
+
+
+def test_flat_filters_from_before_slicing_still_apply(db):
+    user = ObjectId()
+    viewed = _ids('legacy', 50)
+    flat = _word_map(viewed, 5)
+    seen = SeenFilter({SEEN_FIELD: flat})
+    assert all(post_id in seen for post_id in viewed)
+
+    db.interactions.insert_many([{"user": user, "post": post_id, "interactionType": "view"} for post_id in viewed])
+    update = seen_update({"user": user, SEEN_FIELD: flat}, [viewed[0]])
+    rebuilt = SeenFilter(update["$set"])
+    assert all(post_id in rebuilt for post_id in viewed)
+
+
+def test_word_map_slices_still_apply_and_are_rebuilt(db):
+    user = ObjectId()
+    viewed = _ids('sliced', 50)
+    profile = {"user": user, SEEN_FIELD: {"0": _word_map(viewed, 10)}, SEEN_SLICE_FIELD: {"number": 0, "views": 50}}
+    assert all(post_id in SeenFilter(profile) for post_id in viewed)
+
+    db.interactions.insert_many([{"user": user, "post": post_id, "interactionType": "view"} for post_id in viewed])
+    update = seen_update(profile, [viewed[0]])
+    assert all(isinstance(value, bytes) for value in update["$set"][SEEN_FIELD].values())
+    assert all(post_id in SeenFilter(update["$set"]) for post_id in viewed)
@@ -0,0 +1,44 @@
+from services import term_affinity as term_affinity_module
+from services.term_affinity import TermAffinityTable
+
+
+def _matched(table, term):
+    return {table.term(i) for i in table.matching_ids(term)}
+
+
+def test_query_terms_are_matched_without_being_interned():
+    table = TermAffinityTable()
+    table.rebuild(["java", "javascript", "python"])
+
+    assert _matched(table, "script") == {"javascript"}
+    assert _matched(table, "javascripting") == {"java", "javascript"}
+    assert _matched(table, "cobol") == set()
+    assert len(table) == 3
+
+
+def test_tags_interned_later_reach_cached_query_terms():
+    table = TermAffinityTable()
+    table.rebuild(["java"])
+    assert _matched(table, "script") == set()
+
+    table.term_id("typescript")
+    assert _matched(table, "script") == {"typescript"}
+
+    # A query term that becomes a tag is matched like any other tag
+    table.term_id("script")
+    assert _matched(table, "script") == {"script", "typescript"}
+    assert _matched(table, "java") == {"java"}
+
+
+def test_query_term_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(term_affinity_module, 'QUERY_TERM_CACHE_SIZE', 2)
+    table = TermAffinityTable()
+    table.rebuild(["python"])
+
+    for term in ["py", "thon", "pyth", "on"]:
+        assert _matched(table, term) == {"python"}
+    assert list(table._query_matches) == ["pyth", "on"]
+
+    table.rebuild(["go"])
+    assert not table._query_matches
+    assert _matched(table, "golang") == {"go"}
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from services.trending import TRENDING_HALF_LIFE_HOURS, TrendingFeed, trending_score
+
+
+def test_created_at_and_id_time_age_the_same():
+    created = datetime.now(timezone.utc) - timedelta(hours=TRENDING_HALF_LIFE_HOURS)
+    now = datetime.now(timezone.utc)
+    # pymongo hands createdAt back naive, in UTC
+    stamped = {"_id": ObjectId(), "createdAt": created.replace(tzinfo=None), "likes": 1, "views": 1}
+    unstamped = {"_id": ObjectId.from_datetime(created), "likes": 1, "views": 1}
+
+    assert abs(trending_score(stamped, now) - 2) < 0.01
+    assert abs(trending_score(unstamped, now) - 2) < 0.01
+
+
+def test_newer_posts_rank_first_with_equal_engagement(db):
+    now = datetime.now(timezone.utc)
+    old, new = ObjectId(), ObjectId()
+    db.posts.insert_many([
+        {"_id": old, "user": ObjectId(), "likes": 3, "views": 0, "createdAt": now - timedelta(hours=30)},
+        {"_id": new, "user": ObjectId(), "likes": 3, "views": 0, "createdAt": now - timedelta(hours=1)}
+    ])
+
+    feed = TrendingFeed()
+    feed.compute()
+    assert feed.top(2) == [new, old]
+    generated_at = db.trending.find_one()['generatedAt'].replace(tzinfo=timezone.utc)
+    assert abs(generated_at - now) < timedelta(minutes=1)
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+import time
+
+from bson import ObjectId
+
+from services.metrics import registry
+from services.view_buffer import ViewBuffer
+
+
+def _dropped():
+    counters, _ = registry.collect()
+    return counters['view_buffer_dropped_views_total'].get((), 0)
+
+
+def test_full_buffer_drops_the_view_after_the_backpressure_timeout(db):
+    # The flusher never runs on its own during the test
+    buffer = ViewBuffer(60000, 1000, 1, 50)
+    user = ObjectId()
+    assert buffer.record(user, ObjectId())
+
+    dropped = _dropped()
+    started = time.monotonic()
+    assert not buffer.record(user, ObjectId())
+    assert 0.04 < time.monotonic() - started < 1
+    assert _dropped() == dropped + 1
+    assert buffer.pending() == 1
+
+    buffer.close()
+    assert db.interactions.count_documents({"user": user}) == 1
+
+
+def test_views_are_stamped_in_utc(db):
+    buffer = ViewBuffer(60000, 1000, 10, 50)
+    user, post = ObjectId(), ObjectId()
+    buffer.record(user, post)
+    buffer.close()
+
+    created_at = db.interactions.find_one({"user": user})['createdAt'].replace(tzinfo=timezone.utc)
+    assert abs(created_at - datetime.now(timezone.utc)) < timedelta(minutes=1)